@@ -1,8 +1,7 @@
 #!/usr/bin/env python3
 '''
-    - retrieve data from station
-    - collocate with wave model
-    - aggregate collocated time series
+    - retrieve model data at location of stations
+    - aggregate time series per station and leadtime
     - dump to netcdf
 !!!
 
@@ -10,27 +9,24 @@
 import os
 import sys
 import numpy as np
-from copy import deepcopy
 import argparse
 from argparse import RawTextHelpFormatter
-import yaml
 
 sys.path.append('../../wavy')
 
-with open("../../config/station_specs.yaml", 'r') as stream:
-    station_dict=yaml.safe_load(stream)
-
-from modelmod import get_model, check_date
 from datetime import datetime, timedelta
 from ncmod import dumptonc_ts_pos,check_vals_in_nc
-from stationmod import matchtime, get_loc_idx
+from collocmod import collocate_stations_fc
+from modelmod import model_dict
 from utils import grab_PID
 
 # parser
 parser = argparse.ArgumentParser(
     description="""
-Retrieves data from a station and dumps to monthly nc-file.
-If file exists, data is appended.
+Retrieves model data at the location of stations and dumps to
+monthly nc-file. If file exists, data is appended. All stations
+and leadtimes are extracted in one pass over the model files.
+Without -station all stations in station_specs.yaml are used.
 
 Usage:
 ./collect_model_at_location.py -sd 2019010100 -ed 2019020200 -station ekofiskL -mod mwam4 -var Hs
@@ -70,134 +66,40 @@ else:
 grab_PID()
 
 # settings
-station = args.station
+if args.station is None:
+    stations = None
+else:
+    stations = [args.station]
 model = args.mod
 varname = args.var
+if varname is None:
+    varname = 'Hs'
 basetime = datetime(1970,1,1)
-
-if (model == 'mwam4' or model == 'ww3'):
-    init_step = 6
-    leadtimes = [0, 6, 12, 18, 24, 36, 48, 60]
-if (model == 'mwam8' or model == 'ecwam' or 
-    model == 'mwam3' or model == 'mwam3force'):
-    init_step = 12
-    leadtimes = [0, 12, 24, 36, 48, 60, 72, 96, 120, 144]
-
-tmpdate = deepcopy(sdate)
-idx, idy = np.nan, np.nan
-
-mod_lst = []
-dist_lst = []
-mod_lon_lst = []
-mod_lat_lst = []
-stat_lat_lst = []
-stat_lon_lst = []
-time_dt_lst = []
-time_s_lst = []
-idx_lst = []
-idy_lst = []
+init_step = model_dict[model]['init_step']
+leadtimes = model_dict[model]['leadtimes']
 
 print('---')
 print(sdate)
 print(edate)
 print('---')
 
-while tmpdate <= edate:
-    print(tmpdate)
-    if np.isnan(idx):
-        for i in range(len(leadtimes)):
-            element = leadtimes[i]
-            print('leadtime: ', element)
-            fc_date = tmpdate
-            print('fc_date: ', fc_date)
-            init_date = tmpdate - timedelta(hours=element)
-            print('init_date: ', init_date)
+# single pass over model files for all stations and leadtimes
+results_dict = collocate_stations_fc(model=model,sdate=sdate,edate=edate,
+                                     date_incr=init_step,
+                                     leadtimes=leadtimes,
+                                     varalias=varname,
+                                     platforms=stations)
+
+for s, station in enumerate(results_dict['platforms']):
+    for l, element in enumerate(leadtimes):
+        for t, fc_date in enumerate(results_dict['datetime']):
+            model_val = results_dict['model_values'][s,t,l]
+            if np.isnan(model_val):
+                continue
             outpath = fc_date.strftime('/lustre/storeB/project/fou/om/'
                             + 'waveverification/' + model + '/stations/'
                             + 'CollocationFiles/'
                             + '%Y/%m/')
-            os.system('mkdir -p ' + outpath)
-            filename_ts=fc_date.strftime(model
-                                    + "_"
-                                    + varname
-                                    + "_at_"
-                                    + station
-                                    + "_ts_lt" 
-                                    + "{:0>3d}".format(element)
-                                    + "h_%Y%m.nc")
-            try:
-                # check if values for this date already exist
-                vidx = check_vals_in_nc(outpath+filename_ts,varname,fc_date)
-                if vidx is None:
-                    print('time does not yet exist, filling slot...')
-                    # get wave model
-                    check_date(model,fc_date=fc_date,leadtime=element)
-                    print('Read model file')
-                    model_var,model_lats,model_lons,model_time,model_time_dt = \
-                        get_model(simmode="fc",model=model,fc_date=fc_date,
-                        init_date=init_date,leadtime=element,varname=varname)
-                    # collocate with wave model
-                    print('Collocate')
-                    if model=='ecwam': # inflate coords
-                        model_lons, model_lats = \
-                                        np.meshgrid(model_lons, model_lats)
-                    idx, idy, distM, picked_lat, picked_lon = get_loc_idx(\
-                            model_lats,model_lons,\
-                            station_dict[station]['coords']['lat'],\
-                            station_dict[station]['coords']['lon'],\
-                            mask=None)
-                    # append values
-                    idx_lst.append(idx)
-                    idy_lst.append(idy)
-                    dist_lst.append(distM[idx,idy])
-                    mod_lst.append(model_var.squeeze()[idx,idy][0])
-                    mod_lat_lst.append(picked_lat[0])
-                    mod_lon_lst.append(picked_lon[0])
-                    stat_lat_lst.append(station_dict[station]['coords']['lat'])
-                    stat_lon_lst.append(station_dict[station]['coords']['lon'])
-                    time_dt_lst.append(fc_date)
-                    time_s = (fc_date - basetime).total_seconds()
-                    time_s_lst.append(time_s)
-                    # dump tp nc-file
-                    coll_dict = {'basetime':basetime,
-                         'time':[time_s_lst[-1]],
-                         varname:[mod_lst[-1]],
-                         'lats_model':[mod_lat_lst[-1]],
-                         'lons_model':[mod_lon_lst[-1]],
-                         'lats_pos':[stat_lat_lst[-1]],
-                         'lons_pos':[stat_lon_lst[-1]],
-                         'hdist':[dist_lst[-1][0]],
-                         'idx':[idx_lst[-1][0]],
-                         'idy':[idy_lst[-1][0]],
-                         'model':model,
-                         'station':station,
-                         'varname':varname
-                        }
-                    print(coll_dict)
-                    title_ts=(
-                        model + ' ' + varname + ' at location ' + station 
-                        + ' with leadtime '
-                        + "{:0>3d}".format(element)
-                        + ' h')
-                    dumptonc_ts_pos(outpath,
-                                filename_ts,
-                                title_ts,
-                                coll_dict,
-                                )
-            except Exception as e: print(e)
-    else:
-        for i in range(len(leadtimes)):
-            element = leadtimes[i]
-            print('leadtime: ', element)
-            fc_date = tmpdate
-            print('fc_date: ', fc_date)
-            init_date = tmpdate - timedelta(hours=element)
-            print('init_date: ', init_date)
-            outpath = fc_date.strftime('/lustre/storeB/project/fou/om/'
-                            + 'waveverification/' + model + '/stations/'
-                            + 'CollocationFiles/'
-                            + '%Y/%m/')
-            os.system('mkdir -p ' + outpath)
             filename_ts=fc_date.strftime(model
                                     + "_"
                                     + varname
@@ -211,40 +113,22 @@ while tmpdate <= edate:
                 vidx = check_vals_in_nc(outpath+filename_ts,varname,fc_date)
                 if vidx is None:
                     print('time does not yet exist, filling slot...')
-                    # get wave model
-                    check_date(model,fc_date=fc_date,leadtime=element)
-                    print('Read model file')
-                    model_var,model_lats,model_lons,model_time,model_time_dt = \
-                        get_model(simmode="fc",model=model,fc_date=fc_date,
-                        init_date=init_date,leadtime=element,varname=varname)
-                    # append values
-                    idx_lst.append(idx)
-                    idy_lst.append(idy)
-                    dist_lst.append(distM[idx,idy])
-                    mod_lst.append(model_var.squeeze()[idx,idy][0])
-                    mod_lat_lst.append(picked_lat[0])
-                    mod_lon_lst.append(picked_lon[0])
-                    stat_lat_lst.append(station_dict[station]['coords']['lat'])
-                    stat_lon_lst.append(station_dict[station]['coords']['lon'])
-                    time_dt_lst.append(fc_date)
                     time_s = (fc_date - basetime).total_seconds()
-                    time_s_lst.append(time_s)
                     # dump tp nc-file
                     coll_dict = {'basetime':basetime,
-                         'time':[time_s_lst[-1]],
-                         varname:[mod_lst[-1]],
-                         'lats_model':[mod_lat_lst[-1]],
-                         'lons_model':[mod_lon_lst[-1]],
-                         'lats_pos':[stat_lat_lst[-1]],
-                         'lons_pos':[stat_lon_lst[-1]],
-                         'hdist':[dist_lst[-1][0]],
-                         'idx':[idx_lst[-1][0]],
-                         'idy':[idy_lst[-1][0]],
-                         'model': model,
+                         'time':[time_s],
+                         varname:[model_val],
+                         'lats_model':[results_dict['model_lats'][s]],
+                         'lons_model':[results_dict['model_lons'][s]],
+                         'lats_pos':[results_dict['obs_lats'][s]],
+                         'lons_pos':[results_dict['obs_lons'][s]],
+                         'hdist':[results_dict['distance'][s]/1000.],
+                         'idx':[results_dict['collocation_idx_x'][s]],
+                         'idy':[results_dict['collocation_idx_y'][s]],
+                         'model':model,
                          'station':station,
                          'varname':varname
                         }
-                    print(coll_dict)
                     title_ts=(
                         model + ' ' + varname + ' at location ' + station
                         + ' with leadtime '
@@ -256,4 +140,3 @@ while tmpdate <= edate:
                                 coll_dict,
                                 )
             except Exception as e: print(e)
-    tmpdate = tmpdate + timedelta(hours=init_step)
@@ -73,18 +73,14 @@ else:
 # retrieve PID
 grab_PID()
 
-with open("../../config/station_specs.yaml", 'r') as stream:
-    station_dict=yaml.safe_load(stream)
-
 op_support_path = os.path.abspath(os.path.dirname( __file__ ))
 
-for station in (station_dict):
-    cmd = ("python " + op_support_path
-            + "/collect_model_at_location.py"
-            + " -sd " + sdatestr
-            + " -ed " + edatestr
-            + " -station " + station 
-            + " -mod " + model
-            + " -var " + var)
-    tmp=os.system(cmd)
-    del tmp
+# all stations are extracted in one pass over the model files
+cmd = ("python " + op_support_path
+        + "/collect_model_at_location.py"
+        + " -sd " + sdatestr
+        + " -ed " + edatestr
+        + " -mod " + model
+        + " -var " + var)
+tmp=os.system(cmd)
+del tmp
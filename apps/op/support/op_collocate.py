@@ -18,11 +18,8 @@ moddir = os.path.abspath(os.path.join(os.path.dirname( __file__ ),
 with open(moddir,'r') as stream:
     variable_info=yaml.safe_load(stream)
 
-from satmod import satellite_class as sa
-from modelmod import get_model
-from collocmod import collocate
+from schedulemod import make_collocation_tasks, run_tasks, run_chunked
 from utils import grab_PID
-from ncmod import dumptonc_ts
 
 # parser
 parser = argparse.ArgumentParser(
@@ -51,6 +48,11 @@ parser.add_argument("-dist", metavar='distance limit', type=int,
     help="distance limit for collocation")
 parser.add_argument("-path", metavar='outpath',
     help="path to where files are to be stored")
+parser.add_argument("-nproc", metavar='nproc', type=int, default=1,
+    help="number of worker processes")
+parser.add_argument("-chunk", metavar='days', type=int,
+    help="collocate and write in chunks of days, one after another,\n"
+        + "a rerun resumes after the last completed chunk")
 
 args = parser.parse_args()
 
@@ -98,82 +100,34 @@ if args.twin is None:
 if args.dist is None:
     args.dist = 6
 
+chunk = 'month' if args.chunk is None else args.chunk
+
+# one task per mission, leadtime, and chunk
+tasks = []
 for sat in args.sat:
     outpath = (args.path + '/'
            + args.mod + '/satellites/altimetry'
            + '/' + sat + '/'
-           + 'CollocationFiles/')
-    tmpdate = deepcopy(sdate)
-    while tmpdate <= edate:
-        # get sat values
-        if 'results_dict' in globals():
-            del results_dict
-        fc_date = deepcopy(tmpdate)
-        sa_obj = sa(fc_date,sat=sat,timewin=args.twin,region=args.reg,
-                    varlst=varlst)
-        if ('vars' not in vars(sa_obj) or len(sa_obj.vars['time'])==0):
-            print("If possible proceed with another time step...")
-        else:
-            # loop over all forecast lead times
-            for element in leadtimes:
-                print("leadtime: ", element, "h")
-                print("fc_date: ", fc_date)
-                filename_ts=fc_date.strftime(args.mod
-                                            + "_vs_" + sat
-                                            + "_for_" + args.reg
-                                            + "_coll_ts_lt"
-                                            + "{:0>3d}".format(element)
-                                            + "h_%Y%m.nc")
-                title_ts=('collocated time series for '
-                        + ' model ' + args.mod
-                        + ' vs ' + sat
-                        + ' over region of ' + args.reg
-                        + ' with leadtime '
-                        + "{:0>3d}".format(element)
-                        + ' h')
-                init_date = fc_date - timedelta(hours=element)
-                # get_model
-                try:
-                    model_var_dict = \
-                        get_model(model=args.mod,fc_date=fc_date,
-                        leadtime=element,init_date=init_date)
-                    # collocation
-                    if ('results_dict' in globals() 
-                        and len(results_dict['idx_valid'])>0):
-                        update_dict = collocate(args.mod,
-                                            model_var_dict['model_var'],
-                                            model_var_dict['model_lats'],
-                                            model_var_dict['model_lons'],
-                                            model_var_dict['model_time_dt'],
-                                            sa_obj,
-                                            variable_info[varlst[0]]\
-                                            ['standard_name'],
-                                            fc_date,distlim=args.dist,
-                                            idx_valid=results_dict['idx_valid'])
-                        results_dict['model_matches']=\
-                                            update_dict['model_matches']
-                    else:
-                        results_dict = collocate(args.mod,
-                                            model_var_dict['model_var'],
-                                            model_var_dict['model_lats'],
-                                            model_var_dict['model_lons'],
-                                            model_var_dict['model_time_dt'],
-                                            sa_obj,
-                                            variable_info[varlst[0]]\
-                                            ['standard_name'],
-                                            fc_date,distlim=args.dist)
-                    dumptonc_ts(outpath + fc_date.strftime('%Y/%m/'), \
-                                filename_ts,title_ts,\
-                                model_var_dict['model_time_unit'],\
-                                results_dict)
-                except IOError as e:
-                    print(e)
-                #    print('Model output not available')
-                except ValueError as e:
-                    print(e)
-                #    print('Model wave field not available.')
-                #    print('Continuing with next time step.')
-                except IndexError as e:
-                    print(e)
-                #    print('time step not in model output file')
-        tmpdate = tmpdate + timedelta(hours = init_step)
+           + 'CollocationFiles/%Y/%m/')
+    for element in leadtimes:
+        filename_ts = (args.mod
+                    + "_vs_" + sat
+                    + "_for_" + args.reg
+                    + "_coll_ts_lt"
+                    + "{:0>3d}".format(element)
+                    + "h_%Y%m.nc")
+        tasks += make_collocation_tasks(args.mod,[sat],[element],
+                                        sdate,edate,
+                                        date_incr=init_step,
+                                        twin=args.twin,
+                                        region=args.reg,
+                                        distlim=args.dist,
+                                        varalias=varlst[0],
+                                        path=outpath,
+                                        filename=filename_ts,
+                                        chunk=chunk)
+
+if args.chunk is None:
+    reports = run_tasks(tasks,nproc=args.nproc)
+else:
+    reports = run_chunked(tasks)
@@ -24,9 +24,7 @@ with open(moddir,'r') as stream:
     variable_info=yaml.safe_load(stream)
 
 from utils import grab_PID
-from modelmod import model_class
-from collocmod import collocation_class
-from stationmod import station_class
+from schedulemod import make_collocation_tasks, run_tasks, run_chunked
 
 # parser
 parser = argparse.ArgumentParser(
@@ -55,6 +53,11 @@ parser.add_argument("-dist", metavar='distance limit', type=int,
     help="distance limit for collocation")
 parser.add_argument("-path", metavar='outpath',
     help="path to where files are to be stored")
+parser.add_argument("-nproc", metavar='nproc', type=int, default=1,
+    help="number of worker processes")
+parser.add_argument("-chunk", metavar='days', type=int,
+    help="collocate and write in chunks of days, one after another,\n"
+        + "a rerun resumes after the last completed chunk")
 
 args = parser.parse_args()
 
@@ -86,101 +89,44 @@ else:
                 int(args.ed[6:8]),int(args.ed[8:10]))
 
 
-leadtimestr = "best"
-
-if args.path is None:
-    path_template = collocation_dict['path']\
-                                    [self.obstype]\
-                                    ['local']['nc']\
-                                    ['path_template'][0]
-    file_template = collocation_dict['path'][self.obstype]\
-                                    ['local']['nc']\
-                                    ['file_template']
-    strsublst = collocation_dict['path'][self.obstype]\
-                                ['local']['nc']\
-                                ['strsub']
-    tmppath = path_template + '/' + file_template
-    pathtofile = make_pathtofile(tmppath,strsublst,
-                                 tmpdate,
-                                 varalias=self.varalias,
-                                 model=self.model,
-                                 satellite=self.sat,
-                                 leadtime=leadtimestr)
-
-title = ( 'Collocation of ' + self.stdvarname
-        + ' observations from ' + self.sat
-        + ' vs ' + self.model )
-
-
-
 # retrieve PID
 grab_PID()
 
-init_step = model_dict[args.mod]['init_step']
-
-leadtimes = range(init_step)
-
 # settings
 if args.twin is None:
     args.twin = 30
 if args.dist is None:
     args.dist = 6
 
+chunk = 'month' if args.chunk is None else args.chunk
+
+# one task per mission and chunk, best guess uses hourly model steps
+tasks = []
 for sat in args.sat:
-    outpath = (args.path
-           + args.mod + '/satellites/altimetry'
-           + '/' + sat + '/'
-           + 'CollocationFiles/')
-    tmpdate = deepcopy(sdate)
-    while tmpdate <= edate:
-        for element in leadtimes:
-            fc_date = tmpdate + timedelta(hours=element)
-            init_date = deepcopy(tmpdate)
-            print("leadtime: ", element, "h")
-            print("fc_date: ", fc_date)
-            print("init_date: ", init_date)
-            # get sat values
-            try:
-                sa_obj = sa(fc_date,sat=sat,timewin=args.twin,region=args.reg,
-                    varlst=varlst)
-                if ('vars' not in vars(sa_obj) or len(sa_obj.vars['time'])==0):
-                    print("If possible proceed with another time step...")
-                else:
-                    # conversion from yaml-datetime.date to datetime.datetime
-                    filename_ts = fc_date.strftime(args.mod
-                                    + "_vs_" + sat
-                                    + "_for_" + args.reg
-                                    + "_coll_ts_lt_best"
-                                    + "_%Y%m.nc")
-                    title_ts=('collocated time series for '
-                        + ' model ' + args.mod
-                        + ' vs ' + sat
-                        + ' over region ' + args.reg
-                        + ' with leadtime '
-                        + ' bestguess')
-                    # get_model
-                    try:
-                        model_var_dict = \
-                            get_model(model=args.mod,fc_date=fc_date,
-                            leadtime=element,init_date=init_date)
-                        # collocation
-                        results_dict = collocate(args.mod,
-                                            model_var_dict['model_var'],
-                                            model_var_dict['model_lats'],
-                                            model_var_dict['model_lons'],
-                                            model_var_dict['model_time_dt'],
-                                            sa_obj,
-                                            variable_info[varlst[0]]\
-                                            ['standard_name'],
-                                            fc_date,distlim=args.dist)
-                        dumptonc_ts(outpath + fc_date.strftime('%Y/%m/'), \
-                                filename_ts,title_ts,\
-                                model_var_dict['model_time_unit'],\
-                                results_dict)
-                    except IOError as e:
-                        print(e)
-                    except ValueError as e:
-                        print(e)
-            except IndexError as e:
-                print(e)
-        tmpdate = tmpdate + timedelta(hours = init_step)
+    outpath, filename_ts = None, None
+    if args.path is not None:
+        # otherwise paths are taken from collocation_specs.yaml
+        outpath = (args.path + '/'
+               + args.mod + '/satellites/altimetry'
+               + '/' + sat + '/'
+               + 'CollocationFiles/%Y/%m/')
+        filename_ts = (args.mod
+                    + "_vs_" + sat
+                    + "_for_" + args.reg
+                    + "_coll_ts_lt_best"
+                    + "_%Y%m.nc")
+    tasks += make_collocation_tasks(args.mod,[sat],['best'],
+                                    sdate,edate,
+                                    date_incr=1,
+                                    twin=args.twin,
+                                    region=args.reg,
+                                    distlim=args.dist,
+                                    varalias=varalias,
+                                    path=outpath,
+                                    filename=filename_ts,
+                                    chunk=chunk)
+
+if args.chunk is None:
+    reports = run_tasks(tasks,nproc=args.nproc)
+else:
+    reports = run_chunked(tasks)
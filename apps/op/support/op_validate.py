@@ -15,9 +15,9 @@ sys.path.append('../../wavy')
 with open("../../config/model_specs.yaml", 'r') as stream:
     model_dict=yaml.safe_load(stream)
 
-from stationmod import matchtime
-from validationmod import validate
-from ncmod import dumptonc_stats
+from validationmod import validation_accumulator_class
+from ncmod import dumptonc_stats, dumptonc_accumulator
+from ncmod import nc_ts_reader_class
 from utils import grab_PID
 
 # parser
@@ -82,6 +82,17 @@ leadtimes = model_dict[args.mod]['leadtimes']
 # define init_step
 init_step = model_dict[args.mod]['init_step']
 
+def get_monthly_files(inpath,filename,sdate,edate):
+    filelst = []
+    tmpdate = datetime(sdate.year,sdate.month,1)
+    while tmpdate <= edate:
+        filelst.append(inpath + tmpdate.strftime('%Y/%m/')
+                        + tmpdate.strftime(filename))
+        tmpdate = (tmpdate + timedelta(days=32)).replace(day=1)
+    return filelst
+
+twin = timedelta(minutes=30)
+
 for sat in args.sat:
     inpath = (args.path
            + args.mod + '/satellites/altimetry/'
@@ -89,57 +100,59 @@ for sat in args.sat:
     outpath = (args.path
            + args.mod + '/satellites/altimetry/' 
            + sat + '/' + 'ValidationFiles/')
+    # collocation files of all months are opened once per leadtime
+    readers = {}
+    for element in leadtimes:
+        filename_ts = (args.mod
+                    + "_vs_" + sat
+                    + "_for_" + args.reg
+                    + "_coll_ts_lt"
+                    + "{:0>3d}".format(element)
+                    + "h_%Y%m.nc")
+        readers[element] = nc_ts_reader_class(
+                                get_monthly_files(inpath,filename_ts,
+                                                  sdate - twin,
+                                                  edate + twin))
     tmpdate = deepcopy(sdate)
     while tmpdate <= edate:
         print(tmpdate)
         for element in leadtimes:
             # settings
             fc_date = deepcopy(tmpdate)
-            # get model collocated values
-            from ncmod import get_nc_ts
-            filename_ts = fc_date.strftime(args.mod
+            # get collocations for given model time step and validate
+            coll_dict = readers[element].read(
+                                    ['model_values','obs_values'],
+                                    sdate=fc_date - twin,
+                                    edate=fc_date + twin)
+            if len(coll_dict['time'])==0:
+                pass
+            else:
+                results_dict = {'model_values':coll_dict['model_values'],
+                                'obs_values':coll_dict['obs_values']}
+                acc = validation_accumulator_class().update(
+                                            results_dict['model_values'],
+                                            results_dict['obs_values'])
+                valid_dict = acc.get_stats()
+                print(valid_dict)
+                # dump to nc-file: validation
+                title_stat='validation file'
+                filename_stat=fc_date.strftime(args.mod
                                         + "_vs_" + sat
                                         + "_for_" + args.reg
-                                        + "_coll_ts_lt"
+                                        + "_val_ts_lt"
                                         + "{:0>3d}".format(element)
                                         + "h_%Y%m.nc")
-            if not os.path.exists(inpath 
-                                + fc_date.strftime('%Y/%m/') 
-                                + filename_ts):
-                print(filename_ts + ' not found!')
-            else:
-                coll_dict = get_nc_ts(inpath 
-                                        + fc_date.strftime('%Y/%m/') 
-                                        + filename_ts,
-                                        ['mHs','sHs']
-                                        )
-                del filename_ts
-                # find collocations for given model time step and validate
-                from stationmod import matchtime
-                time_lst = list(coll_dict['time'].filled(np.nan))
-                ctime, idx = matchtime(tmpdate,tmpdate,time_lst,
-                                       coll_dict['time_unit'],
-                                       timewin=30)
-                if len(idx)==0:
-                    pass
-                else:
-                    dtime = netCDF4.num2date(coll_dict['time'].filled(np.nan),
-                                             coll_dict['time_unit'])
-                    results_dict = {'date_matches':dtime[idx],
-                        'model_matches':coll_dict['mHs'][idx].filled(np.nan),
-                        'sat_matches':coll_dict['sHs'][idx].filled(np.nan)}
-                    valid_dict=validate(results_dict)
-                    print(valid_dict)
-                    # dump to nc-file: validation
-                    title_stat='validation file'
-                    filename_stat=fc_date.strftime(args.mod
-                                            + "_vs_" + sat
-                                            + "_for_" + args.reg
-                                            + "_val_ts_lt"
-                                            + "{:0>3d}".format(element)
-                                            + "h_%Y%m.nc")
-                    time_dt = fc_date
-                    dumptonc_stats(outpath + fc_date.strftime('%Y/%m/'), \
-                        filename_stat,title_stat,time_dt,\
-                        coll_dict['time_unit'],valid_dict)
+                time_dt = fc_date
+                dumptonc_stats(outpath + fc_date.strftime('%Y/%m/')
+                                + filename_stat,
+                                title_stat,time_dt,
+                                coll_dict['time_unit'],valid_dict)
+                # mergeable state for rolling and seasonal statistics
+                dumptonc_accumulator(outpath + fc_date.strftime('%Y/%m/')
+                                + filename_stat.replace('_val_ts_',
+                                                        '_val_acc_'),
+                                'validation accumulator',time_dt,
+                                coll_dict['time_unit'],acc.state)
         tmpdate = tmpdate + timedelta(hours=init_step)
+    for element in leadtimes:
+        readers[element].close()
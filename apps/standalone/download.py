@@ -16,8 +16,7 @@ from argparse import RawTextHelpFormatter
 import numpy as np
 
 # own import
-from satmod import get_remote_files
-from utils import sort_files
+from satmod import get_remote_files, sync_remote_files
 # -------------------------------------------------------------------- #
 
 # read yaml config files:
@@ -33,6 +32,7 @@ Download satellite netcdf from Copernicus DU.
 
 Usage:
 ./download.py -sat s3a -sd 2020100100 -ed 2020101000
+./download.py -sat s3a -sync
     """,
     formatter_class = RawTextHelpFormatter
     )
@@ -54,6 +54,9 @@ parser.add_argument("-path", metavar='path',
     help="destination for downloaded data")
 parser.add_argument("-nproc", metavar='nproc',
     help="number of simultaneous processes",type = int)
+parser.add_argument("-sync", action='store_true',
+    help="only download files that are new or changed since the last\
+        \nrun according to the manifest in the destination directory")
 
 args = parser.parse_args()
 
@@ -93,6 +96,7 @@ if args.nproc is None:
 else:
     nproc = args.nproc
 
+failed = []
 for sat in satlst:
     try:
         print("Attempting to download data for:", sat)
@@ -104,18 +108,29 @@ for sat in satlst:
         if os.path.isdir(destination) == False:
             print ( 'Your destination path does not exist')
             print ( destination + ' will now be created')
-            cmd = 'mkdir -p ' + destination
-            os.system(cmd)
+            os.makedirs(destination,exist_ok=True)
         start_time = time.time()
-        sa_obj = get_remote_files(satpath, destination,
+        if args.sync is True:
+            report = sync_remote_files(satpath, destination,
                             sdate,edate,twin=30,
                             nproc=nproc,instr=instr,provider=provider)
+        else:
+            # files are written to subdirectories year and month
+            report = get_remote_files(satpath, destination,
+                            sdate,edate,twin=30,
+                            nproc=nproc,instr=instr,provider=provider,
+                            subdirs=True)
         time1 = time.time() - start_time
         print("Time used for collecting data: ", time1, " seconds")
-        print("Data is being sorted into subdirectories year and month ...")
-        filelst = np.sort(os.listdir(destination))
-        sort_files(destination,filelst)
+        if len(report['failed']) > 0:
+            failed.append(sat)
     except Exception as e:
         print('Experienced error when downloading data for',sat,
             '\nwith the error:',e,
             '\nSkip and continue ...')
+        failed.append(sat)
+
+# non-zero exit status such that failed syncs are detected
+if len(failed) > 0:
+    print('Download failed for:', failed)
+    sys.exit(1)
@@ -0,0 +1,45 @@
+'''
+Benchmark of the vectorized region masks on 10^7 footprints
+usage: python benchmark_regionmod.py
+'''
+import sys
+import time
+import numpy as np
+sys.path.append(r'../wavy')
+from regionmod import get_region_mask
+
+def loop_mask(LATS,LONS,bbox):
+    # former element wise check in satmod.matchregion_rect
+    ridx = []
+    for i in range(len(LATS)):
+        if (LATS[i] >= bbox[0] and LATS[i] <= bbox[1]
+        and LONS[i] >= bbox[2] and LONS[i] <= bbox[3]):
+            ridx.append(i)
+    return ridx
+
+def main(nobs=10**7):
+    rng = np.random.RandomState(0)
+    LATS = rng.uniform(-80,80,nobs)
+    LONS = rng.uniform(-180,180,nobs)
+    regions = {'rect':[55.,75.,-10.,30.],
+               'dateline':[50.,70.,170.,-170.],
+               'polar':[66.,90.,-180.,180.],
+               'global':None}
+    for name in regions:
+        t0 = time.time()
+        mask = get_region_mask(LATS,LONS,regions[name])
+        t1 = time.time()
+        print(name + ': ' + str(int(np.sum(mask))) + ' hits, '
+            + str(round(nobs/(t1-t0)/1e6,1)) + ' million footprints/s')
+    # compare with former loop on subset
+    nsub = 10**5
+    t0 = time.time()
+    ridx = loop_mask(LATS[:nsub],LONS[:nsub],regions['rect'])
+    t1 = time.time()
+    mask = get_region_mask(LATS[:nsub],LONS[:nsub],regions['rect'])
+    assert list(np.flatnonzero(mask)) == ridx
+    print('loop: ' + str(round(nsub/(t1-t0)/1e6,2))
+        + ' million footprints/s')
+
+if __name__ == '__main__':
+    main()
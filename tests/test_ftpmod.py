@@ -0,0 +1,92 @@
+import sys
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+sys.path.append(r'../wavy')
+import ftpmod
+
+try:
+    from pyftpdlib.authorizers import DummyAuthorizer
+    from pyftpdlib.handlers import FTPHandler
+    from pyftpdlib.servers import FTPServer
+except ImportError:
+    FTPServer = None
+
+@unittest.skipIf(FTPServer is None, 'pyftpdlib not available')
+class TestFtpmod(unittest.TestCase):
+
+    def setUp(self):
+        self.remote = tempfile.mkdtemp()
+        self.local = tempfile.mkdtemp()
+        os.mkdir(os.path.join(self.remote,'2020'))
+        self.filelst = ['file_' + str(i) + '.nc' for i in range(3)]
+        for i, filename in enumerate(self.filelst):
+            with open(os.path.join(self.remote,'2020',filename),'wb') as f:
+                f.write(os.urandom(10000*(i+1)))
+        authorizer = DummyAuthorizer()
+        authorizer.add_user('user','pw',self.remote,perm='elr')
+        handler = FTPHandler
+        handler.authorizer = authorizer
+        self.server = FTPServer(('127.0.0.1',0),handler)
+        self.port = self.server.socket.getsockname()[1]
+        self.thread = threading.Thread(target=self.server.serve_forever,
+                                       kwargs={'timeout':0.1})
+        self.thread.start()
+        self.pool = ftpmod.ftp_pool_class('127.0.0.1','user','pw',
+                                          nconn=2,port=self.port)
+
+    def test_download_and_skip(self):
+        content = ftpmod.list_remote_files(self.pool,'/2020/')
+        self.assertEqual(sorted(content),self.filelst)
+        report = ftpmod.download_files(self.pool,'/2020/',self.filelst,
+                                       self.local,nproc=2)
+        self.assertEqual(sorted(report['downloaded']),self.filelst)
+        self.assertEqual(report['bytes'],60000)
+        report = ftpmod.download_files(self.pool,'/2020/',self.filelst,
+                                       self.local,nproc=2)
+        self.assertEqual(sorted(report['skipped']),self.filelst)
+        self.assertEqual(report['bytes'],0)
+
+    def test_resume_and_failure(self):
+        filename = self.filelst[2]
+        with open(os.path.join(self.remote,'2020',filename),'rb') as f:
+            data = f.read()
+        with open(os.path.join(self.local,filename + '.part'),'wb') as f:
+            f.write(data[:12345])
+        report = ftpmod.download_files(self.pool,'/2020/',
+                                       [filename,'missing.nc'],
+                                       self.local,nproc=2,backoff=0)
+        self.assertEqual(report['downloaded'],[filename])
+        self.assertEqual(report['bytes'],len(data)-12345)
+        self.assertEqual([e[0] for e in report['failed']],['missing.nc'])
+        with open(os.path.join(self.local,filename),'rb') as f:
+            self.assertEqual(f.read(),data)
+
+    def test_changed_files(self):
+        listing = ftpmod.list_remote_files_with_facts(self.pool,'/2020/')
+        self.assertEqual(sorted(listing),self.filelst)
+        self.assertEqual(listing[self.filelst[0]]['size'],'10000')
+        manifest = os.path.join(self.local,'.manifest.json')
+        ftpmod.write_manifest(manifest,
+                {'/2020/' + name:listing[name] for name in listing})
+        synced = ftpmod.read_manifest(manifest)
+        self.assertEqual(ftpmod.get_changed_files('/2020/',listing,synced),
+                         [])
+        with open(os.path.join(self.remote,'2020',self.filelst[1]),
+                  'ab') as f:
+            f.write(b'appended')
+        listing = ftpmod.list_remote_files_with_facts(self.pool,'/2020/')
+        self.assertEqual(ftpmod.get_changed_files('/2020/',listing,synced),
+                         [self.filelst[1]])
+
+    def tearDown(self):
+        self.pool.close()
+        self.server.close_all()
+        self.thread.join()
+        shutil.rmtree(self.remote)
+        shutil.rmtree(self.local)
+
+if __name__ == '__main__':
+    unittest.main()
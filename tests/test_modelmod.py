@@ -1,11 +1,26 @@
 import sys
 import unittest
+from unittest import mock
 from datetime import datetime
 sys.path.append(r'../wavy')
 import satmod
 
 class TestModelmod(unittest.TestCase):
 
+    def test_group_consecutive_fc_dates_by_file(self):
+        import modelmod
+        fc_dates = [datetime(2020,1,1,h) for h in range(4)]
+        # dates mapping to interleaved files
+        filename = lambda model, fc_date, leadtime: \
+                        'file_' + str(fc_date.hour % 2 + fc_date.hour//3)
+        with mock.patch.object(modelmod,'make_model_filename_wrapper',
+                               filename):
+            runs = modelmod.group_consecutive_fc_dates_by_file(
+                                            'mwam4',fc_dates,0)
+        self.assertEqual([r[0] for r in runs],
+                         ['file_0','file_1','file_0','file_2'])
+        self.assertEqual(sum([r[1] for r in runs],[]),fc_dates)
+
     def setUp(self):
         self.date = datetime(2017,8,1,12)
         self.timewin = 30
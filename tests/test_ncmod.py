@@ -0,0 +1,145 @@
+import sys
+import os
+import shutil
+import tempfile
+import unittest
+import netCDF4
+from datetime import datetime
+sys.path.append(r'../wavy')
+import ncmod
+
+class TestNcCache(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.filelst = []
+        for i in range(3):
+            pathtofile = os.path.join(self.tmpdir,'file_' + str(i) + '.nc')
+            nc = netCDF4.Dataset(pathtofile,mode='w',
+                                 format='NETCDF3_CLASSIC')
+            nc.createDimension('time',2)
+            var = nc.createVariable('time','f8',('time',))
+            var.units = 'seconds since 1970-01-01 00:00:00'
+            var[:] = [0,3600]
+            nc.title = 'file ' + str(i)
+            nc.close()
+            self.filelst.append(pathtofile)
+        self.cache = ncmod.nc_cache_class(maxopen=2)
+
+    def test_lru_eviction(self):
+        nc0 = self.cache.get_dataset(self.filelst[0])
+        self.assertIs(self.cache.get_dataset(self.filelst[0]),nc0)
+        self.cache.get_dataset(self.filelst[1])
+        self.cache.get_dataset(self.filelst[2])
+        # least recently used dataset is closed
+        self.assertFalse(nc0.isopen())
+        self.assertEqual(self.cache.stats()['open'],2)
+        self.assertEqual(self.cache.stats()['hits']['dataset'],1)
+        self.assertEqual(self.cache.stats()['misses']['dataset'],3)
+
+    def test_meta_and_mtime(self):
+        ncdict = self.cache.get_meta(self.filelst[0])
+        self.assertEqual(ncdict['global']['title'],'file 0')
+        self.assertEqual(self.cache.get_meta(self.filelst[0]),ncdict)
+        self.assertEqual(self.cache.stats()['hits']['meta'],1)
+        nc = self.cache.get_dataset(self.filelst[0])
+        # changed file is reopened
+        with netCDF4.Dataset(self.filelst[0],mode='a') as f:
+            f.title = 'changed'
+        st = os.stat(self.filelst[0])
+        os.utime(self.filelst[0],ns=(st.st_atime_ns,st.st_mtime_ns+10**9))
+        ncdict = self.cache.get_meta(self.filelst[0])
+        self.assertEqual(ncdict['global']['title'],'changed')
+        self.assertFalse(nc.isopen())
+
+    def test_remote_path(self):
+        url = ('https://thredds.met.no/thredds/dodsC/'
+               + 'fou-hi/mywavewam4archive/MyWave_wam4_2020010100.nc')
+        # no os.stat for remote paths, keyed by path only
+        self.assertEqual(self.cache.get_key(url),(url,None))
+        # an opened remote dataset is reused until evicted
+        nc = netCDF4.Dataset(self.filelst[0])
+        self.cache.datasets[url] = (None,nc)
+        self.assertIs(self.cache.get_dataset(url),nc)
+        self.assertEqual(self.cache.get_meta(url)['global']['title'],
+                         'file 0')
+        self.assertEqual(self.cache.stats()['hits']['dataset'],2)
+
+    def test_remove_nc_ts_after(self):
+        # file_0 has records at 00:00 and 01:00
+        nremoved = ncmod.remove_nc_ts_after(self.filelst[0],
+                                            datetime(1970,1,1,0,30))
+        self.assertEqual(nremoved,1)
+        with netCDF4.Dataset(self.filelst[0]) as nc:
+            self.assertEqual(list(nc.variables['time'][:]),[0])
+            self.assertEqual(nc.title,'file 0')
+        ncmod.remove_nc_ts_after(self.filelst[0],datetime(1970,1,1))
+        self.assertFalse(os.path.isfile(self.filelst[0]))
+
+    def test_appender(self):
+        class col_obj:
+            varalias = 'Hs'
+            obsname = 's3a'
+            model = 'mwam4'
+            leadtime = 0
+        def make_vars(time):
+            n = len(time)
+            return {'time':time,'time_unit':'seconds since 1970-01-01',
+                    'model_lons':[0.]*n,'model_lats':[60.]*n,
+                    'obs_lons':[0.]*n,'obs_lats':[60.]*n,
+                    'collocation_idx_x':[1]*n,'collocation_idx_y':[2]*n,
+                    'distance':[1.]*n,'obs_values':[1.]*n,
+                    'model_values':[2.]*n}
+        pathtofile = os.path.join(self.tmpdir,'sub','coll.nc')
+        with ncmod.nc_ts_appender_class(pathtofile) as appender:
+            col_obj.vars = make_vars([0,60,120])
+            appender.append(col_obj,'test')
+            col_obj.vars = make_vars([180,240])
+            appender.append(col_obj,'test')
+        # batch starting at an existing time stamp is overwritten
+        col_obj.vars = make_vars([120,180])
+        col_obj.vars['obs_values'] = [99.,3.]
+        ncmod.dumptonc_ts_collocation(col_obj,pathtofile,'test')
+        with netCDF4.Dataset(pathtofile) as nc:
+            self.assertEqual(list(nc.variables['time'][:]),
+                             [0,60,120,180,240])
+            self.assertEqual(list(nc.variables['obs_values'][:].filled()),
+                             [1.,1.,-999.,3.,1.])
+        # batch inside the time range is inserted in order
+        col_obj.vars = make_vars([30])
+        col_obj.vars['obs_values'] = [5.]
+        ncmod.dumptonc_ts_collocation(col_obj,pathtofile,'test')
+        ncmod.dumptonc_ts_collocation(col_obj,pathtofile,'test')
+        with netCDF4.Dataset(pathtofile) as nc:
+            self.assertEqual(list(nc.variables['time'][:]),
+                             [0,30,60,120,180,240])
+            self.assertEqual(list(nc.variables['obs_values'][:].filled()),
+                             [1.,5.,1.,-999.,3.,1.])
+        # a rerun with fewer records replaces its time range
+        col_obj.vars = make_vars([60,180])
+        ncmod.dumptonc_ts_collocation(col_obj,pathtofile,'test')
+        with netCDF4.Dataset(pathtofile) as nc:
+            self.assertEqual(list(nc.variables['time'][:]),
+                             [0,30,60,180,240])
+            self.assertEqual(list(nc.variables['obs_values'][:].filled()),
+                             [1.,5.,1.,1.,1.])
+
+    def test_reader(self):
+        # file_0 and file_1 have records at 00:00 and 01:00
+        with netCDF4.Dataset(self.filelst[1],mode='a') as nc:
+            nc.variables['time'][:] = [10800,7200]
+        with ncmod.nc_ts_reader_class(self.filelst[:2]
+                    + [os.path.join(self.tmpdir,'missing.nc')]) as reader:
+            vardict = reader.read([],sdate=datetime(1970,1,1,0,30),
+                                  edate=datetime(1970,1,1,2))
+            self.assertEqual(list(vardict['time']),[3600,7200])
+            self.assertEqual(vardict['dtime'][-1],datetime(1970,1,1,2))
+            vardict = reader.read(['time'])
+            self.assertEqual(list(vardict['time']),[0,3600,10800,7200])
+
+    def tearDown(self):
+        self.cache.clear()
+        shutil.rmtree(self.tmpdir)
+
+if __name__ == '__main__':
+    unittest.main()
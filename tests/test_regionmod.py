@@ -0,0 +1,64 @@
+import sys
+import os
+import shutil
+import tempfile
+import unittest
+import numpy as np
+sys.path.append(r'../wavy')
+import regionmod
+
+class TestRegionmod(unittest.TestCase):
+
+    def setUp(self):
+        rng = np.random.RandomState(1)
+        self.lats = rng.uniform(-90,90,1000)
+        self.lons = rng.uniform(-180,180,1000)
+
+    def test_region_mask_rect(self):
+        bbox = [55.,75.,-10.,30.]
+        mask = regionmod.get_region_mask(self.lats,self.lons,bbox)
+        ref = [(lat >= bbox[0] and lat <= bbox[1]
+                and lon >= bbox[2] and lon <= bbox[3])
+               for lat,lon in zip(self.lats,self.lons)]
+        self.assertEqual(list(mask),ref)
+
+    def test_region_mask_dateline(self):
+        mask = regionmod.get_region_mask(self.lats,self.lons,
+                                         [-30.,30.,170.,190.])
+        ref = [(abs(lat) <= 30 and abs(lon) >= 170)
+               for lat,lon in zip(self.lats,self.lons)]
+        self.assertEqual(list(mask),ref)
+        mask360 = regionmod.get_region_mask(self.lats,self.lons%360,
+                                         [-30.,30.,170.,-170.])
+        self.assertEqual(list(mask360),ref)
+
+    def test_region_bbox_poly(self):
+        poly = {'lats':[50,50,60,60],'lons':[-10,10,10,-10]}
+        self.assertEqual(regionmod.get_region_bbox(poly),[50,60,-10,10])
+        # polygons crossing the dateline keep all lons
+        for lons in [[170,-170,-170,170],[170,190,190,170]]:
+            poly = {'lats':[50,50,60,60],'lons':lons}
+            bbox = regionmod.get_region_bbox(poly)
+            self.assertEqual(bbox,[50,60,-180.,180.])
+            mask = regionmod.get_bbox_mask(self.lats,self.lons,bbox)
+            self.assertEqual(list(mask),
+                list((self.lats >= 50) & (self.lats <= 60)))
+
+    def test_model_domain_cache(self):
+        tmpdir = tempfile.mkdtemp()
+        cachefile = os.path.join(tmpdir,'domain_mwam4.npz')
+        self.assertIsNone(regionmod.read_model_domain(cachefile))
+        domain = {'proj4':'+proj=longlat','x':self.lons,'y':self.lats}
+        regionmod.write_model_domain(cachefile,domain)
+        cached = regionmod.read_model_domain(cachefile)
+        self.assertEqual(cached['proj4'],domain['proj4'])
+        np.testing.assert_array_equal(cached['x'],domain['x'])
+        self.assertEqual(os.listdir(tmpdir),['domain_mwam4.npz'])
+        # partially written or corrupt files are rebuilt
+        with open(cachefile,'wb') as f:
+            f.write(b'PK\x03\x04')
+        self.assertIsNone(regionmod.read_model_domain(cachefile))
+        shutil.rmtree(tmpdir)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,96 @@
+import sys
+import os
+import shutil
+import tempfile
+import unittest
+from datetime import datetime
+sys.path.append(r'../wavy')
+import schedulemod
+
+class TestSchedulemod(unittest.TestCase):
+
+    def test_month_periods(self):
+        periods = schedulemod.get_month_periods(datetime(2020,1,15),
+                                                datetime(2020,3,1))
+        self.assertEqual([p[0] for p in periods],
+                         [datetime(2020,1,1),datetime(2020,2,1),
+                          datetime(2020,3,1)])
+        self.assertEqual(periods[1][1],datetime(2020,2,29,23,59,59,999999))
+
+    def test_collocation_tasks(self):
+        tasks = schedulemod.make_collocation_tasks('mwam4',['s3a','s3b'],
+                                                   [0,6],
+                                                   datetime(2020,1,31),
+                                                   datetime(2020,2,1,18),
+                                                   date_incr=6,twin=30)
+        self.assertEqual(len(tasks),8)
+        # fc_dates within twin of the month are shared by both tasks
+        self.assertEqual(tasks[0]['edate'],datetime(2020,2,1))
+        self.assertEqual(tasks[1]['sdate'],datetime(2020,2,1))
+        self.assertEqual(tasks[1]['period'][0],datetime(2020,2,1))
+
+    def test_chunk_periods(self):
+        periods = schedulemod.get_chunk_periods(datetime(2020,1,30,12),
+                                                datetime(2020,2,3),chunk=2)
+        self.assertEqual([p[0] for p in periods],
+                         [datetime(2020,1,1),datetime(2020,2,1),
+                          datetime(2020,2,3)])
+        # chunks do not cross months
+        self.assertEqual(periods[0][1],datetime(2020,1,31,23,59,59,999999))
+        self.assertEqual(periods[-1][1],datetime(2020,2,29,23,59,59,999999))
+
+    def test_run_chunked(self):
+        tmpdir = tempfile.mkdtemp()
+        statefile = os.path.join(tmpdir,'manifest.json')
+        tasks = schedulemod.make_collocation_tasks('mwam4',['s3a'],[0],
+                                                   datetime(2020,1,1),
+                                                   datetime(2020,1,6),
+                                                   chunk=2)
+        inputs = {'file':1}
+        def fingerprint(task):
+            return dict(inputs)
+        def fct(task):
+            status = 'failed' if task['period'][0].day == 3 else 'done'
+            return {'task':task,'status':status,'nvalues':0,'error':None}
+        def run(fct):
+            reports = schedulemod.run_chunked(tasks,fct=fct,
+                                              statefile=statefile,
+                                              fingerprint=fingerprint)
+            return [r['status'] for r in reports]
+        self.assertEqual(run(fct),['done','failed'])
+        fct = lambda task: {'task':task,'status':'done','nvalues':0,
+                            'error':None}
+        self.assertEqual(run(fct),['skipped','done','done'])
+        self.assertEqual(run(fct),['skipped','skipped','skipped'])
+        # changed inputs are reprocessed
+        inputs['file'] = 2
+        self.assertEqual(run(fct),['done','done','done'])
+        shutil.rmtree(tmpdir)
+
+    def test_manifest_next_to_output(self):
+        tmpdir = tempfile.mkdtemp()
+        def make_tasks(missions,sdate,edate):
+            return schedulemod.make_collocation_tasks('mwam4',missions,
+                            [0],sdate,edate,region='mwam4',
+                            path=tmpdir + '/mwam4/%Y/%m/',
+                            filename='mwam4_coll_ts_%Y%m.nc')
+        tasks = make_tasks(['s3a'],datetime(2020,1,1),datetime(2020,1,31))
+        statefile = schedulemod.get_manifest_file(tasks)
+        self.assertEqual(statefile,os.path.join(tmpdir,'mwam4',
+                                            'collocation_manifest.json'))
+        fct = lambda task: {'task':task,'status':'done','nvalues':0,
+                            'error':None}
+        fingerprint = lambda task: {'file':1}
+        schedulemod.run_tasks(tasks,fct=fct,fingerprint=fingerprint)
+        # a widened request finds the completed month
+        tasks = make_tasks(['s3a','s3b'],datetime(2020,1,1),
+                           datetime(2020,2,29))
+        self.assertEqual(schedulemod.get_manifest_file(tasks),statefile)
+        reports = schedulemod.run_tasks(tasks,fct=fct,
+                                        fingerprint=fingerprint)
+        self.assertEqual([r['status'] for r in reports],
+                         ['skipped','done','done','done'])
+        shutil.rmtree(tmpdir)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,18 +1,112 @@
 import sys
 import os
 import unittest
-from datetime import datetime
+from datetime import datetime, timedelta
+import numpy as np
 sys.path.append(r'../wavy')
-import yaml
 import utils
 
-class TestSatmod(unittest.TestCase):
+class TestUtils(unittest.TestCase):
 
     def setUp(self):
+        rng = np.random.RandomState(1)
+        self.sdate = datetime(2020,11,1)
+        secs = np.sort(rng.randint(0,3*24*3600,size=500))
+        self.dtime = [self.sdate + timedelta(seconds=int(s)) for s in secs]
+        self.target = [self.sdate + timedelta(hours=h) for h in range(72)]
+        self.twin = 30
 
-    def test_satellite_class_object(self):
+    def test_collocate_times_window(self):
+        idx = utils.collocate_times(self.dtime,target_t=self.target,
+                                    twin=self.twin)
+        ref = []
+        for t in self.target:
+            ref += [i for i in range(len(self.dtime))
+                    if (self.dtime[i] >= t-timedelta(minutes=self.twin)
+                    and self.dtime[i] <= t+timedelta(minutes=self.twin))]
+        self.assertEqual(list(idx),ref)
 
-    def tearDown(self):
+    def test_collocate_times_interval_unsorted(self):
+        dtime = self.dtime[::-1]
+        sdate = self.sdate + timedelta(hours=5)
+        edate = self.sdate + timedelta(hours=20)
+        idx = utils.collocate_times(dtime,sdate=sdate,edate=edate,twin=10)
+        ref = [i for i in range(len(dtime))
+               if (dtime[i] >= sdate-timedelta(minutes=10)
+               and dtime[i] <= edate+timedelta(minutes=10))]
+        self.assertEqual(list(idx),ref)
+
+    def test_collocate_times_exact(self):
+        target = self.dtime[10:20] + [datetime(1999,1,1)]
+        idx = utils.collocate_times(self.dtime,target_t=target)
+        ref = [self.dtime.index(t) for t in target if t in self.dtime]
+        self.assertEqual(list(idx),ref)
+
+    def test_find_nearest_times(self):
+        idx = utils.find_nearest_times(self.dtime,self.target)
+        for t,i in zip(self.target,idx):
+            diffs = [abs((t-d).total_seconds()) for d in self.dtime]
+            self.assertEqual(diffs[i],min(diffs))
+
+    def test_obs_table_filter(self):
+        secs = [(t-datetime(2000,1,1)).total_seconds() for t in self.dtime]
+        table = utils.obs_table_class({'time':secs,
+                    'time_unit':'seconds since 2000-01-01 00:00:00',
+                    'sea_surface_wave_significant_height':list(
+                                        np.linspace(0,5,len(secs)))})
+        self.assertEqual(table['sea_surface_wave_significant_height'].dtype,
+                         np.float32)
+        self.assertEqual(list(table['datetime']),self.dtime)
+        idx = utils.collocate_times(table.get_datetime64(),
+                                    target_t=self.target,twin=self.twin)
+        subtable = table.filter(idx)
+        self.assertEqual(list(subtable['datetime']),
+                         [self.dtime[i] for i in idx])
+        self.assertEqual(subtable['time_unit'],table['time_unit'])
+
+    def test_find_files_in_period(self):
+        filelst = ['global_vavh_l3_rt_s3a_20201101T' + h
+                   + '0000_20201101T' + h + '5959_20201102T000000.nc'
+                   for h in ['00','01','02','03']] + ['readme.txt']
+        start, end, creation = utils.parse_file_dates(filelst)
+        self.assertEqual(start[1],np.datetime64('2020-11-01T01:00:00'))
+        self.assertEqual(end[1],np.datetime64('2020-11-01T01:59:59'))
+        self.assertTrue(np.isnat(creation[-1]))
+        idx = utils.find_files_in_period(filelst,
+                                         datetime(2020,11,1,1,30),
+                                         datetime(2020,11,1,2,10))
+        self.assertEqual(list(idx),[1,2])
+
+    def test_window_nanstats(self):
+        ts = np.array([1.,2.,np.nan,4.,8.,3.])
+        lo, hi = np.array([0,1,3,5]), np.array([3,4,6,5])
+        mean, std = utils.window_nanstats(ts,lo,hi)
+        for i in range(3):
+            self.assertAlmostEqual(mean[i],np.nanmean(ts[lo[i]:hi[i]]))
+            self.assertAlmostEqual(std[i],np.nanstd(ts[lo[i]:hi[i]]))
+        self.assertTrue(np.isnan(mean[3]))
+
+    def test_identify_outliers(self):
+        rng = np.random.RandomState(1)
+        ts = 2. + rng.normal(0,.1,200)
+        ts[[50,120]] = [6.,40.]
+        time = np.arange(200)
+        idx = utils.identify_outliers(time,ts)
+        self.assertIn(50,idx)
+        self.assertIn(120,idx)
+        # neighbour ratio of the step from 9 to 3
+        ts = np.array([3.,3.,3.,9.,3.,3.])
+        idx = utils.identify_outliers(np.arange(6),ts,block=25)
+        self.assertEqual(list(idx),[3,4])
+
+    def test_boot_idx(self):
+        bidx = utils.get_boot_idx(10,4,blocksize=3,
+                                  rng=np.random.default_rng(1))
+        self.assertEqual(bidx.shape,(4,10))
+        # blocks of consecutive indices
+        self.assertTrue(np.all(np.diff(bidx[:,:3],axis=1) == 1))
+        b, bidx = utils.bootstr(np.arange(10.),5)
+        self.assertTrue(np.array_equal(b,bidx))
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,94 @@
+import sys
+import os
+import shutil
+import tempfile
+import unittest
+import numpy as np
+from datetime import datetime, timedelta
+sys.path.append(r'../wavy')
+import validationmod
+import ncmod
+
+class TestValidationmod(unittest.TestCase):
+
+    def setUp(self):
+        rng = np.random.default_rng(1)
+        self.model = rng.gamma(2,1.5,500)
+        self.obs = self.model + rng.normal(0,.5,500)
+        self.model[::17] = np.nan
+        self.obs[::23] = np.nan
+
+    def test_validate(self):
+        valid_dict = validationmod.validate({'model_values':self.model,
+                                             'obs_values':self.obs})
+        msd, rmsd = validationmod.calc_rmsd(self.model,self.obs)
+        self.assertAlmostEqual(valid_dict['rmsd'],rmsd)
+        self.assertAlmostEqual(valid_dict['bias'],
+                    validationmod.calc_bias(self.model,self.obs))
+        self.assertAlmostEqual(valid_dict['corr'],
+                    validationmod.calc_corrcoef(self.model,self.obs))
+        self.assertAlmostEqual(valid_dict['drmsd'],
+                    validationmod.calc_drmsd(self.model,self.obs)[1])
+        self.assertAlmostEqual(valid_dict['SI'][1],
+                    validationmod.calc_scatter_index(self.model,self.obs)[1])
+        self.assertEqual(valid_dict['nov'],500)
+
+    def test_grouped_stats(self):
+        leadtimes = np.arange(500)%3
+        missions = np.where(np.arange(500)%2,'s3a','s3b')
+        stats = validationmod.calc_validation_stats(self.model,self.obs,
+                                        groups=[leadtimes,missions])
+        self.assertEqual(len(stats['keys']),6)
+        for i, (leadtime, mission) in enumerate(stats['keys']):
+            idx = (leadtimes == leadtime) & (missions == mission)
+            valid_dict = validationmod.validate(
+                                {'model_values':self.model[idx],
+                                 'obs_values':self.obs[idx]})
+            self.assertAlmostEqual(stats['rmsd'][i],valid_dict['rmsd'])
+            self.assertAlmostEqual(stats['mop'][i],valid_dict['mop'])
+            self.assertEqual(stats['nov'][i],valid_dict['nov'])
+
+    def test_accumulator(self):
+        valid_dict = validationmod.validate({'model_values':self.model,
+                                             'obs_values':self.obs})
+        tmpdir = tempfile.mkdtemp()
+        pathtofile = os.path.join(tmpdir,'acc.nc')
+        for i, idx in enumerate(np.array_split(np.arange(500),5)):
+            acc = validationmod.validation_accumulator_class()
+            acc.update(self.model[idx],self.obs[idx])
+            ncmod.dumptonc_accumulator(pathtofile,'test',
+                                       datetime(2020,1,1+i),
+                                       'seconds since 1970-01-01',
+                                       acc.state)
+        # a rerun replaces the record
+        ncmod.dumptonc_accumulator(pathtofile,'test',datetime(2020,1,5),
+                                   'seconds since 1970-01-01',acc.state)
+        acc = validationmod.read_accumulator([pathtofile])
+        for key in ['mop','mor','rmsd','drmsd','corr','mad','bias']:
+            self.assertAlmostEqual(acc.get_stats()[key],valid_dict[key])
+        self.assertEqual(acc.get_stats()['nov'],500)
+        acc = validationmod.read_accumulator([pathtofile],
+                                    sdate=datetime(2020,1,2),
+                                    edate=datetime(2020,1,3))
+        self.assertEqual(acc.get_stats()['nov'],200)
+        shutil.rmtree(tmpdir)
+
+    def test_bootstrap(self):
+        boot_dict = validationmod.validate({'model_values':self.model,
+                                            'obs_values':self.obs},
+                                           boot=True,reps=50)
+        self.assertEqual(boot_dict['rmsd'].shape,(50,))
+        # replicates are reproducible with seed
+        boot1 = validationmod.calc_bootstrap_stats(self.model,self.obs,
+                                                   reps=50,seed=1,
+                                                   maxvalues=1000)
+        boot2 = validationmod.calc_bootstrap_stats(self.model,self.obs,
+                                                   reps=50,seed=1,
+                                                   maxvalues=1000)
+        self.assertTrue(np.array_equal(boot1['rmsd'],boot2['rmsd']))
+        boot = validationmod.calc_bootstrap_stats(self.model,self.obs,
+                                                  reps=50,blocksize=5)
+        self.assertTrue(np.all(np.abs(boot['corr']) <= 1))
+
+if __name__ == '__main__':
+    unittest.main()
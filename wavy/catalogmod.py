@@ -0,0 +1,210 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# ---------------------------------------------------------------------#
+'''
+This module encompasses classes and methods to maintain a persistent
+catalogue of local observation files (e.g. altimeter L3 files). For
+each file the path, min/max time and the lat/lon bounding box of its
+footprints are stored in a SQLite database such that files can be
+selected for a time window and region without opening them again.
+'''
+# --- import libraries ------------------------------------------------#
+# standard library imports
+import os
+import sqlite3
+import numpy as np
+import netCDF4
+import yaml
+from datetime import datetime
+from dateutil.relativedelta import relativedelta
+
+# own imports
+from utils import make_epoch_array, make_datetime64_array
+from utils import parse_file_dates
+
+# ---------------------------------------------------------------------#
+
+# read yaml config files:
+moddir = os.path.abspath(os.path.join(os.path.dirname( __file__ ), '..', 'config/variable_info.yaml'))
+with open(moddir,'r') as stream:
+    variable_info=yaml.safe_load(stream)
+
+# --- global functions ------------------------------------------------#
+
+def get_local_dirs(path_local,sdate,edate):
+    '''
+    returns the monthly directories (path_local/%Y/%m/)
+    spanning sdate to edate
+    '''
+    if path_local == 'tmp_unittest/':
+        return [path_local]
+    dirlst = []
+    tmpdate = datetime(sdate.year,sdate.month,1)
+    while tmpdate <= edate:
+        dirlst.append(path_local + tmpdate.strftime('%Y/%m/'))
+        tmpdate = tmpdate + relativedelta(months=+1)
+    return dirlst
+
+def get_file_summary(pathtofile):
+    '''
+    reads time and coordinates of one file and returns
+    tmin, tmax (seconds since 1970-01-01) and the bounding box
+    latmin, latmax, lonmin, lonmax (lons within -180 to 180 degrees)
+    returns None if the file cannot be read
+    '''
+    stdnames = {variable_info[var]['standard_name']:var
+                for var in ['time','lats','lons']}
+    summary = {}
+    try:
+        f = netCDF4.Dataset(pathtofile,'r')
+    except (IOError,OSError) as e:
+        print(e)
+        return None
+    try:
+        for ncvar in f.variables:
+            stdname = getattr(f.variables[ncvar],'standard_name',None)
+            if stdname not in stdnames or stdnames[stdname] in summary:
+                continue
+            values = np.ma.filled(
+                        f.variables[ncvar][:].astype('float64'),np.nan)
+            if stdnames[stdname] == 'time':
+                values = make_epoch_array(
+                        values[~np.isnan(values)],
+                        f.variables[ncvar].units)/1e6
+            elif (stdnames[stdname] == 'lons'
+            and getattr(f.variables[ncvar],'valid_min',None) == 0):
+                values = ((values - 180) % 360) - 180
+            summary[stdnames[stdname]] = values
+    finally:
+        f.close()
+    if (len(summary) < 3 or len(summary['time']) < 1
+    or np.all(np.isnan(summary['lats']))):
+        return None
+    return (np.min(summary['time']), np.max(summary['time']),
+            np.nanmin(summary['lats']), np.nanmax(summary['lats']),
+            np.nanmin(summary['lons']), np.nanmax(summary['lons']))
+
+class catalog_class():
+    '''
+    Class to handle the catalogue of local files of one
+    mission and provider, stored as SQLite database
+    usage:
+        catalog = catalog_class(dbfile)
+        catalog.update(dirlst)
+        pathlst = catalog.query(sdate,edate,bbox=None)
+    '''
+
+    def __init__(self,dbfile):
+        try:
+            self.con = sqlite3.connect(dbfile,timeout=60)
+            self.create_table()
+        except sqlite3.Error as e:
+            print(e)
+            print('Catalogue ' + dbfile + ' not accessible, '
+                + 'using temporary catalogue in memory')
+            self.con = sqlite3.connect(':memory:')
+            self.create_table()
+        self.dbfile = dbfile
+
+    def create_table(self):
+        self.con.execute(
+            'CREATE TABLE IF NOT EXISTS files ('
+            + 'path TEXT PRIMARY KEY, dirpath TEXT, '
+            + 'mtime REAL, size INTEGER, '
+            + 'tmin REAL, tmax REAL, '
+            + 'latmin REAL, latmax REAL, lonmin REAL, lonmax REAL)')
+        self.con.execute(
+            'CREATE INDEX IF NOT EXISTS files_time ON files (tmin, tmax)')
+        self.con.commit()
+
+    def update(self,dirlst,sdate=None,edate=None):
+        '''
+        adds new or modified files of the given directories
+        to the catalogue and removes entries of deleted files
+        if sdate and edate are given, only files whose filename
+        time stamps overlap this period are opened, the others are
+        catalogued by their filename time stamps and opened once
+        they are needed
+        '''
+        count = 0
+        for dirpath in dirlst:
+            try:
+                filelst = os.listdir(dirpath)
+            except FileNotFoundError as e:
+                print(e)
+                continue
+            known = {row[0]:(row[1],row[2]) for row in self.con.execute(
+                'SELECT path, mtime, size FROM files WHERE dirpath=?',
+                (dirpath,))}
+            # files only catalogued by filename time stamps so far
+            pending = set([row[0] for row in self.con.execute(
+                'SELECT path FROM files WHERE dirpath=? '
+                + 'AND tmin IS NOT NULL AND latmin IS NULL',
+                (dirpath,))])
+            newlst = []
+            for filename in filelst:
+                pathtofile = os.path.join(dirpath,filename)
+                if (not filename.endswith('.nc')
+                or not os.path.isfile(pathtofile)):
+                    continue
+                stat = os.stat(pathtofile)
+                unchanged = (known.pop(pathtofile,None)
+                             == (stat.st_mtime,stat.st_size))
+                if unchanged and pathtofile not in pending:
+                    continue
+                newlst.append((pathtofile,stat,unchanged))
+            if sdate is not None and edate is not None:
+                start, end, creation = parse_file_dates(
+                                        [e[0] for e in newlst])
+                needed = ((start <= make_datetime64_array(edate)[0])
+                        & (end >= make_datetime64_array(sdate)[0]))
+                # files without time stamps in filename are opened
+                needed |= np.isnat(start)
+            else:
+                needed = np.ones(len(newlst),dtype=bool)
+            rows = []
+            for i, (pathtofile, stat, unchanged) in enumerate(newlst):
+                if needed[i]:
+                    summary = get_file_summary(pathtofile)
+                    if summary is None:
+                        # keep unreadable files to not retry them
+                        summary = (None,)*6
+                else:
+                    if unchanged:
+                        continue
+                    summary = (float(start[i].astype('int64')),
+                               float(end[i].astype('int64'))) \
+                               + (None,)*4
+                rows.append((pathtofile,dirpath,
+                             stat.st_mtime,stat.st_size) + summary)
+            self.con.executemany(
+                'INSERT OR REPLACE INTO files VALUES (?,?,?,?,?,?,?,?,?,?)',
+                rows)
+            self.con.executemany('DELETE FROM files WHERE path=?',
+                                 [(path,) for path in known])
+            self.con.commit()
+            count += len(rows)
+        if count > 0:
+            print(str(count) + ' files added to catalogue ' + self.dbfile)
+
+    def query(self,sdate,edate,bbox=None):
+        '''
+        returns sorted np.array of paths of files with footprints
+        between sdate and edate and within
+        bbox = [llcrnrlat,urcrnrlat,llcrnrlon,urcrnrlon] (optional)
+        '''
+        epoch = datetime(1970,1,1)
+        sql = 'SELECT path FROM files WHERE tmax>=? AND tmin<=?'
+        args = [(sdate-epoch).total_seconds(),
+                (edate-epoch).total_seconds()]
+        if bbox is not None:
+            sql += ' AND latmax>=? AND latmin<=?'
+            args += [bbox[0],bbox[1]]
+            if bbox[2] <= bbox[3]:
+                sql += ' AND lonmax>=? AND lonmin<=?'
+                args += [bbox[2],bbox[3]]
+        sql += ' ORDER BY path'
+        return np.array([row[0] for row in self.con.execute(sql,args)])
+
+    def close(self):
+        self.con.close()
@@ -17,23 +17,30 @@ import os
 import time
 import calendar
 from dateutil.relativedelta import relativedelta
-import pyresample
+from scipy.spatial import cKDTree
+import pickle
+import tempfile
 import xarray as xa
 import pyproj
 from tqdm import tqdm
-from copy import deepcopy
+from copy import deepcopy, copy
 
 # own imports
 from utils import haversine, haversine_new, collocate_times
+from utils import find_nearest_times, obs_view_class
+from utils import make_datetime64_array, obs_table_class
 from utils import progress, make_fc_dates
 from utils import make_pathtofile
 from utils import hour_rounder
-from utils import NoStdStreams
+from utils import NoStdStreams, file_lock_class
+from utils import make_grid_fingerprint
 from modelmod import model_class, make_model_filename_wrapper
 from modelmod import get_model_filedate, get_filevarname
 from modelmod import model_class,get_model
+from modelmod import get_model_iter, get_model_grid
+from modelmod import get_model_ts_at_points, get_model_fc_mode_batch
 from ncmod import dumptonc_ts_collocation
-from ncmod import find_attr_in_nc, ncdumpMeta
+from ncmod import find_attr_in_nc, ncdumpMeta, get_nc_dataset
 from satmod import satellite_class
 from stationmod import station_class
 # ---------------------------------------------------------------------#
@@ -57,23 +64,140 @@ with open(moddir,'r') as stream:
 
 flatten = lambda l: [item for sublist in l for item in sublist]
 
-def collocation_fct(obs_lons,obs_lats,model_lons,model_lats):
-    grid = pyresample.geometry.GridDefinition(\
-                                lats=model_lats, \
-                                lons=model_lons)
-    # Define some sample points
-    swath = pyresample.geometry.SwathDefinition(lons=obs_lons,
-                                                lats=obs_lats)
-    # Determine nearest (great circle distance) neighbour in the grid.
-    valid_input_index, valid_output_index, index_array, distance_array = \
-                            pyresample.kd_tree.get_neighbour_info(
-                            source_geo_def=grid,
-                            target_geo_def=swath,
-                            radius_of_influence=1000000000,
-                            neighbours=1)
-    # get_neighbour_info() returns indices in the
-    # flattened lat/lon grid. Compute the 2D grid indices:
-    index_array_2d = np.unravel_index(index_array, grid.shape)
+def lonlat2xyz(lons,lats,R=6370997.):
+    """
+    convert lon/lat in degrees to cartesian coordinates in meters
+    """
+    lons = np.deg2rad(np.asarray(lons,dtype='float64'))
+    lats = np.deg2rad(np.asarray(lats,dtype='float64'))
+    x = R * np.cos(lats) * np.cos(lons)
+    y = R * np.cos(lats) * np.sin(lons)
+    z = R * np.sin(lats)
+    return np.column_stack((x.ravel(),y.ravel(),z.ravel()))
+
+class grid_index_class():
+    '''
+    spatial index of a model grid: kd-tree on cartesian coordinates
+    built once and reused for all footprints collocated on this grid
+    '''
+    def __init__(self,model_lons,model_lats,model=None,fingerprint=None):
+        model_lons = np.ma.filled(model_lons,np.nan).astype('float64')
+        model_lats = np.ma.filled(model_lats,np.nan).astype('float64')
+        if len(model_lons.shape)==1:
+            model_lons, model_lats = np.meshgrid(model_lons,model_lats)
+        valid = ( ~np.isnan(model_lons.ravel())
+                & ~np.isnan(model_lats.ravel())
+                & (np.abs(model_lats.ravel()) <= 90) )
+        self.model = model
+        self.shape = model_lats.shape
+        if fingerprint is None:
+            fingerprint = make_grid_fingerprint(model_lons,model_lats)
+        self.fingerprint = fingerprint
+        self.valid_input_index = np.where(valid)[0]
+        self.tree = cKDTree(lonlat2xyz(model_lons.ravel()[valid],
+                                       model_lats.ravel()[valid]))
+
+    def query(self,obs_lons,obs_lats):
+        """
+        nearest grid point for given footprints
+        returns same output as collocation_fct
+        """
+        obs_lons = np.ma.filled(obs_lons,np.nan).astype('float64')
+        obs_lats = np.ma.filled(obs_lats,np.nan).astype('float64')
+        valid_output_index = ~np.isnan(obs_lons) & ~np.isnan(obs_lats)
+        distance_array = np.full(len(obs_lons),np.inf)
+        index_array = np.zeros(len(obs_lons),dtype='int64')
+        if np.any(valid_output_index):
+            dist, idx = self.tree.query(lonlat2xyz(
+                                        obs_lons[valid_output_index],
+                                        obs_lats[valid_output_index]))
+            distance_array[valid_output_index] = dist
+            index_array[valid_output_index] = self.valid_input_index[idx]
+        index_array_2d = np.unravel_index(index_array, self.shape)
+        return index_array_2d, distance_array, valid_output_index
+
+# process wide cache of grid_index_class objects
+grid_index_cache = {}
+
+def read_grid_index(pathtofile):
+    """
+    returns grid_index_class object saved in pathtofile,
+    None if the file is missing or corrupt
+    """
+    if not os.path.isfile(pathtofile):
+        return None
+    try:
+        with open(pathtofile,'rb') as f:
+            grid_index = pickle.load(f)
+    except (OSError,EOFError,pickle.UnpicklingError,
+            AttributeError,ValueError,KeyError,IndexError) as e:
+        print(e)
+        print('Spatial index is corrupt, it is rebuilt')
+        return None
+    print('Load spatial index from:',pathtofile)
+    return grid_index
+
+def write_grid_index(pathtofile,grid_index):
+    """
+    saves grid_index to pathtofile, the file is replaced atomically
+    such that concurrent readers never see a partial file
+    """
+    cachepath = os.path.dirname(os.path.abspath(pathtofile))
+    os.makedirs(cachepath,exist_ok=True)
+    fd, tmpfile = tempfile.mkstemp(dir=cachepath,suffix='.tmp')
+    try:
+        with os.fdopen(fd,'wb') as f:
+            pickle.dump(grid_index,f)
+        os.replace(tmpfile,pathtofile)
+    except OSError as e:
+        print(e)
+        print('Spatial index could not be saved')
+        if os.path.exists(tmpfile):
+            os.remove(tmpfile)
+        return
+    print('Save spatial index to:',pathtofile)
+
+def get_grid_index(model_lons,model_lats,model=None,cachepath=None,
+    fingerprint=None):
+    """
+    returns grid_index_class object for given model grid
+    search order: process cache, file in cachepath, new build
+    if cachepath is given new spatial indices are saved there
+    the fingerprint of the grid (make_grid_fingerprint) should be
+    given when the same grid is used repeatedly, it is computed
+    from the full grid otherwise
+    """
+    if cachepath is None and 'grid_index' in collocation_dict:
+        cachepath = collocation_dict['grid_index'].get('cachepath')
+    if fingerprint is None:
+        fingerprint = make_grid_fingerprint(model_lons,model_lats)
+    key = (model,fingerprint)
+    if key in grid_index_cache:
+        return grid_index_cache[key]
+    pathtofile = None
+    grid_index = None
+    if cachepath is not None:
+        pathtofile = os.path.join(cachepath,
+                        str(model) + '_grid_index_' + fingerprint + '.pkl')
+        grid_index = read_grid_index(pathtofile)
+    if grid_index is None:
+        grid_index = grid_index_class(model_lons,model_lats,
+                                      model=model,fingerprint=fingerprint)
+        if pathtofile is not None:
+            write_grid_index(pathtofile,grid_index)
+    grid_index_cache[key] = grid_index
+    return grid_index
+
+def collocation_fct(obs_lons,obs_lats,model_lons,model_lats,model=None,
+    fingerprint=None):
+    """
+    Determine nearest neighbour in the model grid (cartesian distance
+    on the sphere) for each footprint using a cached spatial index
+    """
+    grid_index = get_grid_index(model_lons,model_lats,model=model,
+                                fingerprint=fingerprint)
+    index_array_2d, distance_array, valid_output_index = \
+                            grid_index.query(obs_lons,obs_lats)
     return  index_array_2d, distance_array, valid_output_index,
 
 def find_valid_fc_dates_for_model_and_leadtime(fc_dates,model,leadtime):
@@ -92,7 +216,7 @@ def check_if_file_is_valid(fc_date,model,leadtime):
     fname = make_model_filename_wrapper(model,fc_date,leadtime)
     print('Check if requested file:\n',fname,'\nis available and valid')
     try:
-        nc = netCDF4.Dataset(fname,mode='r')
+        nc = get_nc_dataset(fname)
         time = nc.variables['time']
         dt = netCDF4.num2date(time[:],time.units)
         if fc_date in list(dt):
@@ -107,19 +231,14 @@ def check_if_file_is_valid(fc_date,model,leadtime):
         return False
 
 def get_closest_date(overdetermined_lst,target_lst):
-    idx = []
-    for i in range(len(target_lst)):
-        diffs=np.abs( [ ( target_lst[i]
-                        - overdetermined_lst[j] ).total_seconds()
-                        for j in range(len(overdetermined_lst)) ] )
-        mindiff= np.min(diffs)
-        idx.append(list(diffs).index(mindiff))
-    return idx
+    idx = find_nearest_times(overdetermined_lst,target_lst)
+    return list(idx)
 
 def collocate_station_ts(obs_obj=None,model=None,distlim=None,\
     leadtime=None,date_incr=None):
     """
-    Some info
+    collocates station time series with the nearest model grid cell,
+    only this grid cell is read from each model file
     """
     fc_date = make_fc_dates(obs_obj.sdate,obs_obj.edate,date_incr)
     # get coinciding date between fc_date and dates in obs_obj
@@ -142,93 +261,189 @@ def collocate_station_ts(obs_obj=None,model=None,distlim=None,\
     # find valid dates for given leadtime and model
     fc_date = find_valid_fc_dates_for_model_and_leadtime(\
                                     fc_date,model,leadtime)
-    # check if file exists and if it includes desired time
-    # if not check next possible file
-    check = False
-    for d in range(len(fc_date)):
-        check = check_if_file_is_valid(fc_date[d],model,leadtime)
-        if check == True:
-            break
-    if check == True:
-        mc_obj = model_class( model=model,
-                              fc_date=fc_date[d],
-                              leadtime=leadtime,
-                              varalias=obs_obj.varalias)
-        col_obj = collocation_class( mc_obj=mc_obj,
-                                     obs_obj=obs_obj,
-                                     distlim=distlim )
-        model_vals = [col_obj.vars['model_values'][0]]
-        tmpdate = hour_rounder(col_obj.vars['datetime'][0])
-        model_datetime = [ datetime(tmpdate.year,
-                                    tmpdate.month,
-                                    tmpdate.day,
-                                    tmpdate.hour) ]
-        model_time = [netCDF4.date2num(model_datetime[0],
-                        units=col_obj.vars['time_unit'])]
-    if check == False:
+    results_dict = {
+            'valid_date':None,
+            'time':[],
+            'time_unit':obs_obj.vars['time_unit'],
+            'datetime':[],
+            'distance':[],
+            'model_values':[],
+            'model_lons':[],
+            'model_lats':[],
+            'obs_values':[],
+            'obs_lons':[],
+            'obs_lats':[],
+            'collocation_idx_x':[],
+            'collocation_idx_y':[],
+            }
+    try:
+        model_lons, model_lats, filestr = get_model_grid(model=model,
+                                                    fc_dates=fc_date,
+                                                    leadtime=leadtime)
+    except FileNotFoundError as e:
+        print(e)
         print('No valid model file available!')
-    else:
-        for i in range(d+1,len(fc_date)):
-#            for t in range(1):
-            try:
-                check = check_if_file_is_valid(fc_date[i],model,leadtime)
-                if check == False:
-                    raise FileNotFoundError
-                mc_obj = model_class( model=model,
-                                      fc_date=fc_date[i],
+        return results_dict
+    if distlim == None:
+        distlim = 6
+    # nearest grid cell of the station
+    obs_lons = np.array(obs_obj.vars['longitude'][:1])
+    obs_lats = np.array(obs_obj.vars['latitude'][:1])
+    index_array_2d, distance_array, valid_output_index =\
+                                collocation_fct(
+                                obs_lons, obs_lats,
+                                model_lons, model_lats,
+                                model=model)
+    if not distance_array[0] < distlim*1000:
+        print('No model grid point within distlim:',distlim,'km')
+        return results_dict
+    idx_x = index_array_2d[0]
+    idx_y = index_array_2d[1]
+    # read only this grid cell from all model files
+    model_ts = get_model_ts_at_points(model=model,
+                                      fc_dates=fc_date,
+                                      varalias=obs_obj.varalias,
                                       leadtime=leadtime,
-                                      varalias=obs_obj.varalias )
-                model_vals.append( mc_obj.vars[\
-                                   mc_obj.stdvarname][ \
-                                   col_obj.vars['collocation_idx_x'],\
-                                   col_obj.vars['collocation_idx_y']\
-                                   ][0] )
-                model_time.append(mc_obj.vars['time'][0])
-                model_datetime.append( datetime(\
-                                    mc_obj.vars['datetime'][0].year,
-                                    mc_obj.vars['datetime'][0].month,
-                                    mc_obj.vars['datetime'][0].day,
-                                    mc_obj.vars['datetime'][0].hour ) )
-            except FileNotFoundError as e:
-                print(e)
-        # potentially there are different number of values
-        # for obs and model
-        # double check and use only coherent datetimes
-        idx2 = collocate_times( model_datetime,
-                                target_t = obs_obj.vars['datetime'],
-                                twin = obs_obj.twin)
-        col_obj.vars['model_values'] = list(np.array(\
-                                                    model_vals)[idx2])
-        col_obj.vars['time'] = list(np.array(model_time)\
-                                            [idx2])
-        col_obj.vars['datetime'] = list(np.array(\
-                                            model_datetime)[idx2])
-        idx3 = collocate_times(  \
-                            unfiltered_t = obs_obj.vars['datetime'],
-                            target_t = col_obj.vars['datetime'],
+                                      idx_x=idx_x,
+                                      idx_y=idx_y)
+    if len(model_ts['datetime']) == 0:
+        print('No valid model file available!')
+        return results_dict
+    model_vals = list(model_ts[obs_obj.stdvarname][:,0])
+    model_datetime = [ datetime(t.year,t.month,t.day,t.hour)
+                       for t in model_ts['datetime'] ]
+    model_time = list(netCDF4.date2num(model_datetime,
+                        units=results_dict['time_unit']))
+    # potentially there are different number of values
+    # for obs and model
+    # double check and use only coherent datetimes
+    idx2 = collocate_times( model_datetime,
+                            target_t = obs_obj.vars['datetime'],
                             twin = obs_obj.twin)
-        col_obj.vars['obs_values'] = list(np.array(
-                                        obs_obj.vars[
-                                            obs_obj.stdvarname
-                                                    ])[idx3])
-    # valid_date is meaningless for ts application and set to None
-    col_obj.vars['valid_date'] = None
+    results_dict['model_values'] = list(np.array(model_vals)[idx2])
+    results_dict['time'] = list(np.array(model_time)[idx2])
+    results_dict['datetime'] = list(np.array(model_datetime)[idx2])
+    idx3 = collocate_times(  \
+                        unfiltered_t = obs_obj.vars['datetime'],
+                        target_t = results_dict['datetime'],
+                        twin = obs_obj.twin)
+    results_dict['obs_values'] = list(np.array(
+                                    obs_obj.vars[
+                                        obs_obj.stdvarname
+                                                ])[idx3])
     # inflate length of constant sized variables
-    col_obj.vars['distance'] = col_obj.vars['distance']*\
-                                       len(col_obj.vars['datetime'])
-    col_obj.vars['obs_lats'] = col_obj.vars['obs_lats']*\
-                                        len(col_obj.vars['datetime'])
-    col_obj.vars['obs_lons'] = col_obj.vars['obs_lons']*\
-                                        len(col_obj.vars['datetime'])
-    col_obj.vars['collocation_idx_x'] = col_obj.vars['collocation_idx_x']*\
-                                        len(col_obj.vars['datetime'])
-    col_obj.vars['collocation_idx_y'] = col_obj.vars['collocation_idx_y']*\
-                                        len(col_obj.vars['datetime'])
-    col_obj.vars['model_lats'] = col_obj.vars['model_lats']*\
-                                       len(col_obj.vars['datetime'])
-    col_obj.vars['model_lons'] = col_obj.vars['model_lons']*\
-                                        len(col_obj.vars['datetime'])
-    results_dict = col_obj.vars
+    nt = len(results_dict['datetime'])
+    results_dict['distance'] = [distance_array[0]]*nt
+    results_dict['obs_lats'] = [obs_lats[0]]*nt
+    results_dict['obs_lons'] = [obs_lons[0]]*nt
+    results_dict['collocation_idx_x'] = [idx_x[0]]*nt
+    results_dict['collocation_idx_y'] = [idx_y[0]]*nt
+    results_dict['model_lats'] = [model_lats[idx_x[0],idx_y[0]]]*nt
+    results_dict['model_lons'] = [model_lons[idx_x[0],idx_y[0]]]*nt
+    return results_dict
+
+
+def get_station_coords(platforms=None):
+    """
+    returns names, lats, lons of platforms in station_specs.yaml,
+    all platforms if platforms is None
+    """
+    if platforms is None:
+        platforms = list(station_dict['platform'].keys())
+    lats = [station_dict['platform'][p]['coords']['lat'] for p in platforms]
+    lons = [station_dict['platform'][p]['coords']['lon'] for p in platforms]
+    return platforms, np.array(lats), np.array(lons)
+
+def collocate_stations_fc(model=None,sdate=None,edate=None,date_incr=1,
+    leadtimes=None,varalias='Hs',platforms=None,distlim=None):
+    """
+    model values at the nearest grid cell of all platforms for all
+    fc_dates and leadtimes in a single pass over the model output
+    grid indices are computed once with the cached spatial index and
+    each model file is read once for all platforms and leadtimes
+    returns dict with model_values of shape [platform,time,leadtime],
+    NaN where no model value is available or the grid cell is further
+    away than distlim (km)
+    """
+    if leadtimes is None:
+        leadtimes = model_dict[model]['leadtimes']
+    if distlim == None:
+        distlim = 6
+    fc_dates = make_fc_dates(sdate,edate,date_incr)
+    platforms, obs_lats, obs_lons = get_station_coords(platforms)
+    stdvarname = variable_info[varalias]['standard_name']
+    # files with the (fc_date,leadtime) pairs they contain
+    didx = {d:i for i,d in enumerate(fc_dates)}
+    filegroups = {}
+    for j, leadtime in enumerate(leadtimes):
+        for fc_date in find_valid_fc_dates_for_model_and_leadtime(
+                                            fc_dates,model,leadtime):
+            if fc_date not in didx:
+                continue
+            filestr = make_model_filename_wrapper(model,fc_date,leadtime)
+            filegroups.setdefault(filestr,[]).append((didx[fc_date],j))
+    model_values = np.full((len(platforms),len(fc_dates),len(leadtimes)),
+                           np.nan)
+    results_dict = {
+            'platforms':platforms,
+            'leadtimes':leadtimes,
+            'datetime':fc_dates,
+            'model_values':model_values,
+            'obs_lats':obs_lats,
+            'obs_lons':obs_lons,
+            'model_lats':None,
+            'model_lons':None,
+            'distance':None,
+            'collocation_idx_x':None,
+            'collocation_idx_y':None,
+            }
+    # grid indices from first available model file
+    for filestr in filegroups:
+        i, j = filegroups[filestr][0]
+        try:
+            model_lons, model_lats, gridfile = get_model_grid(
+                                                model=model,
+                                                fc_dates=[fc_dates[i]],
+                                                leadtime=leadtimes[j])
+            break
+        except FileNotFoundError as e:
+            print(e)
+    else:
+        print('No valid model file available!')
+        return results_dict
+    index_array_2d, distance_array, valid_output_index =\
+                                collocation_fct(
+                                obs_lons, obs_lats,
+                                model_lons, model_lats,
+                                model=model)
+    idx_x, idx_y = index_array_2d
+    valid = distance_array < distlim*1000
+    results_dict['model_lats'] = model_lats[idx_x,idx_y]
+    results_dict['model_lons'] = model_lons[idx_x,idx_y]
+    results_dict['distance'] = distance_array
+    results_dict['collocation_idx_x'] = idx_x
+    results_dict['collocation_idx_y'] = idx_y
+    if not np.any(valid):
+        print('No model grid point within distlim:',distlim,'km')
+        return results_dict
+    for filestr in tqdm(filegroups):
+        dates = sorted(set([fc_dates[i] for i,j in filegroups[filestr]]))
+        try:
+            with NoStdStreams():
+                vardict, filevarname = get_model_fc_mode_batch(
+                                    filestr=filestr,model=model,
+                                    fc_dates=dates,varalias=varalias,
+                                    idx_x=idx_x[valid],idx_y=idx_y[valid],
+                                    skip_missing=True)
+        except (FileNotFoundError, OSError, ValueError) as e:
+            print(e)
+            continue
+        values = {datetime(t.year,t.month,t.day,t.hour,t.minute,t.second):
+                  vardict[stdvarname][k,:]
+                  for k,t in enumerate(vardict['datetime'])}
+        for i, j in filegroups[filestr]:
+            if fc_dates[i] in values:
+                model_values[valid,i,j] = values[fc_dates[i]]
     return results_dict
 
 def collocate_satellite_ts(obs_obj=None,model=None,distlim=None,\
@@ -266,48 +481,38 @@ def collocate_satellite_ts(obs_obj=None,model=None,distlim=None,\
     #M = xa.open_dataset(filestr, decode_cf=True)
     #model_lons = M[flon].data
     #model_lats = M[flat].data
-    for i in tqdm(range(len(fc_date))):
+    # view sharing np.arrays of obs_obj.vars for per step filtering
+    obs_view = obs_view_class(obs_obj)
+    if isinstance(obs_obj.vars,obs_table_class):
+        obs_datetime = obs_obj.vars.get_datetime64()
+    else:
+        obs_datetime = make_datetime64_array(obs_obj.vars['datetime'])
+    # model files are read once for all fc_dates they contain
+    model_steps = get_model_iter(model=model,
+                                 fc_dates=fc_date,
+                                 varalias=obs_obj.varalias,
+                                 leadtime=leadtime)
+    for valid_date, vardict in tqdm(model_steps,total=len(fc_date)):
         for j in range(1):
 #        with NoStdStreams():
             # filter needed obs within time period
-            idx = collocate_times( obs_obj.vars['datetime'],
-                               target_t = [fc_date[i]],
+            idx = collocate_times( obs_datetime,
+                               target_t = [valid_date],
                                twin = obs_obj.twin )
-            # make tmp obs_obj with filtered data
-            obs_obj_tmp = deepcopy(obs_obj)
-            obs_obj_tmp.vars['time'] = list(np.array(\
-                                    obs_obj.vars['time'])[idx])
-            obs_obj_tmp.vars['latitude'] = list(np.array(\
-                                    obs_obj.vars['latitude'])[idx])
-            obs_obj_tmp.vars['longitude'] = list(np.array(\
-                                    obs_obj.vars['longitude'])[idx])
-            obs_obj_tmp.vars[obs_obj.stdvarname] = list(np.array(
-                                    obs_obj.vars[obs_obj.stdvarname])[idx])
+            # view on obs_obj with filtered data, nothing is copied
+            obs_obj_tmp = obs_view.subset(idx)
             # collocate
-            #filestr = make_model_filename_wrapper(model=model,
-            #                              fc_date=fc_date[i],
-            #                              leadtime=leadtime)
-            #M = xa.open_dataset(filestr, decode_cf=True)
-            #filevarname = get_filevarname(model,obs_obj.varalias,
-            #                    variable_info,model_dict,model_meta)
-            ## need function if variable consists of vector components
-            #model_vals = M.sel(time=fc_date[i])[filevarname].data
-            vardict,_,_,_,_ = get_model(model=model,
-                                fc_date=fc_date[i],
-                                varalias=obs_obj.varalias,
-                                leadtime=leadtime)
             results_dict_tmp = collocate_field(\
-                            datein=fc_date[i],\
-#                            model_lats=model_lats,\
-#                            model_lons=model_lons,\
-#                            model_vals=model_vals,\
+                            datein=valid_date,\
                             model_lats=vardict['latitude'],\
                             model_lons=vardict['longitude'],\
                             model_vals=vardict[obs_obj.stdvarname],\
                             obs_obj=obs_obj_tmp,\
-                            distlim=distlim )
+                            distlim=distlim,\
+                            model=model,\
+                            fingerprint=vardict.get('grid_fingerprint'))
         # append to dict
-        results_dict['valid_date'].append(fc_date[i])
+        results_dict['valid_date'].append(valid_date)
         results_dict['time'].append(results_dict_tmp['time'])
         results_dict['datetime'].append(results_dict_tmp['datetime'])
         results_dict['distance'].append(results_dict_tmp['distance'])
@@ -342,7 +547,7 @@ def collocate_satellite_ts(obs_obj=None,model=None,distlim=None,\
 
 def collocate_field(mc_obj=None,obs_obj=None,col_obj=None,distlim=None,
                     datein=None,model_lats=None,model_lons=None,
-                    model_vals=None):
+                    model_vals=None,model=None,fingerprint=None):
     """
     Some info
     """
@@ -351,6 +556,7 @@ def collocate_field(mc_obj=None,obs_obj=None,col_obj=None,distlim=None,
         model_lats = mc_obj.vars['latitude']
         model_lons = mc_obj.vars['longitude']
         model_vals = mc_obj.vars[mc_obj.stdvarname]
+        model = mc_obj.model
     dtime = netCDF4.num2date(obs_obj.vars['time'],obs_obj.vars['time_unit'])
     if isinstance(dtime,np.ndarray):
         dtime = list(dtime)
@@ -382,7 +588,9 @@ def collocate_field(mc_obj=None,obs_obj=None,col_obj=None,distlim=None,
         index_array_2d, distance_array, valid_output_index =\
                                 collocation_fct(
                                 obs_lons, obs_lats,
-                                model_lons, model_lats)
+                                model_lons, model_lats,
+                                model=model,
+                                fingerprint=fingerprint)
         # caution: index_array_2d is tuple
         # impose distlim
         dist_idx = np.where( (distance_array<distlim*1000)&\
@@ -524,12 +732,17 @@ class collocation_class():
         print ('# ----- ')
 
     def write_to_monthly_nc(self,path=None,filename=None):
+        """
+        writes collocated values to monthly files
+        returns list of files written to
+        """
         # divide time into months by loop over months from sdate to edate
+        pathlst = []
         if 'error' in vars(self):
             print('Erroneous collocation_class file detected')
             print('--> dump to netCDF not possible !')
         else:
-            tmpdate = self.sdate
+            tmpdate = datetime(self.sdate.year,self.sdate.month,1)
             edate = self.edate
             while tmpdate <= edate:
                 idxtmp = collocate_times(unfiltered_t=self.vars['datetime'],
@@ -586,9 +799,30 @@ class collocation_class():
                         title = ( 'Collocation of ' + self.stdvarname
                                 + ' observations from ' + self.sat
                                 + ' vs ' + self.model)
-                dumptonc_ts_collocation(self,pathtofile,title)
+                if len(idxtmp) > 0:
+                    # concurrent writers are serialized by a file lock
+                    with file_lock_class(pathtofile):
+                        dumptonc_ts_collocation(self.subset(idxtmp),
+                                                pathtofile,title)
+                    pathlst.append(pathtofile)
                 tmpdate = tmpdate + relativedelta(months = +1)
-        return
+        return pathlst
+
+    def subset(self,idx):
+        """
+        returns shallow copy with all time dependent vars reduced
+        to idx
+        """
+        new = copy(self)
+        n = len(self.vars['time'])
+        new.vars = {}
+        for key in self.vars:
+            if (isinstance(self.vars[key],(list,np.ndarray))
+            and len(self.vars[key]) == n and key != 'valid_date'):
+                new.vars[key] = list(np.array(self.vars[key])[idx])
+            else:
+                new.vars[key] = self.vars[key]
+        return new
 
     def validate_collocated_values(self,**kwargs):
         dtime = self.vars['datetime']
@@ -0,0 +1,270 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# ---------------------------------------------------------------------#
+'''
+This module encompasses classes and methods to download files from
+ftp servers. A pool of persistent authenticated connections is shared
+by a bounded number of worker threads. Failed transfers are retried
+with exponential backoff, files already present with matching size
+and modification time are skipped and partial files are resumed.
+Instead of exiting, a report of all transfers is returned.
+'''
+# --- import libraries ------------------------------------------------#
+# standard library imports
+import os
+import time
+import queue
+import ftplib
+import calendar
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+
+# own imports
+from utils import read_manifest, write_manifest
+
+# ---------------------------------------------------------------------#
+
+class ftp_pool_class():
+    '''
+    Pool of at most nconn persistent ftp connections to server
+    usage:
+        pool = ftp_pool_class(server,user,pw,nconn=4)
+        ftp = pool.get()
+        ...
+        pool.put(ftp)
+        pool.close()
+    '''
+
+    def __init__(self,server,user,pw,nconn=1,port=21,timeout=60):
+        self.server = server
+        self.port = port
+        self.user = user
+        self.pw = pw
+        self.timeout = timeout
+        self.idle = queue.Queue()
+        # limits the number of open connections
+        self.slots = queue.Queue()
+        for i in range(nconn):
+            self.slots.put(i)
+
+    def connect(self):
+        ftp = ftplib.FTP(timeout=self.timeout)
+        ftp.connect(self.server,self.port)
+        ftp.login(self.user,self.pw)
+        ftp.voidcmd('TYPE I')
+        return ftp
+
+    def get(self):
+        '''
+        returns an idle connection or opens a new one
+        '''
+        wait = 0
+        while True:
+            try:
+                ftp = self.idle.get(timeout=wait)
+                break
+            except queue.Empty:
+                pass
+            try:
+                slot = self.slots.get_nowait()
+            except queue.Empty:
+                # all connections busy, wait for one to be returned
+                wait = 1
+                continue
+            try:
+                return self.connect()
+            except:
+                self.slots.put(slot)
+                raise
+        try:
+            ftp.voidcmd('NOOP')
+        except ftplib.all_errors:
+            # connection timed out on server side
+            self.discard(ftp)
+            return self.get()
+        return ftp
+
+    def put(self,ftp):
+        self.idle.put(ftp)
+
+    def discard(self,ftp):
+        '''
+        closes a broken connection and frees its slot
+        '''
+        try:
+            ftp.close()
+        except ftplib.all_errors:
+            pass
+        self.slots.put(None)
+
+    def close(self):
+        while not self.idle.empty():
+            ftp = self.idle.get_nowait()
+            try:
+                ftp.quit()
+            except ftplib.all_errors:
+                ftp.close()
+            self.slots.put(None)
+
+def retry(fct,pool,maxtries=5,backoff=1.):
+    '''
+    calls fct(ftp) with a connection from pool and retries with
+    exponential backoff (backoff*2**attempt seconds) on ftp errors
+    returns result of fct, raises last error if all attempts fail
+    '''
+    for attempt in range(maxtries):
+        try:
+            ftp = pool.get()
+        except ftplib.all_errors as e:
+            error = e
+        else:
+            try:
+                result = fct(ftp)
+            except ftplib.error_perm:
+                # permanent errors (e.g. missing file) are not retried
+                pool.put(ftp)
+                raise
+            except ftplib.all_errors as e:
+                pool.discard(ftp)
+                error = e
+            else:
+                pool.put(ftp)
+                return result
+        if attempt < maxtries - 1:
+            print('Attempt ' + str(attempt+1) + ' failed: ' + str(error))
+            print('Waiting for ' + str(backoff*2**attempt)
+                + ' sec and retry')
+            time.sleep(backoff*2**attempt)
+    raise error
+
+def get_remote_mtime(ftp,remotefile):
+    '''
+    returns modification time of remotefile as unix timestamp,
+    None if the server does not support MDTM
+    '''
+    try:
+        resp = ftp.voidcmd('MDTM ' + remotefile)
+    except ftplib.error_perm:
+        return None
+    mtime = datetime.strptime(resp.split()[-1][:14],'%Y%m%d%H%M%S')
+    return calendar.timegm(mtime.timetuple())
+
+def list_remote_files(pool,remotepath,maxtries=5,backoff=1.):
+    '''
+    returns list of filenames in remotepath
+    '''
+    def nlst(ftp):
+        return [os.path.basename(e) for e in ftp.nlst(remotepath)]
+    return retry(nlst,pool,maxtries=maxtries,backoff=backoff)
+
+def list_remote_files_with_facts(pool,remotepath,maxtries=5,backoff=1.):
+    '''
+    returns dict of filenames in remotepath with their modification
+    time and size as {'modify':'%Y%m%d%H%M%S','size':'123'} (MLSD),
+    both are None if the server only supports NLST
+    '''
+    def mlsd(ftp):
+        try:
+            return {name:{'modify':facts.get('modify'),
+                          'size':facts.get('size')}
+                    for name, facts in ftp.mlsd(remotepath,
+                                    facts=['type','modify','size'])
+                    if facts.get('type','file') == 'file'}
+        except ftplib.error_perm:
+            return {os.path.basename(e):{'modify':None,'size':None}
+                    for e in ftp.nlst(remotepath)}
+    return retry(mlsd,pool,maxtries=maxtries,backoff=backoff)
+
+def get_changed_files(remotepath,listing,manifest):
+    '''
+    returns filenames of listing which are not in manifest or
+    whose modification time or size changed since
+    '''
+    remotepath = remotepath.rstrip('/') + '/'
+    return [name for name in listing
+            if (remotepath + name not in manifest
+            or listing[name]['modify'] is None
+            or manifest[remotepath + name] != listing[name])]
+
+def download_file(pool,remotefile,localfile,maxtries=5,backoff=1.):
+    '''
+    downloads remotefile to localfile, the file is skipped if it
+    exists with same size and modification time, partial downloads
+    (localfile + '.part') are resumed
+    returns dict with status ('downloaded','skipped','failed'),
+    number of transferred bytes and error message
+    '''
+    report = {'file':localfile,'status':None,'bytes':0,'error':None}
+    partfile = localfile + '.part'
+    def transfer(ftp):
+        # listings switch the connection to ascii mode
+        ftp.voidcmd('TYPE I')
+        size = ftp.size(remotefile)
+        mtime = get_remote_mtime(ftp,remotefile)
+        if (os.path.isfile(localfile)
+        and os.path.getsize(localfile) == size
+        and (mtime is None or os.path.getmtime(localfile) == mtime)):
+            return 'skipped'
+        offset = 0
+        if os.path.isfile(partfile):
+            offset = os.path.getsize(partfile)
+            if size is not None and offset > size:
+                offset = 0
+        with open(partfile,'ab' if offset > 0 else 'wb') as f:
+            def write(block):
+                f.write(block)
+                report['bytes'] += len(block)
+            ftp.retrbinary('RETR ' + remotefile,write,
+                           rest=offset if offset > 0 else None)
+        os.replace(partfile,localfile)
+        if mtime is not None:
+            os.utime(localfile,(mtime,mtime))
+        return 'downloaded'
+    try:
+        os.makedirs(os.path.dirname(os.path.abspath(localfile)),
+                    exist_ok=True)
+        report['status'] = retry(transfer,pool,
+                                 maxtries=maxtries,backoff=backoff)
+    except (ftplib.all_errors) as e:
+        report['status'] = 'failed'
+        report['error'] = str(e)
+    return report
+
+def download_files(pool,remotepath,filelst,path_local,nproc=1,
+                   maxtries=5,backoff=1.):
+    '''
+    downloads files in filelst from remotepath to path_local with
+    nproc concurrent transfers, path_local can be a directory or a
+    fct returning the local directory for a given filename
+    returns report dict with lists of downloaded, skipped, and
+    failed files, failed as (filename, error), and the number of
+    transferred bytes
+    '''
+    def get_local_dir(filename):
+        if callable(path_local):
+            return path_local(filename)
+        return path_local
+    def task(filename):
+        return download_file(pool,
+                    remotepath.rstrip('/') + '/' + filename,
+                    os.path.join(get_local_dir(filename),filename),
+                    maxtries=maxtries,backoff=backoff)
+    with ThreadPoolExecutor(max_workers=nproc) as executor:
+        results = list(executor.map(task,filelst))
+    report = {'downloaded':[],'skipped':[],'failed':[],'bytes':0}
+    for filename, result in zip(filelst,results):
+        report['bytes'] += result['bytes']
+        if result['status'] == 'failed':
+            report['failed'].append((filename,result['error']))
+        else:
+            report[result['status']].append(filename)
+    return report
+
+def merge_reports(report,newreport):
+    '''
+    adds newreport to report
+    '''
+    for key in ['downloaded','skipped','failed']:
+        report[key] = report.get(key,[]) + newreport[key]
+    report['bytes'] = report.get('bytes',0) + newreport['bytes']
+    return report
@@ -25,9 +25,11 @@ import time
 
 # own imports
 from utils import progress, hour_rounder, collocate_times
-from utils import make_fc_dates
+from utils import make_fc_dates, find_nearest_times
+from utils import make_grid_fingerprint
 #from collocmod import collocation_class
 from ncmod import ncdumpMeta, get_varname_for_cf_stdname_in_ncfile
+from ncmod import get_nc_dataset
 
 # --- global functions ------------------------------------------------#
 """
@@ -117,7 +119,7 @@ def get_model_fc_mode(filestr,model,fc_date,varalias=None):
     print ("Get model data according to selected date ....")
     print(filestr)
     model_meta = ncdumpMeta(filestr)
-    f = netCDF4.Dataset(filestr,'r')
+    f = get_nc_dataset(filestr)
     stdvarname = variable_info[varalias]['standard_name']
     # get coordinates and time
     lonsname = get_filevarname(model,'lons',variable_info,
@@ -197,12 +199,274 @@ def get_model_fc_mode(filestr,model,fc_date,varalias=None):
         vardict[variable_info[varalias]['standard_name']] = \
                                                     model_var_valid
     # transform masked array to numpy array with NaNs
-    f.close()
     vardict[variable_info[varalias]['standard_name']] = \
         vardict[variable_info[varalias]['standard_name']].filled(np.nan)
     vardict['model_meta'] = model_meta
     return vardict, filevarname
 
+def group_fc_dates_by_file(model,fc_dates,leadtime):
+    """
+    returns dict with model file as key and the list of fc_dates
+    to be found in this file as value, in order of fc_dates
+    """
+    filegroups = {}
+    for fc_date in fc_dates:
+        filestr = make_model_filename_wrapper(model,fc_date,leadtime)
+        filegroups.setdefault(filestr,[]).append(fc_date)
+    return filegroups
+
+def group_consecutive_fc_dates_by_file(model,fc_dates,leadtime):
+    """
+    returns list of (model file, fc_dates) for runs of consecutive
+    fc_dates found in the same file, in order of fc_dates
+    """
+    runs = []
+    for fc_date in fc_dates:
+        filestr = make_model_filename_wrapper(model,fc_date,leadtime)
+        if (len(runs) > 0 and runs[-1][0] == filestr):
+            runs[-1][1].append(fc_date)
+        else:
+            runs.append((filestr,[fc_date]))
+    return runs
+
+def read_model_var_slab(f,filevarname,tidx):
+    """
+    reads all requested time steps tidx of a variable in one slab
+    returns np.array with NaNs of shape [len(tidx),...]
+    """
+    model_var_link = f.variables[filevarname]
+    if len(model_var_link.shape)>2: # for multiple time steps
+        tmin, tmax = np.min(tidx), np.max(tidx)
+        slab = model_var_link[tmin:tmax+1,:,:]
+        model_var = slab[np.array(tidx)-tmin,:,:]
+    else:# if only one time step
+        model_var = model_var_link[:,:].squeeze()[None,:,:]
+    return np.ma.filled(model_var,np.nan)
+
+def read_model_var_points(f,filevarname,tidx,idx_x,idx_y):
+    """
+    reads requested time steps tidx of a variable only at the grid
+    cells (idx_x[i],idx_y[i]), one strided read over all time steps
+    per grid cell instead of reading the full field
+    returns np.array with NaNs of shape [len(tidx),len(idx_x)]
+    """
+    model_var_link = f.variables[filevarname]
+    model_var = np.full((len(tidx),len(idx_x)),np.nan)
+    cells = {}
+    for i, cell in enumerate(zip(idx_x,idx_y)):
+        cells.setdefault((int(cell[0]),int(cell[1])),[]).append(i)
+    if len(model_var_link.shape)>2: # for multiple time steps
+        tmin, tmax = np.min(tidx), np.max(tidx)
+        for (ix,iy), pidx in cells.items():
+            ts = np.ma.filled(model_var_link[tmin:tmax+1,ix,iy],np.nan)
+            model_var[:,pidx] = ts[np.array(tidx)-tmin][:,None]
+    else:# if only one time step
+        for (ix,iy), pidx in cells.items():
+            model_var[:,pidx] = np.ma.filled(model_var_link[ix,iy],np.nan)
+    return model_var
+
+def read_model_coords_points(f,lonsname,latsname,idx_x,idx_y):
+    """
+    reads lons, lats of model grid only at the grid cells
+    (idx_x[i],idx_y[i])
+    """
+    lons_link = f.variables[lonsname]
+    lats_link = f.variables[latsname]
+    if len(lons_link.shape)==1:
+        # regular grid, model_vals[lat,lon]
+        lons = lons_link[:][np.array(idx_y)]
+        lats = lats_link[:][np.array(idx_x)]
+    else:
+        lons = np.array([lons_link[ix,iy] for ix,iy in zip(idx_x,idx_y)])
+        lats = np.array([lats_link[ix,iy] for ix,iy in zip(idx_x,idx_y)])
+    return lons, lats
+
+def get_model_fc_mode_batch(filestr,model,fc_dates,varalias=None,
+    idx_x=None,idx_y=None,skip_missing=False):
+    """
+    fct to retrieve model data for several time steps of one file
+    the file is opened once, coordinates and meta data are read
+    once and all time steps are read in one slab
+    if grid indices idx_x, idx_y are given only these grid cells are
+    read and vardict contains time series of shape [time,point]
+    if skip_missing dates not in the file are dropped instead of
+    raising a ValueError
+    """
+    vardict = {}
+    print ("Get model data for", len(fc_dates), "time step(s) from:")
+    print(filestr)
+    model_meta = ncdumpMeta(filestr)
+    f = get_nc_dataset(filestr)
+    stdvarname = variable_info[varalias]['standard_name']
+    # get coordinates and time
+    lonsname = get_filevarname(model,'lons',variable_info,
+                                model_dict,model_meta)
+    latsname = get_filevarname(model,'lats',variable_info,
+                                model_dict,model_meta)
+    timename = get_filevarname(model,'time',variable_info,
+                                model_dict,model_meta)
+    if idx_x is None:
+        vardict[variable_info['lons']['standard_name']] = \
+                                        f.variables[lonsname][:]
+        vardict[variable_info['lats']['standard_name']] = \
+                                        f.variables[latsname][:]
+        read_var = lambda name: read_model_var_slab(f,name,tidx)
+    else:
+        vardict[variable_info['lons']['standard_name']], \
+        vardict[variable_info['lats']['standard_name']] = \
+                read_model_coords_points(f,lonsname,latsname,idx_x,idx_y)
+        read_var = lambda name: \
+                read_model_var_points(f,name,tidx,idx_x,idx_y)
+    model_time = f.variables[timename]
+    model_time_dt = list( netCDF4.num2date(model_time[:],
+                        units = model_time.units) )
+    tidx = find_nearest_times(model_time_dt,fc_dates,twin=0)
+    if np.any(tidx<0):
+        missing = [d for d,i in zip(fc_dates,tidx) if i<0]
+        if (not skip_missing or len(missing) == len(fc_dates)):
+            raise ValueError('Desired date(s) ' + str(missing)
+                            + ' not in ' + filestr)
+        print('Desired date(s) ' + str(missing) + ' not in ' + filestr)
+        tidx = tidx[tidx>=0]
+    vardict[variable_info['time']['standard_name']] = \
+                            [float(model_time[i]) for i in tidx]
+    vardict['datetime'] = [model_time_dt[i] for i in tidx]
+    vardict['time_unit'] = model_time.units
+    # get other variables e.g. Hs [time,lat,lon]
+    filevarname = get_filevarname(model,varalias,variable_info,
+                                    model_dict,model_meta)
+    if (type(filevarname) is dict):
+        print('Target variable can be computed from vector \n'
+              'components with the following aliases: ', filevarname)
+        for key in filevarname.keys():
+            filevarname_dummy = get_filevarname(model,
+                                    filevarname[key][0],
+                                    variable_info,
+                                    model_dict,model_meta)
+            if filevarname_dummy is not None:
+                print(filevarname[key][0], 'exists')
+                break
+        print('Use aliases:',filevarname[key])
+        model_var_tmp = read_var(filevarname_dummy)**2
+        for i in range(1,len(filevarname[key])):
+            filevarname_dummy = get_filevarname(model,
+                                                filevarname[key][i],
+                                                variable_info,
+                                                model_dict,
+                                                model_meta)
+            model_var_tmp += read_var(filevarname_dummy)**2
+        vardict[stdvarname] = np.sqrt(model_var_tmp)
+    else:
+        vardict[stdvarname] = read_var(filevarname)
+    vardict['model_meta'] = model_meta
+    return vardict, filevarname
+
+def get_model_iter(model=None,fc_dates=None,varalias=None,leadtime=None):
+    """
+    generator yielding (fc_date, vardict) for each of fc_dates in
+    order of fc_dates, consecutive fc_dates in the same file are read
+    in one go, vardict has the same content as from get_model and the
+    fingerprint of the model grid computed once per file
+    """
+    runs = group_consecutive_fc_dates_by_file(model,fc_dates,leadtime)
+    fingerprints = {}
+    stdvarname = variable_info[varalias]['standard_name']
+    lonsname = variable_info['lons']['standard_name']
+    latsname = variable_info['lats']['standard_name']
+    timename = variable_info['time']['standard_name']
+    for filestr, dates in runs:
+        vardict, filevarname = get_model_fc_mode_batch(
+                                    filestr=filestr,model=model,
+                                    fc_dates=dates,
+                                    varalias=varalias)
+        if filestr not in fingerprints:
+            fingerprints[filestr] = make_grid_fingerprint(
+                                        vardict[lonsname],
+                                        vardict[latsname])
+        fingerprint = fingerprints[filestr]
+        for i, fc_date in enumerate(dates):
+            stepdict = {
+                lonsname:vardict[lonsname],
+                latsname:vardict[latsname],
+                timename:[vardict[timename][i]],
+                'datetime':[vardict['datetime'][i]],
+                'time_unit':vardict['time_unit'],
+                'model_meta':vardict['model_meta'],
+                stdvarname:vardict[stdvarname][i,:,:],
+                'grid_fingerprint':fingerprint,
+                }
+            yield fc_date, stepdict
+        del vardict
+
+def get_model_grid(model=None,fc_dates=None,leadtime=None):
+    """
+    returns lons, lats (2D) of the model grid and the path of the
+    first available model file for fc_dates
+    """
+    filegroups = group_fc_dates_by_file(model,fc_dates,leadtime)
+    for filestr in filegroups:
+        try:
+            model_meta = ncdumpMeta(filestr)
+        except (FileNotFoundError, OSError) as e:
+            print(e)
+            continue
+        f = get_nc_dataset(filestr)
+        lonsname = get_filevarname(model,'lons',variable_info,
+                                    model_dict,model_meta)
+        latsname = get_filevarname(model,'lats',variable_info,
+                                    model_dict,model_meta)
+        model_lons = f.variables[lonsname][:]
+        model_lats = f.variables[latsname][:]
+        if len(model_lons.shape)==1:
+            model_lons, model_lats = np.meshgrid(model_lons, model_lats)
+        return model_lons, model_lats, filestr
+    raise FileNotFoundError('No model file available for '
+                            + str(model) + ' and given dates')
+
+def get_model_ts_at_points(model=None,fc_dates=None,varalias=None,
+    leadtime=None,idx_x=None,idx_y=None):
+    """
+    time series of model values at grid cells (idx_x[i],idx_y[i])
+    for fc_dates, each model file is read once for all its fc_dates
+    and only the requested grid cells are read, missing files and
+    dates are skipped
+    returns vardict with time, datetime, time_unit, lons, lats of the
+    grid cells and the variable of shape [time,point]
+    """
+    stdvarname = variable_info[varalias]['standard_name']
+    lonsname = variable_info['lons']['standard_name']
+    latsname = variable_info['lats']['standard_name']
+    timename = variable_info['time']['standard_name']
+    idx_x = np.atleast_1d(idx_x)
+    idx_y = np.atleast_1d(idx_y)
+    vardict = {timename:[],'datetime':[],'time_unit':None,
+               lonsname:None,latsname:None,'model_meta':None,
+               stdvarname:[]}
+    filegroups = group_fc_dates_by_file(model,fc_dates,leadtime)
+    for filestr in filegroups:
+        try:
+            tmpdict, filevarname = get_model_fc_mode_batch(
+                                        filestr=filestr,model=model,
+                                        fc_dates=filegroups[filestr],
+                                        varalias=varalias,
+                                        idx_x=idx_x,idx_y=idx_y,
+                                        skip_missing=True)
+        except (FileNotFoundError, OSError, ValueError) as e:
+            print(e)
+            continue
+        if vardict['time_unit'] is None:
+            for key in ['time_unit',lonsname,latsname,'model_meta']:
+                vardict[key] = tmpdict[key]
+        vardict[timename] += list(netCDF4.date2num(tmpdict['datetime'],
+                                            units=vardict['time_unit']))
+        vardict['datetime'] += tmpdict['datetime']
+        vardict[stdvarname].append(tmpdict[stdvarname])
+    if len(vardict[stdvarname]) > 0:
+        vardict[stdvarname] = np.vstack(vardict[stdvarname])
+    else:
+        vardict[stdvarname] = np.zeros((0,len(idx_x)))
+    return vardict
+
 def generate_bestguess_leadtime(model,fc_date):
     """
     fct to return leadtimes for bestguess
@@ -30,6 +30,9 @@ import sys
 # get_remote
 from dateutil.relativedelta import relativedelta
 from copy import deepcopy
+from collections import OrderedDict
+import threading
+import atexit
 
 import time
 
@@ -58,7 +61,119 @@ with open(moddir,'r') as stream:
 """
 definition of some global functions
 """
-# currently None
+# ---------------------------------------------------------------------#
+
+class nc_cache_class():
+    '''
+    Process wide LRU cache of open netCDF4 datasets (read mode)
+    and their parsed meta data, keyed by path and modification time.
+    At most maxopen datasets are kept open, the least recently used
+    one is closed on eviction. A changed local file (mtime) is
+    reopened, remote paths (e.g. OPeNDAP urls) are keyed by path only
+    and reused until evicted.
+    Cached datasets are shared and must not be closed by the caller.
+    usage:
+        nc = nc_cache.get_dataset(pathtofile)
+        ncdict = nc_cache.get_meta(pathtofile)
+        nc_cache.stats()
+    '''
+
+    def __init__(self,maxopen=16,maxmeta=256):
+        self.maxopen = maxopen
+        self.maxmeta = maxmeta
+        self.datasets = OrderedDict()
+        self.meta = OrderedDict()
+        self.hits = {'dataset':0,'meta':0}
+        self.misses = {'dataset':0,'meta':0}
+        self.lock = threading.RLock()
+
+    @staticmethod
+    def get_key(pathtofile):
+        if os.path.exists(pathtofile):
+            return (os.path.abspath(pathtofile),
+                    os.stat(pathtofile).st_mtime_ns)
+        # remote or missing, netCDF4.Dataset raises for the latter
+        return (pathtofile, None)
+
+    def get_dataset(self,pathtofile):
+        '''
+        returns open netCDF4.Dataset of pathtofile
+        '''
+        path, mtime = self.get_key(pathtofile)
+        with self.lock:
+            if path in self.datasets:
+                cmtime, nc = self.datasets.pop(path)
+                if cmtime == mtime and nc.isopen():
+                    self.datasets[path] = (cmtime, nc)
+                    self.hits['dataset'] += 1
+                    return nc
+                self.close_dataset(nc)
+            self.misses['dataset'] += 1
+            nc = netCDF4.Dataset(pathtofile,mode='r')
+            self.datasets[path] = (mtime, nc)
+            while len(self.datasets) > max(self.maxopen,1):
+                cpath, (cmtime, cnc) = self.datasets.popitem(last=False)
+                self.close_dataset(cnc)
+            return nc
+
+    def get_meta(self,pathtofile):
+        '''
+        returns dict of variable and global attributes of pathtofile
+        '''
+        key = self.get_key(pathtofile)
+        with self.lock:
+            if key in self.meta:
+                self.meta.move_to_end(key)
+                self.hits['meta'] += 1
+                return deepcopy(self.meta[key])
+            self.misses['meta'] += 1
+            ncdict = read_meta(self.get_dataset(pathtofile))
+            # drop entries of older versions of this file
+            for k in [k for k in self.meta if k[0] == key[0]]:
+                del self.meta[k]
+            self.meta[key] = ncdict
+            while len(self.meta) > max(self.maxmeta,1):
+                self.meta.popitem(last=False)
+            return deepcopy(ncdict)
+
+    @staticmethod
+    def close_dataset(nc):
+        try:
+            if nc.isopen():
+                nc.close()
+        except (RuntimeError, OSError) as e:
+            print(e)
+
+    def stats(self):
+        '''
+        returns dict of hits, misses, and number of open datasets
+        '''
+        with self.lock:
+            return {'hits':dict(self.hits),'misses':dict(self.misses),
+                    'open':len(self.datasets),'meta':len(self.meta)}
+
+    def clear(self):
+        '''
+        closes all datasets, drops meta data and resets counters
+        '''
+        with self.lock:
+            while self.datasets:
+                path, (mtime, nc) = self.datasets.popitem(last=False)
+                self.close_dataset(nc)
+            self.meta.clear()
+            self.hits = {'dataset':0,'meta':0}
+            self.misses = {'dataset':0,'meta':0}
+
+nc_cache = nc_cache_class()
+atexit.register(nc_cache.clear)
+
+def get_nc_dataset(pathtofile):
+    '''
+    returns cached open netCDF4.Dataset of pathtofile,
+    do not close it, see nc_cache_class
+    '''
+    return nc_cache.get_dataset(pathtofile)
+
 # ---------------------------------------------------------------------#
 
 def get_nc_time(pathtofile):
@@ -157,19 +272,13 @@ def get_nc_ts(pathtofile,varlst):
         dtime = False
         sys.exit('File does not exist')
     else:
-        vardict = {}
-        for name in varlst:
-            nc = netCDF4.Dataset(
-                pathtofile,mode='r',
-                )
-            var = nc.variables[name][:]
-            vardict[name] = var
-        time_var = nc.variables['time']
-        dtime = netCDF4.num2date(time_var[:],time_var.units)
-        vardict['dtime'] = dtime
-        vardict['time'] = time_var[:]
-        vardict['time_unit'] = time_var.units
-        nc.close()
+        with netCDF4.Dataset(pathtofile,mode='r') as nc:
+            vardict = {name:nc.variables[name][:] for name in varlst}
+            time_var = nc.variables['time']
+            vardict['time'] = time_var[:]
+            vardict['dtime'] = netCDF4.num2date(vardict['time'],
+                                                time_var.units)
+            vardict['time_unit'] = time_var.units
     return vardict
 
 def get_nc_1D(pathtofile,varlst):
@@ -179,19 +288,111 @@ def get_nc_1D(pathtofile,varlst):
         dtime = False
         sys.exit('File does not exist')
     else:
-        vardict = {}
-        for name in varlst:
-            nc = netCDF4.Dataset(
-                pathtofile,mode='r',
-                )
-            var = nc.variables[name][:]
-            vardict[name]=var
-        time_var = nc.variables['time']
-        dtime = netCDF4.num2date(time_var[:],time_var.units)
-        vardict['dtime']=dtime
-        nc.close()
+        with netCDF4.Dataset(pathtofile,mode='r') as nc:
+            vardict = {name:nc.variables[name][:] for name in varlst}
+            time_var = nc.variables['time']
+            vardict['dtime'] = netCDF4.num2date(time_var[:],time_var.units)
     return vardict
 
+class nc_ts_reader_class():
+    """
+    Reader for time series files (e.g. monthly collocation files) of
+    one product, the files are aggregated along time in the given
+    order. Each file is opened once and its time axis is read once,
+    requested periods are located in this time index by binary
+    search and only these records are read. Values are returned as
+    float np.arrays with np.nan for fill values.
+    usage:
+        reader = nc_ts_reader_class(filelst)
+        vardict = reader.read(['obs_values','model_values'],
+                              sdate=sdate,edate=edate)
+        reader.close()
+    """
+
+    def __init__(self,filelst):
+        if isinstance(filelst,str):
+            filelst = [filelst]
+        self.files = []
+        self.time_unit = None
+        for pathtofile in filelst:
+            if not os.path.isfile(pathtofile):
+                print(pathtofile + ' not found!')
+                continue
+            nc = netCDF4.Dataset(pathtofile,mode='r')
+            nc.set_auto_mask(False)
+            time_var = nc.variables['time']
+            time = np.array(time_var[:],dtype=np.float64)
+            if self.time_unit is None:
+                self.time_unit = time_var.units
+            elif time_var.units != self.time_unit:
+                time = netCDF4.date2num(
+                            netCDF4.num2date(time,time_var.units),
+                            self.time_unit)
+            # unsorted files are indexed by their sort order
+            order = None
+            if np.any(np.diff(time) < 0):
+                order = np.argsort(time,kind='stable')
+            self.files.append({'path':pathtofile,'nc':nc,
+                               'time':time,'order':order})
+
+    def get_index(self,f,sdate=None,edate=None):
+        """
+        returns indices of records of file f within sdate to edate
+        """
+        start, end = 0, len(f['time'])
+        sorter = f['order']
+        if sdate is not None:
+            start = np.searchsorted(f['time'],
+                        netCDF4.date2num(sdate,self.time_unit),'left',
+                        sorter=sorter)
+        if edate is not None:
+            end = np.searchsorted(f['time'],
+                        netCDF4.date2num(edate,self.time_unit),'right',
+                        sorter=sorter)
+        if sorter is None:
+            return slice(start,max(start,end))
+        return np.sort(f['order'][start:end])
+
+    @staticmethod
+    def read_var(var,idx):
+        values = np.array(var[idx],dtype=np.float64)
+        for attr in ['_FillValue','missing_value']:
+            if attr in var.ncattrs():
+                values[values == var.getncattr(attr)] = np.nan
+        return values
+
+    def read(self,varlst,sdate=None,edate=None):
+        """
+        returns dict of varlst, time (in time_unit), dtime, and
+        time_unit of all records between sdate and edate
+        """
+        varlst = [name for name in varlst if name != 'time']
+        vardict = {name:[] for name in varlst + ['time']}
+        for f in self.files:
+            idx = self.get_index(f,sdate=sdate,edate=edate)
+            vardict['time'].append(f['time'][idx])
+            for name in varlst:
+                vardict[name].append(self.read_var(f['nc'].variables[name],
+                                                   idx))
+        for name in vardict:
+            vardict[name] = (np.concatenate(vardict[name])
+                             if len(vardict[name]) > 0 else np.array([]))
+        vardict['time_unit'] = self.time_unit
+        vardict['dtime'] = (netCDF4.num2date(vardict['time'],self.time_unit)
+                            if self.time_unit is not None else np.array([]))
+        return vardict
+
+    def close(self):
+        for f in self.files:
+            f['nc'].close()
+        self.files = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self,*args):
+        self.close()
+
 def dumptonc_ts(outpath,filename,title,model_time_unit,results_dict):
     """
     1. check if nc file already exists
@@ -451,194 +652,241 @@ def dumptonc_ts_station(st_obj,pathtofile,title):
         nc.sync()
         nc.close()
 
+def get_collocation_ncvars(col_obj):
+    """
+    returns dict of netcdf variable names and values of col_obj,
+    values outside of the valid range are set to -999.
+    """
+    ncvars = {'time':np.array(col_obj.vars['time']),
+              'model_lons':np.array(col_obj.vars['model_lons']),
+              'model_lats':np.array(col_obj.vars['model_lats']),
+              'obs_lons':np.array(col_obj.vars['obs_lons']),
+              'obs_lats':np.array(col_obj.vars['obs_lats']),
+              'colidx_x':np.array(col_obj.vars['collocation_idx_x']),
+              'colidx_y':np.array(col_obj.vars['collocation_idx_y']),
+              'dist':np.array(col_obj.vars['distance'])}
+    valid_range = variable_info[col_obj.varalias]['valid_range']
+    for ncvar, key in [('obs_values','obs_values'),
+                       ('model_values','model_values')]:
+        values = np.array(col_obj.vars[key],dtype=np.float64)
+        values[values<valid_range[0]] = -999.
+        values[values>valid_range[1]] = -999.
+        ncvars[ncvar] = values
+    return ncvars
+
+def create_nc_ts_collocation(col_obj,pathtofile,title,chunksize=4096):
+    """
+    creates an empty collocation file with unlimited time dimension,
+    variables are chunked and compressed
+    """
+    os.makedirs(os.path.dirname(os.path.abspath(pathtofile)),
+                exist_ok=True)
+    nc = netCDF4.Dataset(pathtofile,mode='w')
+    nc.createDimension('time',size=None)
+    dict_for_nc = deepcopy(variable_info[col_obj.varalias])
+    dict_for_nc.pop('aliases_of_vector_components',None)
+    ncattrs = {'model_lons':variable_info['lons'],
+               'model_lats':variable_info['lats'],
+               'obs_lons':variable_info['lons'],
+               'obs_lats':variable_info['lats'],
+               'colidx_x':variable_info['colidx_x'],
+               'colidx_y':variable_info['colidx_y'],
+               'time':variable_info['time'],
+               'obs_values':dict_for_nc,
+               'model_values':dict_for_nc,
+               'dist':variable_info['dist']}
+    for ncvar in ncattrs:
+        var = nc.createVariable(ncvar,np.float64,dimensions=('time'),
+                        fill_value=(-999. if ncvar in ['obs_values',
+                                    'model_values','dist'] else None),
+                        zlib=True,complevel=4,chunksizes=(chunksize,))
+        if ncvar == 'time':
+            var.units = str(col_obj.vars['time_unit'])
+        var.setncatts(ncattrs[ncvar])
+    nc.variables['obs_values'].observation_name = col_obj.obsname
+    nc.variables['model_values'].model_name = col_obj.model
+    # coordinate system info
+    nc_crs = nc.createVariable('latlon',np.int32)
+    nc_crs.proj4_string = "+proj=latlong +R=6370997.0 +ellps=WGS84"
+    nc_crs.grid_mapping_name = 'latitude_longitude'
+    # global attributes
+    globalAttribs = {}
+    globalAttribs['title'] = title
+    globalAttribs['Conventions'] = "CF-1.6"
+    globalAttribs['institution'] = "Norwegian Meteorological Institute"
+    globalAttribs['history'] = datetime.utcnow().isoformat() + ". Created."
+    globalAttribs['netcdf_version'] = "NETCDF4"
+    if 'superob' in vars(col_obj).keys():
+        globalAttribs['processing_level'] = ('superob: '
+                                            + str(col_obj.superob)
+                                            + '; '
+                                            + 'outlier_detection: '
+                                            + col_obj.outlier_detection
+                                            + '; '
+                                            + 'missing_data: '
+                                            + col_obj.missing_data)
+    else:
+        globalAttribs['processing_level'] = "No post-processing performed"
+    globalAttribs['leadtime'] = str(col_obj.leadtime) + 'h'
+    nc.setncatts(globalAttribs)
+    return nc
+
+def find_time_index(time_var,time,side='left'):
+    """
+    returns index of the first record of the sorted time axis
+    time_var not before time (side='left') or after time
+    (side='right') by binary search on the file, only
+    O(log n) values are read
+    """
+    lo, hi = 0, len(time_var)
+    while lo < hi:
+        mid = (lo + hi)//2
+        if (time_var[mid] < time
+        or (side == 'right' and time_var[mid] == time)):
+            lo = mid + 1
+        else:
+            hi = mid
+    return lo
+
+class nc_ts_appender_class():
+    """
+    Appends collocated time series to a collocation file which is
+    kept open for many appends and closed once at the end. Records
+    later than the last time in the file are appended without reading
+    the time axis. A batch within the time range of the file replaces
+    the records of its time range (found by binary search), later
+    records are shifted behind it such that the time axis stays
+    sorted.
+    usage:
+        with nc_ts_appender_class(pathtofile) as appender:
+            appender.append(col_obj,title)
+            ...
+    """
+
+    def __init__(self,pathtofile):
+        self.pathtofile = pathtofile
+        self.nc = None
+
+    def open(self,col_obj,title):
+        if self.nc is None:
+            if os.path.isfile(self.pathtofile):
+                self.nc = netCDF4.Dataset(self.pathtofile,mode='a')
+            else:
+                self.nc = create_nc_ts_collocation(col_obj,
+                                                   self.pathtofile,title)
+        return self.nc
+
+    def get_index_range(self,stime,etime):
+        """
+        returns index range [startidx,endidx) of the records from
+        stime to etime which are replaced by a batch
+        """
+        time_var = self.nc.variables['time']
+        n = len(time_var)
+        if (n == 0 or stime > time_var[n-1]):
+            return n, n
+        print('Time already detected in ncfile')
+        print('Replace records within time range of batch')
+        return (find_time_index(time_var,stime),
+                find_time_index(time_var,etime,side='right'))
+
+    def append(self,col_obj,title):
+        ncvars = get_collocation_ncvars(col_obj)
+        if len(ncvars['time']) == 0:
+            return
+        nc = self.open(col_obj,title)
+        n = len(nc.variables['time'])
+        startidx, endidx = self.get_index_range(ncvars['time'][0],
+                                                ncvars['time'][-1])
+        if endidx < n:
+            # later records are shifted behind the batch
+            tail = {ncvar:nc.variables[ncvar][endidx:n] for ncvar in ncvars}
+            ncvars = {ncvar:np.ma.concatenate([
+                            np.ma.asarray(ncvars[ncvar]),tail[ncvar]])
+                      for ncvar in ncvars}
+        if startidx + len(ncvars['time']) < n:
+            # the unlimited time dimension cannot shrink
+            stime = netCDF4.num2date(ncvars['time'][0],
+                                     nc.variables['time'].units,
+                                     only_use_cftime_datetimes=False)
+            self.close()
+            remove_nc_ts_after(self.pathtofile,stime)
+            nc = self.open(col_obj,title)
+            startidx = len(nc.variables['time'])
+        endidx = startidx + len(ncvars['time'])
+        for ncvar in ncvars:
+            nc.variables[ncvar][startidx:endidx] = ncvars[ncvar]
+
+    def close(self):
+        if self.nc is not None:
+            self.nc.close()
+            self.nc = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self,*args):
+        self.close()
+
 def dumptonc_ts_collocation(col_obj,pathtofile,title):
     """
-    1. check if nc file already exists
-    2. - if so use append mode
-       - if not create file and folder structure
+    appends col_obj to pathtofile, the file and folder structure are
+    created if needed, see nc_ts_appender_class
     """
     print('Dump data to netCDF4 file')
-    stdvarname = col_obj.stdvarname
-    time = col_obj.vars['time']
-    modlon = col_obj.vars['model_lons']
-    modlat = col_obj.vars['model_lats']
-    obslon = col_obj.vars['obs_lons']
-    obslat = col_obj.vars['obs_lats']
-    colidx_x = col_obj.vars['collocation_idx_x']
-    colidx_y = col_obj.vars['collocation_idx_y']
-    leadtime = col_obj.leadtime
-    varobs = np.array(col_obj.vars['obs_values'])
-    varobs[varobs<variable_info[col_obj.varalias]['valid_range'][0]] = -999.
-    varobs[varobs>variable_info[col_obj.varalias]['valid_range'][1]] = -999.
-    varobs = list(varobs)
-    varmod = np.array(col_obj.vars['model_values'])
-    varmod[varmod<variable_info[col_obj.varalias]['valid_range'][0]] = -999.
-    varmod[varmod>variable_info[col_obj.varalias]['valid_range'][1]] = -999.
-    varmod = list(varmod)
-    dists = np.array(col_obj.vars['distance'])
     print ('Dump data to file: ' + pathtofile)
-    if os.path.isfile(pathtofile):
-        nc = netCDF4.Dataset(
-                        pathtofile,mode='a',
-                        clobber=False
-                        )
-        # compare existing times in input time and existing time
-        startin = time[0]
-        timeex = list(nc.variables['time'][:])
-        if startin in timeex:
-            print('Time already detected in ncfile')
-            print('Find correct index to start from there')
-            print('Overwrite double time stamps')
-            startidx = timeex.index(startin)
-        else:
-            startidx = len(nc['time'])
-        endidx = startidx+len(time)
-        nc.variables['time'][startidx:endidx] = time[:]
-        nc.variables['model_lons'][startidx:endidx] = modlon[:]
-        nc.variables['model_lats'][startidx:endidx] = modlat[:]
-        nc.variables['model_values'][startidx:endidx] = varmod[:]
-        nc.variables['obs_lons'][startidx:endidx] = obslon[:]
-        nc.variables['obs_lats'][startidx:endidx] = obslat[:]
-        nc.variables['obs_values'][startidx:endidx] = varobs[:]
-        nc.variables['dist'][startidx:endidx] = dists[:]
-        nc.variables['colidx_x'][startidx:endidx] = colidx_x[:]
-        nc.variables['colidx_y'][startidx:endidx] = colidx_y[:]
-        nc.close()
-    else:
-        outpath = os.path.dirname(pathtofile)
-        os.system('mkdir -p ' + outpath)
-        nc = netCDF4.Dataset(
-                        pathtofile,mode='w',
-                        )
-        # dimensions
-        dimsize = None
-        dimtime = nc.createDimension(
-                                'time',
-                                size=dimsize
-                                )
-        # variables
-        ncmodlon = nc.createVariable(
-                               'model_lons',
-                               np.float64,
-                               dimensions=('time')
-                               )
-        ncmodlat = nc.createVariable(
-                               'model_lats',
-                               np.float64,
-                               dimensions=('time')
-                               )
-        ncobslon = nc.createVariable(
-                               'obs_lons',
-                               np.float64,
-                               dimensions=('time')
-                               )
-        ncobslat = nc.createVariable(
-                               'obs_lats',
-                               np.float64,
-                               dimensions=('time')
-                               )
-        nccolidx_x = nc.createVariable(
-                               'colidx_x',
-                               np.float64,
-                               dimensions=('time')
-                               )
-        nccolidx_y = nc.createVariable(
-                               'colidx_y',
-                               np.float64,
-                               dimensions=('time')
-                               )
-        nctime = nc.createVariable(
-                               'time',
-                               np.float64,
-                               dimensions=('time')
-                               )
-        ncvarobs = nc.createVariable(
-                               'obs_values',
-                               np.float64,
-                               dimensions=('time'),
-                               fill_value=-999.
-                               )
-        ncvarmod = nc.createVariable(
-                               'model_values',
-                               np.float64,
-                               dimensions=('time'),
-                               fill_value=-999.
-                               )
-        ncdist = nc.createVariable(
-                               'dist',
-                               np.float64,
-                               dimensions=('time'),
-                               fill_value=-999.
-                               )
-        # generate time for netcdf file
-        # time
-        nctime[:] = time
-        nctime.units = str(col_obj.vars['time_unit'])
-        nctime.setncatts(variable_info['time'])
-        # observation longitude
-        ncobslon[:] = obslon
-        ncobslon.setncatts(variable_info['lons'])
-        # observation latitude
-        ncobslat[:] = obslat
-        ncobslat.setncatts(variable_info['lats'])
-        # model longitude
-        ncmodlon[:] = modlon
-        ncmodlon.setncatts(variable_info['lons'])
-        # model latitude
-        ncmodlat[:] = modlat
-        ncmodlat.setncatts(variable_info['lats'])
-        # varobs
-        ncvarobs[:] = varobs
-        dict_for_nc = deepcopy(variable_info[col_obj.varalias])
-        del dict_for_nc['aliases_of_vector_components']
-        ncvarobs.setncatts(dict_for_nc)
-        ncvarobs.observation_name = col_obj.obsname
-        # varmod
-        ncvarmod[:] = varmod
-        dict_for_nc = deepcopy(variable_info[col_obj.varalias])
-        del dict_for_nc['aliases_of_vector_components']
-        ncvarobs.setncatts(dict_for_nc)
-        ncvarmod.model_name = col_obj.model
-        # dists
-        ncdist[:] = dists
-        ncdist.setncatts(variable_info['dist'])
-        # colidx
-        nccolidx_x[:] = colidx_x
-        nccolidx_x.setncatts(variable_info['colidx_x'])
-        nccolidx_y[:] = colidx_y
-        nccolidx_y.setncatts(variable_info['colidx_y'])
-        # coordinate system info
-        nc_crs = nc.createVariable('latlon',np.int32)
-        nc_crs.proj4_string = "+proj=latlong +R=6370997.0 +ellps=WGS84"
-        nc_crs.grid_mapping_name = 'latitude_longitude'
-        # close file
-        nc.close()
-        #add global attributes
-        nc = netCDF4.Dataset(pathtofile,mode='r+')
-        nowstr = datetime.utcnow().isoformat()
-        globalAttribs = {}
-        globalAttribs['title'] = title
-        globalAttribs['Conventions'] = "CF-1.6"
-        globalAttribs['institution'] = \
-                                "Norwegian Meteorological Institute"
-        globalAttribs['history'] = nowstr + ". Created."
-        globalAttribs['netcdf_version'] = "NETCDF4"
-        if 'superob' in vars(col_obj).keys():
-            globalAttribs['processing_level'] = ('superob: '
-                                                + str(col_obj.superob)
-                                                + '; '
-                                                + 'outlier_detection: '
-                                                + col_obj.outlier_detection
-                                                + '; '
-                                                + 'missing_data: '
-                                                + col_obj.missing_data)
-        else:
-            globalAttribs['processing_level'] = \
-                                "No post-processing performed"
-        globalAttribs['leadtime'] = str(leadtime) + 'h'
-        nc.setncatts(globalAttribs)
-        nc.sync()
-        nc.close()
+    with nc_ts_appender_class(pathtofile) as appender:
+        appender.append(col_obj,title)
+
+def remove_nc_ts_after(pathtofile,sdate):
+    """
+    removes all records from sdate on of a time series file,
+    the file is rewritten and replaced,
+    removed if no records are left
+    returns number of removed records
+    """
+    if not os.path.isfile(pathtofile):
+        return 0
+    with netCDF4.Dataset(pathtofile,mode='r') as src:
+        src.set_auto_mask(False)
+        time_var = src.variables['time']
+        idx = np.flatnonzero(time_var[:] < netCDF4.date2num(sdate,
+                                                    time_var.units))
+        nremoved = len(time_var) - len(idx)
+        if (nremoved > 0 and len(idx) > 0):
+            with netCDF4.Dataset(pathtofile + '.tmp',mode='w',
+                                 format=src.data_model) as dst:
+                dst.set_auto_mask(False)
+                dst.setncatts({a:src.getncattr(a) for a in src.ncattrs()})
+                for name, dim in src.dimensions.items():
+                    if dim.isunlimited():
+                        dst.createDimension(name,None)
+                    else:
+                        dst.createDimension(name,
+                                len(idx) if name == 'time' else len(dim))
+                for name, var in src.variables.items():
+                    filters = var.filters() or {}
+                    chunking = var.chunking()
+                    if chunking in [None,'contiguous']:
+                        chunking = None
+                    ncvar = dst.createVariable(name,var.datatype,
+                                var.dimensions,
+                                fill_value=getattr(var,'_FillValue',None),
+                                zlib=filters.get('zlib',False),
+                                complevel=filters.get('complevel',4),
+                                chunksizes=chunking)
+                    ncvar.setncatts({a:var.getncattr(a)
+                                     for a in var.ncattrs()
+                                     if a != '_FillValue'})
+                    if 'time' in var.dimensions:
+                        ncvar[:] = var[:][idx]
+                    elif len(var.dimensions) > 0:
+                        ncvar[:] = var[:]
+    if (nremoved > 0 and len(idx) == 0):
+        os.remove(pathtofile)
+    elif nremoved > 0:
+        os.replace(pathtofile + '.tmp',pathtofile)
+    return nremoved
 
 def dumptonc_stats(pathtofile,title,time_dt,time_unit,valid_dict):
     """
@@ -794,6 +1042,43 @@ def dumptonc_stats(pathtofile,title,time_dt,time_unit,valid_dict):
         ncnov[:] = nov
     nc.close()
 
+def dumptonc_accumulator(pathtofile,title,time_dt,time_unit,state):
+    """
+    appends the state of a validation accumulator (dict of
+    validationmod.accumulator_fields) as record at time_dt, an
+    existing record of time_dt is replaced. Records can be merged
+    later on without the collocation files, see
+    validationmod.read_accumulator
+    """
+    time = netCDF4.date2num(time_dt,time_unit)
+    print ('Dump data to file: ' + pathtofile)
+    if os.path.isfile(pathtofile):
+        nc = netCDF4.Dataset(pathtofile,mode='a')
+    else:
+        os.makedirs(os.path.dirname(os.path.abspath(pathtofile)),
+                    exist_ok=True)
+        nc = netCDF4.Dataset(pathtofile,mode='w')
+        nc.title = title
+        nc.createDimension('time',size=None)
+        nctime = nc.createVariable('time',np.float64,dimensions=('time'))
+        nctime.standard_name = 'time'
+        nctime.units = time_unit
+        for field in state:
+            var = nc.createVariable(field,np.float64,dimensions=('time'),
+                                    zlib=True)
+            var.long_name = ('validation accumulator state ' + field)
+    # records of a validated time step are replaced in a rerun
+    time_var = nc.variables['time']
+    idx = len(time_var)
+    if (idx > 0 and time <= time_var[idx-1]):
+        tidx = find_time_index(time_var,time)
+        if (tidx < idx and time_var[tidx] == time):
+            idx = tidx
+    time_var[idx] = time
+    for field in state:
+        nc.variables[field][idx] = state[field]
+    nc.close()
+
 def dumptonc_sat(sa_obj,outpath,mode=None):
     """
     dump satellite altimetry data to netcdf-file
@@ -1139,8 +1424,14 @@ def ncdumpMeta(pathtofile):
     Input: str pointing to netcdf-file
     Output: dict of attributes
     '''
-    # init netCDF4 instance
-    nc = netCDF4.Dataset(pathtofile,mode='r')
+    return nc_cache.get_meta(pathtofile)
+
+def read_meta(nc):
+    '''
+    Returns dict of variable and global attributes
+    Input: netCDF4.Dataset
+    Output: dict of attributes
+    '''
     # init empty dict
     ncdict = {}
     # retrieve variable attributes
@@ -0,0 +1,297 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# ---------------------------------------------------------------------#
+'''
+This module encompasses methods to check which observations fall
+within a given region. Regions are defined in region_specs.yaml
+(rect, incl. boundinglat), given manually as bounds
+[llcrnrlat,urcrnrlat,llcrnrlon,urcrnrlon], or are model domains.
+All fcts are vectorized and return boolean masks that can be used
+for satellite, plotting, and validation purposes alike. The outer
+boundary of model domains is cached in memory and on disk.
+'''
+# --- import libraries ------------------------------------------------#
+# standard library imports
+import os
+import hashlib
+import zipfile
+import tempfile
+import itertools
+import numpy as np
+import yaml
+from datetime import datetime
+
+# own imports
+from utils import get_cache_dir
+
+# ---------------------------------------------------------------------#
+
+# read yaml config files:
+moddir = os.path.abspath(os.path.join(os.path.dirname( __file__ ), '..', 'config/region_specs.yaml'))
+with open(moddir,'r') as stream:
+    region_dict=yaml.safe_load(stream)
+
+moddir = os.path.abspath(os.path.join(os.path.dirname( __file__ ), '..', 'config/model_specs.yaml'))
+with open(moddir,'r') as stream:
+    model_dict=yaml.safe_load(stream)
+
+moddir = os.path.abspath(os.path.join(os.path.dirname( __file__ ), '..', 'config/variable_info.yaml'))
+with open(moddir,'r') as stream:
+    variable_info=yaml.safe_load(stream)
+
+# boundary polygons of model domains, filled on first use
+model_domain_cache = {}
+
+# --- global functions ------------------------------------------------#
+
+def get_region_bbox(region):
+    '''
+    returns bounding box [llcrnrlat,urcrnrlat,llcrnrlon,urcrnrlon]
+    of region, None if region is global or its extent is not known
+    before reading the model grid (model domains)
+    '''
+    if (region is None or region == 'global'):
+        return None
+    if isinstance(region,dict):
+        lons = np.asarray(region['lons'])
+        bbox = [np.min(region['lats']),np.max(region['lats']),
+                np.min(lons),np.max(lons)]
+        # polygons crossing the dateline are only bounded in lat
+        if (bbox[2] < -180 or bbox[3] > 180
+        or np.any(np.abs(np.diff(np.append(lons,lons[0]))) > 180)):
+            bbox[2:] = [-180.,180.]
+        return bbox
+    if isinstance(region,str):
+        if region in model_dict:
+            return None
+        elif region in region_dict['poly']:
+            return get_region_bbox(region_dict['poly'][region])
+        elif region in region_dict['rect']:
+            rect = region_dict['rect'][region]
+            if 'boundinglat' in rect:
+                return [rect['boundinglat'],90.,-180.,180.]
+            return [rect['llcrnrlat'],rect['urcrnrlat'],
+                    rect['llcrnrlon'],rect['urcrnrlon']]
+        return None
+    return list(region)
+
+def get_bbox_mask(LATS,LONS,bbox):
+    '''
+    returns boolean mask of coordinates within
+    bbox = [llcrnrlat,urcrnrlat,llcrnrlon,urcrnrlon]
+    lons are compared within -180 to 180 degrees, boxes crossing
+    the dateline have llcrnrlon > urcrnrlon after normalization
+    (e.g. [50,70,170,-170] or [50,70,170,190])
+    '''
+    LATS = np.asarray(LATS)
+    LONS = np.asarray(LONS)
+    mask = (LATS >= bbox[0]) & (LATS <= bbox[1])
+    if bbox[3] - bbox[2] >= 360:
+        # no constraint on lons
+        return mask
+    lonmin = ((bbox[2] + 180) % 360) - 180
+    lonmax = ((bbox[3] + 180) % 360) - 180
+    if (np.nanmin(LONS,initial=0) < -180
+    or np.nanmax(LONS,initial=0) >= 180):
+        LONS = ((LONS + 180) % 360) - 180
+    if lonmin <= lonmax:
+        mask &= (LONS >= lonmin) & (LONS <= lonmax)
+    else:
+        mask &= (LONS >= lonmin) | (LONS <= lonmax)
+    return mask
+
+def get_region_mask(LATS,LONS,region):
+    '''
+    returns boolean mask of coordinates within region
+    region can be None/'global', the name of a rect region in
+    region_specs.yaml (incl. boundinglat), or manually specified
+    bounds [llcrnrlat,urcrnrlat,llcrnrlon,urcrnrlon]
+    '''
+    LATS = np.asarray(LATS)
+    if (region is None or region == 'global'):
+        return np.ones(LATS.shape,dtype=bool)
+    if isinstance(region,str):
+        rect = region_dict['rect'][region]
+        if 'boundinglat' in rect:
+            return LATS >= rect['boundinglat']
+        bbox = [rect['llcrnrlat'],rect['urcrnrlat'],
+                rect['llcrnrlon'],rect['urcrnrlon']]
+    else:
+        bbox = region
+    return get_bbox_mask(LATS,LONS,bbox)
+
+def open_model_grid(model,grid_date):
+    '''
+    opens the best guess file for grid_date, falls back to grid_date
+    from model_specs.yaml or today
+    returns cached dataset, names of lons and lats variables,
+    model file path and meta data
+    '''
+    from modelmod import make_model_filename_wrapper, get_filevarname
+    from ncmod import ncdumpMeta, get_nc_dataset
+    def open_grid(grid_date):
+        print('Use date for retrieving grid: ', grid_date)
+        filestr = make_model_filename_wrapper(model,grid_date,'best')
+        model_meta = ncdumpMeta(filestr)
+        flon = get_filevarname(model,'lons',variable_info,
+                               model_dict,model_meta)
+        flat = get_filevarname(model,'lats',variable_info,
+                               model_dict,model_meta)
+        return get_nc_dataset(filestr), flon, flat, filestr, model_meta
+    try:
+        if grid_date is None:
+            raise ValueError('No date given for retrieving grid')
+        return open_grid(grid_date)
+    except (KeyError,IOError,ValueError) as e:
+        print(e)
+        if 'grid_date' in model_dict[model]:
+            grid_date = model_dict[model]['grid_date']
+            print('Trying default date ', grid_date)
+        else:
+            grid_date = datetime(datetime.now().year,
+                                 datetime.now().month,
+                                 datetime.now().day)
+        return open_grid(grid_date)
+
+def read_model_grid(model,grid_date):
+    '''
+    reads lons, lats of model grid from the best guess file for
+    grid_date (see open_model_grid)
+    returns model_lons, model_lats (2D), model file path and meta data
+    '''
+    nc, flon, flat, filestr, model_meta = open_model_grid(model,grid_date)
+    model_lons = np.ma.filled(nc.variables[flon][:].astype(float),np.nan)
+    model_lats = np.ma.filled(nc.variables[flat][:].astype(float),np.nan)
+    if (len(model_lons.shape)==1):
+        model_lons, model_lats = np.meshgrid(model_lons, model_lats)
+    return model_lons, model_lats, filestr, model_meta
+
+def get_model_grid_fingerprint(model,grid_date):
+    '''
+    returns hash of the model entry in model_specs.yaml and of shape
+    and corner coordinates of the model grid, only the corners are
+    read from the model file
+    '''
+    nc, flon, flat, filestr, model_meta = open_model_grid(model,grid_date)
+    grid = []
+    for ncvar in [flon,flat]:
+        var = nc.variables[ncvar]
+        corners = [var[idx] for idx in
+                   itertools.product([0,-1],repeat=len(var.shape))]
+        grid.append([var.shape,
+                     np.ma.filled(np.ma.array(corners,dtype=float),
+                                  np.nan).tolist()])
+    spec = yaml.safe_dump(model_dict[model],sort_keys=True)
+    return hashlib.md5((spec + str(grid)).encode()).hexdigest()
+
+def get_model_domain_file(model,grid_date):
+    '''
+    returns path of the cached domain of model, the name contains a
+    fingerprint of the model specifications and the model grid such
+    that the cache is invalidated whenever one of them changes
+    '''
+    cachepath = (region_dict.get('domain') or {}).get('cachepath')
+    if cachepath is None:
+        cachepath = get_cache_dir()
+    fingerprint = get_model_grid_fingerprint(model,grid_date)
+    return os.path.join(cachepath,
+                'domain_' + model + '_' + fingerprint + '.npz')
+
+def read_model_domain(cachefile):
+    '''
+    returns domain dict stored in cachefile,
+    None if the file is missing or corrupt
+    '''
+    if not os.path.isfile(cachefile):
+        return None
+    try:
+        with np.load(cachefile,allow_pickle=False) as f:
+            return {'proj4':str(f['proj4']),'x':f['x'],'y':f['y']}
+    except (OSError,ValueError,KeyError,EOFError,zipfile.BadZipFile) as e:
+        print(e)
+        print('Cached model domain is corrupt, it is rebuilt')
+        return None
+
+def write_model_domain(cachefile,domain):
+    '''
+    writes domain dict to cachefile, the file is replaced atomically
+    such that concurrent readers never see a partial file
+    '''
+    cachepath = os.path.dirname(os.path.abspath(cachefile))
+    os.makedirs(cachepath,exist_ok=True)
+    fd, tmpfile = tempfile.mkstemp(dir=cachepath,suffix='.tmp')
+    try:
+        with os.fdopen(fd,'wb') as f:
+            np.savez(f,proj4=np.array(domain['proj4']),
+                     x=domain['x'],y=domain['y'])
+        os.replace(tmpfile,cachefile)
+    except OSError:
+        if os.path.exists(tmpfile):
+            os.remove(tmpfile)
+        raise
+
+def make_model_domain(model,grid_date):
+    '''
+    returns dict with proj4 string and the outer boundary
+    polygon (x, y) of the model grid in model projection
+    '''
+    import pyproj
+    from ncmod import find_attr_in_nc
+    model_lons, model_lats, filestr, model_meta = \
+                                    read_model_grid(model,grid_date)
+    try:
+        proj4 = find_attr_in_nc('proj',ncdict=model_meta,
+                                subattrstr='proj4')
+    except IndexError:
+        print('proj4 not defined in netcdf-file')
+        print('Using proj4 from model config file')
+        proj4 = model_dict[model]['proj4']
+    # outer boundary of the grid as closed ring
+    lons = np.concatenate([model_lons[0,:],model_lons[1:,-1],
+                           model_lons[-1,-2::-1],model_lons[-2:0:-1,0]])
+    lats = np.concatenate([model_lats[0,:],model_lats[1:,-1],
+                           model_lats[-1,-2::-1],model_lats[-2:0:-1,0]])
+    valid = ~(np.isnan(lons) | np.isnan(lats))
+    x, y = pyproj.Proj(proj4)(lons[valid],lats[valid],inverse=False)
+    return {'proj4':proj4,'x':np.asarray(x),'y':np.asarray(y)}
+
+def get_model_domain(model,grid_date):
+    '''
+    returns boundary of model domain from memory, disk cache,
+    or from reading the model grid (in this order)
+    '''
+    if model in model_domain_cache:
+        return model_domain_cache[model]
+    cachefile = get_model_domain_file(model,grid_date)
+    domain = read_model_domain(cachefile)
+    if domain is not None:
+        print('Use cached model domain: ', cachefile)
+    else:
+        domain = make_model_domain(model,grid_date)
+        try:
+            write_model_domain(cachefile,domain)
+        except OSError as e:
+            print(e)
+            print('Model domain could not be cached on disk')
+    model_domain_cache[model] = domain
+    return domain
+
+def get_model_domain_mask(LATS,LONS,model,grid_date=None):
+    '''
+    returns boolean mask of coordinates within the outer
+    boundary of the model grid
+    '''
+    import pyproj
+    from matplotlib.path import Path
+    domain = get_model_domain(model,grid_date)
+    Vx, Vy = pyproj.Proj(domain['proj4'])(np.asarray(LONS),
+                                          np.asarray(LATS),inverse=False)
+    Vx = np.asarray(Vx)
+    Vy = np.asarray(Vy)
+    # cheap check of extent before point in polygon test
+    mask = ((Vx>np.min(domain['x'])) & (Vx<np.max(domain['x'])) &
+            (Vy>np.min(domain['y'])) & (Vy<np.max(domain['y'])))
+    if np.any(mask):
+        poly = Path(np.c_[domain['x'],domain['y']])
+        mask[mask] = poly.contains_points(np.c_[Vx[mask],Vy[mask]])
+    return mask
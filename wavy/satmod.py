@@ -19,6 +19,7 @@ import os
 from copy import deepcopy
 import yaml
 import time
+import threading
 if sys.version_info <= (3, 0):
     from urllib import urlretrieve, urlcleanup # python2
 else:
@@ -37,7 +38,16 @@ import pyresample
 from ncmod import ncdumpMeta, get_varname_for_cf_stdname_in_ncfile
 from ncmod import find_attr_in_nc
 from utils import progress, sort_files, collocate_times
+from utils import obs_table_class
+from utils import parse_file_dates, find_files_in_period
+from utils import read_manifest, write_manifest
+from catalogmod import catalog_class, get_local_dirs
+from regionmod import get_region_bbox, get_bbox_mask, get_region_mask
+from regionmod import get_model_domain_mask
 from credentials import get_credentials
+from ftpmod import ftp_pool_class, list_remote_files
+from ftpmod import download_files, merge_reports
+from ftpmod import list_remote_files_with_facts, get_changed_files
 from modelmod import get_filevarname
 from modelmod import model_class as mc
 from modelmod import make_model_filename_wrapper
@@ -62,96 +72,141 @@ moddir = os.path.abspath(os.path.join(os.path.dirname( __file__ ), '..', 'config
 with open(moddir,'r') as stream:
     variable_info=yaml.safe_load(stream)
 
+# netCDF-C/HDF5 are not thread-safe, file access from threads
+# is serialized by this lock
+nc_lock = threading.Lock()
+
 # --- global functions ------------------------------------------------#
 
-def tmploop_get_remote_files(i,matching,user,pw,
-                            server,path,
-                            path_local):
-    #for element in matching:
-    print("File: ",matching[i])
-    dlstr=('ftp://' + user + ':' + pw + '@'
-                + server + path + matching[i])
-    for attempt in range(10):
-        print ("Attempt to download data: ")
-        try:
-            print ("Downloading file")
-            urlretrieve(dlstr, path_local + '/' + matching[i])
-            urlcleanup()
-        except Exception as e:
-            print (e.__doc__)
-            print (e.message)
-            print ("Waiting for 10 sec and retry")
-            time.sleep(10)
-        else:
-            break
-    else:
-        print ('An error was raised and I ' +
-              'failed to fix problem myself :(')
-        print ('Exit program')
-        sys.exit()
+def match_remote_files(content,sdate,edate,twin):
+    '''
+    returns files of the remote listing content with time stamps
+    between sdate and edate (+/- twin)
+    '''
+    idx = find_files_in_period(content,
+                               sdate-timedelta(minutes=twin),
+                               edate+timedelta(minutes=twin))
+    return list(dict.fromkeys([content[i] for i in idx]))
+
+def get_remote_pool(instr,provider,nproc):
+    '''
+    returns pool of nproc ftp connections to the server of provider
+    '''
+    # credentials
+    user, pw = get_credentials()
+    server = satellite_dict[instr][provider]['remote']['server']
+    print ('# ----- ')
+    print ('Chosen source: ')
+    print (instr + ' from ' + provider + ': ' + server)
+    print ('# ----- ')
+    print ("Used number of connections " + str(nproc) + "!")
+    return ftp_pool_class(server,user,pw,nconn=nproc)
+
+def print_download_report(report,path_local):
+    print (str(len(report['downloaded'])) + ' files downloaded, '
+         + str(len(report['skipped'])) + ' skipped, '
+         + str(len(report['failed'])) + ' failed')
+    for filename, error in report['failed']:
+        print ('Failed: ' + str(filename) + ': ' + error)
+    print ('Files downloaded to: \n' + path_local)
 
 def get_remote_files(path_remote,path_local,sdate,edate,twin,
-                    nproc,instr,provider):
+                    nproc,instr,provider,subdirs=False):
     '''
     Download swath files and store them at defined location
     time stamps in file name stand for: from, to, creation
+    files are stored in path_local/%Y/%m/ if subdirs is True
+    returns report dict with lists of downloaded, skipped,
+    and failed files
     '''
-    # credentials
-    user, pw = get_credentials()
+    report = {'downloaded':[],'skipped':[],'failed':[],'bytes':0}
+    if sdate < datetime(2017,7,9):
+        print("Product not available for chosen date!")
+        report['failed'].append((None,'product not available'))
+        return report
+    # persistent connections shared by all months
+    pool = get_remote_pool(instr,provider,nproc)
     tmpdate = deepcopy(sdate)
-    while (tmpdate <= edate):
-        # server and path
-        if sdate >= datetime(2017,7,9):
-            server = satellite_dict[instr][provider]['remote']['server']
+    try:
+        while (tmpdate <= edate):
+            # server and path
             path = (path_remote
                  + '/'
                  + str(tmpdate.year)
                  + '/'
                  + tmpdate.strftime('%m')
                  + '/')
-            print ('# ----- ')
-            print ('Chosen source: ')
-            print (instr + ' from ' + provider + ': ' + server)
-            print ('# ----- ')
-        else:
-            sys.exit("Product not available for chosen date!")
-        # get list of accessable files
-        ftp = FTP(server)
-        ftp.login(user, pw)
-        ftp.cwd(path)
-        content=FTP.nlst(ftp)
-        #choose files according to verification date
-        tmplst=[]
-        tmpdate_new=tmpdate-timedelta(minutes=twin)
-        tmpend=edate+timedelta(minutes=twin)
-        while (tmpdate_new.strftime("%Y%m%dT%H")
-            <= tmpend.strftime("%Y%m%dT%H")):
-            matchingtmp = [s for s in content
-                            if ('_'
-                            + str(tmpdate_new.year)
-                            + str(tmpdate_new)[5:7]
-                            + str(tmpdate_new)[8:10]
-                            + 'T'
-                            + str(tmpdate_new)[11:13])
-                            in s
-                            ]
-            tmplst = tmplst + matchingtmp
-            tmpdate_new = tmpdate_new + timedelta(minutes=twin)
-        matching = tmplst
-        # Download and gunzip matching files
-        print ('Downloading ' + str(len(matching))
-                + ' files: .... \n')
-        print ("Used number of processes " + str(nproc) + "!")
-        Parallel(n_jobs=nproc)(
-                        delayed(tmploop_get_remote_files)(
-                        i,matching,user,pw,server,
-                        path,path_local
-                        ) for i in range(len(matching))
-                        )
-        # update time
-        tmpdate = datetime((tmpdate + relativedelta(months=+1)).year,
-                            (tmpdate + relativedelta(months=+1)).month,1)
-    print ('Files downloaded to: \n' + path_local)
+            # get list of accessable files
+            try:
+                content = list_remote_files(pool,path)
+            except ftplib.all_errors as e:
+                print(e)
+                report['failed'].append((path,str(e)))
+                content = []
+            #choose files according to verification date
+            matching = match_remote_files(content,sdate,edate,twin)
+            # Download matching files
+            print ('Downloading ' + str(len(matching))
+                    + ' files: .... \n')
+            if subdirs:
+                tmppath = path_local + '/' + tmpdate.strftime('%Y/%m/')
+            else:
+                tmppath = path_local
+            report = merge_reports(report,
+                            download_files(pool,path,matching,tmppath,
+                                           nproc=nproc))
+            # update time
+            tmpdate = datetime(
+                        (tmpdate + relativedelta(months=+1)).year,
+                        (tmpdate + relativedelta(months=+1)).month,1)
+    finally:
+        pool.close()
+    print_download_report(report,path_local)
+    return report
+
+def sync_remote_files(path_remote,path_local,sdate,edate,twin,
+                    nproc,instr,provider,manifest=None):
+    '''
+    Download only swath files that are new or changed since the last
+    sync according to the manifest of remote listings (default:
+    path_local/.manifest.json), files are stored in path_local/%Y/%m/
+    returns report dict with lists of downloaded, skipped,
+    and failed files
+    '''
+    if manifest is None:
+        manifest = os.path.join(path_local,'.manifest.json')
+    synced = read_manifest(manifest)
+    report = {'downloaded':[],'skipped':[],'failed':[],'bytes':0}
+    pool = get_remote_pool(instr,provider,nproc)
+    tmpdate = datetime(sdate.year,sdate.month,1)
+    try:
+        while (tmpdate <= edate):
+            path = (path_remote
+                 + '/'
+                 + tmpdate.strftime('%Y/%m')
+                 + '/')
+            try:
+                listing = list_remote_files_with_facts(pool,path)
+            except ftplib.all_errors as e:
+                print(e)
+                report['failed'].append((path,str(e)))
+                listing = {}
+            matching = match_remote_files(
+                            get_changed_files(path,listing,synced),
+                            sdate,edate,twin)
+            print (str(len(matching)) + ' new or changed files in ' + path)
+            tmpreport = download_files(pool,path,matching,
+                            path_local + '/' + tmpdate.strftime('%Y/%m/'),
+                            nproc=nproc)
+            for filename in tmpreport['downloaded'] + tmpreport['skipped']:
+                synced[path.rstrip('/') + '/' + filename] = listing[filename]
+            write_manifest(manifest,synced)
+            report = merge_reports(report,tmpreport)
+            tmpdate = tmpdate + relativedelta(months=+1)
+    finally:
+        pool.close()
+    print_download_report(report,path_local)
+    return report
 
 # flatten all lists before returning them
 # define flatten function for lists
@@ -166,21 +221,148 @@ flatten = lambda l: [item for sublist in l for item in sublist]
 
 def check_date(filelst,date):
     '''
-    returns idx for file
+    returns idx of first and last file covering date
     '''
-    # check if str in lst according to desired date (sdate,edate)
-    idx = []
-    for i in range(len(filelst)):
-        element = filelst[i]
-        tmp = element.find(date.strftime('%Y%m%d'))
-        if tmp>=0:
-            #return first index available
-            idx.append(i)
+    start, end, creation = parse_file_dates(filelst)
+    day = np.datetime64(date.strftime('%Y-%m-%d'))
+    idx = np.flatnonzero((start.astype('datetime64[D]') <= day)
+                       & (end.astype('datetime64[D]') >= day))
     return idx[0],idx[-1]
 
 # ---------------------------------------------------------------------#
 
 
+def get_ncvar_mapping(pathtofile,varlst_cf,provider):
+    '''
+    returns dict of nc-variable names for the given cf standard names
+    and the attributes needed for processing, vardef in
+    satellite_specs.yaml overrules the names found in the file
+    '''
+    vardef = None
+    if satellite_dict['altimeter'][provider]['misc'] is not None:
+        vardef = satellite_dict['altimeter'][provider]['misc']['vardef']
+    ncvar_dict = {}
+    f = netCDF4.Dataset(pathtofile,'r')
+    for ncvar in f.variables:
+        stdname = getattr(f.variables[ncvar],'standard_name',None)
+        if stdname not in varlst_cf:
+            continue
+        if vardef is not None and stdname in vardef:
+            ncvar = vardef[stdname]
+        if stdname in ncvar_dict:
+            if ncvar_dict[stdname] != ncvar:
+                print("Caution: variable "
+                    + "standard_name is not unique !!!")
+                print("Only 1. appearance is used.")
+                print("variable " + ncvar + " is neglected")
+            continue
+        ncvar_dict[stdname] = ncvar
+    ncattr_dict = {
+        'lons_valid_min':getattr(f.variables[ncvar_dict[\
+                            variable_info['lons']['standard_name']]],
+                            'valid_min',None),
+        'time_unit':f.variables[ncvar_dict[\
+                            variable_info['time']['standard_name']]].units
+                  }
+    f.close()
+    return ncvar_dict, ncattr_dict
+
+def get_index_ranges(mask,maxgap=100):
+    '''
+    returns list of slices covering all True entries of mask,
+    slices less than maxgap entries apart are merged
+    '''
+    idx = np.flatnonzero(mask)
+    if len(idx) == 0:
+        return []
+    breaks = np.flatnonzero(np.diff(idx) > maxgap)
+    starts = np.r_[idx[0],idx[breaks+1]]
+    ends = np.r_[idx[breaks],idx[-1]] + 1
+    return [slice(start,end) for start,end in zip(starts,ends)]
+
+def read_local_ncfile(pathtofile,ncvar_dict,ncattr_dict=None,bbox=None):
+    '''
+    reads the variables in ncvar_dict from one file as np.arrays
+    if bbox is given only the index ranges with footprints
+    within bbox are read
+    returns None if the file cannot be read or has no
+    footprints within bbox
+    netCDF access is serialized by nc_lock as netCDF-C/HDF5 are
+    not thread-safe
+    '''
+    with nc_lock:
+        try:
+            # file includes a 1-D dataset with dimension time
+            f = netCDF4.Dataset(pathtofile,'r')
+        except (IOError) as e:
+            print ("No such file or directory")
+            print (e)
+            return None
+        try:
+            vardict = {}
+            if bbox is None:
+                ranges = [slice(None)]
+            else:
+                # cheap coordinate only read to find index ranges
+                for var in ['lats','lons']:
+                    stdname = variable_info[var]['standard_name']
+                    vardict[stdname] = np.ma.filled(
+                        f.variables[ncvar_dict[stdname]][:]\
+                                            .astype('float64'),
+                        np.nan)
+                lons = vardict[variable_info['lons']['standard_name']]
+                if ncattr_dict['lons_valid_min'] == 0:
+                    lons = ((lons - 180) % 360) - 180
+                ranges = get_index_ranges(get_bbox_mask(
+                        vardict[variable_info['lats']['standard_name']],
+                        lons,bbox))
+                if len(ranges) == 0:
+                    return None
+            for stdname in ncvar_dict:
+                if stdname in vardict:
+                    vardict[stdname] = np.concatenate(
+                            [vardict[stdname][r] for r in ranges])
+                else:
+                    vardict[stdname] = np.concatenate([np.ma.filled(
+                        f.variables[ncvar_dict[stdname]][r]\
+                                            .astype('float64'),
+                        np.nan) for r in ranges])
+        except (KeyError) as e:
+            print ("Variable missing in " + pathtofile)
+            print (e)
+            vardict = None
+        finally:
+            f.close()
+        return vardict
+
+def get_local_satfiles(sat,sdate,edate,twin,instr='altimeter',
+    provider='cmems',download_path=None):
+    '''
+    returns sorted list of local files of sat whose time stamps in the
+    filename overlap the time window (files without time stamps are
+    included), the files are not opened
+    '''
+    if download_path is None:
+        path_local = satellite_dict[instr][provider]\
+                    ['local']['path'] + '/' + sat + '/'
+    else:
+        path_local = download_path
+    sdate_tw = sdate - timedelta(minutes=twin)
+    edate_tw = edate + timedelta(minutes=twin)
+    pathlst = []
+    for dirpath in get_local_dirs(path_local,sdate_tw,edate_tw):
+        try:
+            filelst = sorted(os.listdir(dirpath))
+        except FileNotFoundError:
+            continue
+        pathlst += [os.path.join(dirpath,e) for e in filelst
+                    if e.endswith('.nc')]
+    start, end, creation = parse_file_dates(pathlst)
+    idx = np.zeros(len(pathlst),dtype=bool)
+    idx[find_files_in_period(pathlst,sdate_tw,edate_tw)] = True
+    idx |= np.isnat(start)
+    return [pathlst[i] for i in np.flatnonzero(idx)]
+
 class satellite_class():
     '''
     Class to handle netcdf files containing satellite data i.e.
@@ -195,7 +377,8 @@ class satellite_class():
     def __init__(
         self,sdate,sat='s3a',instr='altimeter',provider='cmems',
         edate=None,twin=None,download=False,download_path=None,
-        remote_ftp_path=None,region=None,nproc=1,varalias='Hs'
+        remote_ftp_path=None,region=None,nproc=1,varalias='Hs',
+        read_backend='processes'
         ):
         print ('# ----- ')
         print (" ### Initializing satellite_class object ###")
@@ -223,6 +406,9 @@ class satellite_class():
             path_remote = remote_ftp_path
         self.path_local = path_local
         self.path_remote = path_remote
+        self.sat = sat
+        self.instr = instr
+        self.provider = provider
         # retrieve files
         if download is False:
             print ("No download initialized, checking local files")
@@ -235,52 +421,37 @@ class satellite_class():
         t0=time.time()
         pathlst, filelst = self.get_local_filelst(
                             sdate,edate,twin,region)
+        vardict = None
         if len(pathlst) > 0:
-            vardict = self.read_local_files(pathlst,provider,varalias)
-            print('Total: ', len(vardict['time']), ' footprints found')
-            # find values for give time constraint
-            dtime = list( netCDF4.num2date(vardict['time'],
-                                           vardict['time_unit']) )
-            cidx = collocate_times(dtime,sdate=sdate,edate=edate,twin=twin)
-            cvardict = {}
-            for element in vardict:
-                if element != 'time_unit':
-                    cvardict[element] = list(np.array(
-                                            vardict[element]
-                                            )[cidx])
-                else:
-                    cvardict[element] = vardict[element]
+            vardict = self.read_local_files(pathlst,provider,varalias,
+                                            nproc=nproc,
+                                            backend=read_backend,
+                                            region=region)
+        if vardict is not None:
+            # first readable file, meta data is taken from it
+            pathtofile = vardict.pop('pathtofile')
+            table = obs_table_class(vardict)
             del vardict
-            print('In chosen time period: ', len(cvardict['time']),
+            print('Total: ', len(table['time']), ' footprints found')
+            # find values for give time constraint
+            cidx = collocate_times(table.get_datetime64(),
+                                   sdate=sdate,edate=edate,twin=twin)
+            table = table.filter(cidx)
+            print('In chosen time period: ', len(table['time']),
                 ' footprints found')
             # find values for given region
-            ridx = self.matchregion(cvardict['latitude'],
-                                cvardict['longitude'],
+            ridx = self.matchregion(table['latitude'],
+                                table['longitude'],
                                 region=region,grid_date=sdate)
-            rvardict = {}
-            for element in cvardict:
-                if element != 'time_unit':
-                    rvardict[element] = list(np.array(
-                                            cvardict[element]
-                                            )[ridx])
-                else:
-                    rvardict[element] = cvardict[element]
-            del cvardict
-            if len(rvardict['time'])>0:
-                rvardict['datetime'] = netCDF4.num2date(
-                                            rvardict['time'],
-                                            rvardict['time_unit'])
+            table = table.filter(ridx)
+            if len(table['time'])>0:
                 print('For chosen region and time: ',
-                        len(rvardict['time']),'footprints found')
-                # convert to datetime object
-                timedt = rvardict['datetime']
-                rvardict['datetime'] = [datetime(t.year,t.month,t.day,
-                          t.hour,t.minute,t.second) for t in timedt]
+                        len(table['time']),'footprints found')
             else:
                 print('For chosen region and time: 0 footprints found!')
             # find variable name as defined in file
             stdname = variable_info[varalias]['standard_name']
-            ncdict = ncdumpMeta(pathlst[0])
+            ncdict = ncdumpMeta(pathtofile)
             filevarname = get_varname_for_cf_stdname_in_ncfile(
                                                 ncdict,stdname)
             if (len(filevarname) or filename is None) > 1:
@@ -289,11 +460,11 @@ class satellite_class():
             else:
                 filevarname = get_varname_for_cf_stdname_in_ncfile(
                                                     ncdict,stdname)[0]
-            rvardict['model_meta'] = ncdict
+            table['model_meta'] = ncdict
             # define class variables
             self.edate = edate
             self.sdate = sdate
-            self.vars = rvardict
+            self.vars = table
             self.varalias = varalias
             self.varname = filevarname
             self.stdvarname = stdname
@@ -312,124 +483,121 @@ class satellite_class():
             print ('# ----- ')
 
     def get_local_filelst(self,sdate,edate,twin,region):
+        '''
+        returns paths and names of local files covering the time
+        window and region, files are selected from the catalogue of
+        the mission which is updated for new files beforehand
+        '''
         print ("Time window: ", twin)
-        tmpdate = deepcopy(sdate-timedelta(minutes=twin))
-        pathlst = []
-        filelst = []
-        try:
-            while (tmpdate <= edate + timedelta(minutes=twin)):
-                if self.path_local == 'tmp_unittest/':
-                    tmpdatestr = self.path_local
-                else:
-                    tmpdatestr=(self.path_local
-                        + str(tmpdate.year)
-                        + '/' + tmpdate.strftime('%m')
-                        + '/')
-                tmplst = np.sort(os.listdir(tmpdatestr))
-                filelst.append(tmplst)
-                pathlst.append([(tmpdatestr + e) for e in tmplst])
-                if (edate is not None and edate!=sdate):
-                    tmpdate = tmpdate + timedelta(hours=1)
-                else:
-                    tmpdate = tmpdate + relativedelta(months=+1)
-            filelst=np.sort(flatten(filelst))
-            pathlst=np.sort(flatten(pathlst))
-            idx_start,tmp = check_date(pathlst,sdate-timedelta(minutes=twin))
-            tmp,idx_end = check_date(pathlst,edate+timedelta(minutes=twin))
-            del tmp
-            pathlst = np.unique(pathlst[idx_start:idx_end+1])
-            filelst = np.unique(filelst[idx_start:idx_end+1])
-            print (str(int(len(pathlst))) + " valid files found")
-        except FileNotFoundError as e:
-            print(e)
+        sdate_tw = sdate - timedelta(minutes=twin)
+        edate_tw = edate + timedelta(minutes=twin)
+        catalog = catalog_class(self.get_catalog_file())
+        catalog.update(get_local_dirs(self.path_local,sdate_tw,edate_tw),
+                       sdate=sdate_tw,edate=edate_tw)
+        # files not intersecting the region are skipped
+        pathlst = catalog.query(sdate_tw,edate_tw,
+                                bbox=get_region_bbox(region))
+        catalog.close()
+        filelst = np.array([os.path.basename(e) for e in pathlst])
+        print (str(int(len(pathlst))) + " valid files found")
         return pathlst,filelst
 
-    def read_local_files(self,pathlst,provider,varalias):
+    def get_catalog_file(self):
+        '''
+        returns path of the file catalogue of the mission, stored in
+        the directory given in satellite_specs.yaml or in path_local
+        '''
+        catalogpath = satellite_dict[self.instr][self.provider]\
+                        ['local'].get('catalogpath')
+        if catalogpath is None:
+            catalogpath = self.path_local
+        os.makedirs(catalogpath,exist_ok=True)
+        return os.path.join(catalogpath,
+                    'catalog_' + self.provider + '_' + self.sat + '.sqlite')
+
+    def read_local_files(self,pathlst,provider,varalias,
+                         nproc=1,backend='processes',region=None):
         '''
         read and concatenate all data to one timeseries for each variable
+        files are read in parallel using nproc processes or threads
+        (backend='processes' or 'threads'), the result is sorted by
+        time and redundant entries are removed. netCDF-C/HDF5 are not
+        thread-safe, with threads all file access is serialized by
+        nc_lock such that only the processing runs concurrently
+        if region is given only the parts of the files within the
+        bounding box of region are read
+        returns None if none of the files can be read
         '''
-        # --- open file and read variables --- #
         varlst = [varalias] + ['lons','lats','time']
         varlst_cf = []
         for var in varlst:
             varlst_cf.append(variable_info[var]['standard_name'])
-        count = 0
         print ("Processing " + str(int(len(pathlst))) + " files")
         print (pathlst[0])
         print (pathlst[-1])
-        vardict = {}
-        for element in pathlst:
-            progress(count,str(int(len(pathlst))),'')
-            stdname_lst = []
+        # nc-variable names are resolved once for the product
+        # from the first readable file
+        for pathtofile in pathlst:
             try:
-                # file includes a 1-D dataset with dimension time
-                f = netCDF4.Dataset(element,'r')
-                ncvars = [v for v in f.variables]
-                for ncvar in ncvars:
-                    stdname = f.variables[ncvar].getncattr('standard_name')
-                    if satellite_dict['altimeter'][provider]\
-                    ['misc']['vardef'] is not None:
-                        if (stdname in satellite_dict['altimeter'][provider]\
-                        ['misc']['vardef']
-                        and ncvar != satellite_dict['altimeter'][provider]\
-                        ['misc']['vardef'][stdname]):
-                            ncvar = satellite_dict['altimeter'][provider]\
-                                ['misc']['vardef'][stdname]
-                    if stdname in varlst_cf:
-                        if stdname in vardict:
-                            if stdname in stdname_lst:
-                                print("Caution: variable " +
-                                        "standard_name is not unique !!!")
-                                if satellite_dict['altimeter'][provider]\
-                                ['misc']['vardef'] is not None:
-                                    if stdname in satellite_dict['altimeter']\
-                                    [provider]['misc']['vardef']:
-                                        print( "As defined in "
-                                        + "satellite_specs.yaml, "
-                                        + "the following "
-                                        + "nc-variable name "
-                                        + "is chosen:\n", ncvar, "for "
-                                        + "stdname: ", stdname )
-                                else:
-                                    print("Only 1. appearance is used.")
-                                    print("variable " + ncvar + " is neglected")
-                            else:
-                                tmp = list(f.variables[ncvar][:])
-                                vardict[stdname] += tmp
-                        else:
-                            tmp = list(f.variables[ncvar][:])
-                            vardict[stdname] = tmp
-                        stdname_lst.append(stdname)
-            except (IOError) as e:
-                print ("No such file or directory")
-                print (e)
-            count = count + 1
-        print ('\n')
-        # remove redundant entries
+                ncvar_dict, ncattr_dict = get_ncvar_mapping(pathtofile,
+                                                    varlst_cf,provider)
+                break
+            except (OSError,KeyError,AttributeError) as e:
+                print ("Cannot read " + pathtofile + ":", e)
+        else:
+            print ("None of the files can be read")
+            return None
+        bbox = get_region_bbox(region)
+        print ("Used number of " + backend + ": " + str(nproc))
+        chunks = Parallel(n_jobs=nproc,prefer=backend)(
+                        delayed(read_local_ncfile)(element,ncvar_dict,
+                                                   ncattr_dict=ncattr_dict,
+                                                   bbox=bbox)
+                        for element in pathlst
+                        )
+        chunks = [chunk for chunk in chunks if chunk is not None]
+        # merge into preallocated arrays
+        nobs = sum([len(chunk['time']) for chunk in chunks])
+        vardict = {}
+        for key in ncvar_dict:
+            vardict[key] = np.empty(nobs,dtype=obs_table_class.dtypes.get(
+                                    key,obs_table_class.default_dtype))
+        start = 0
+        for chunk in chunks:
+            end = start + len(chunk['time'])
+            for key in ncvar_dict:
+                vardict[key][start:end] = chunk[key]
+            start = end
+        del chunks
+        # sort by time and remove redundant entries
         time_unique,indices=np.unique(vardict['time'],return_index=True)
         for key in vardict:
-            vardict[key]=list(np.array(vardict[key])[indices])
-        if (f.variables[variable_info['lons']\
-        ['standard_name']].getncattr('valid_min') == 0):
+            vardict[key]=vardict[key][indices]
+        if ncattr_dict['lons_valid_min'] == 0:
             # transform to -180 to 180 degrees
-            tmp = np.array(vardict[variable_info['lons']['standard_name']])
-            vardict[variable_info['lons']['standard_name']] \
-                = list(((tmp - 180) % 360) - 180)
+            lonname = variable_info['lons']['standard_name']
+            vardict[lonname] = ((vardict[lonname] - 180) % 360) - 180
         # add reference time from netcdf
-        vardict['time_unit'] = f.variables['time'].units
-        # close nc-file
-        f.close()
+        vardict['time_unit'] = ncattr_dict['time_unit']
+        vardict['pathtofile'] = pathtofile
         return vardict
 
     def matchregion(self,LATS,LONS,region,grid_date):
+        '''
+        returns boolean mask of footprints within region
+        '''
         # region in region_dict[poly]:
         # find values for given region
-        if (region not in region_dict['poly'] and region not in model_dict):
-            if region is None:
-                region = 'global'
-            if ~isinstance(region,str)==True:
+        if region is None:
+            region = 'global'
+        if (isinstance(region,str)
+        and (region in region_dict['poly'] or region in model_dict)):
+            ridx = self.matchregion_poly(LATS,LONS,region=region,
+                                    grid_date=grid_date)
+        else:
+            if not isinstance(region,str):
                 print ("Manually specified region "
-                    + [llcrnrlat,urcrnrlat,llcrnrlon,urcrnrlon] + ": \n"
+                    + "[llcrnrlat,urcrnrlat,llcrnrlon,urcrnrlon]: \n"
                     + " --> Bounds: " + str(region))
             else:
                 if region not in region_dict['rect']:
@@ -438,46 +606,11 @@ class satellite_class():
                     print ("Specified region: " + region + "\n"
                       + " --> Bounds: " + str(region_dict['rect'][region]))
             ridx = self.matchregion_rect(LATS,LONS,region=region)
-        else:
-            ridx = self.matchregion_poly(LATS,LONS,region=region,
-                                    grid_date=grid_date)
         return ridx
 
     def matchregion_rect(self,LATS,LONS,region):
-        if (region is None or region == "global"):
-            region = "global"
-            ridx = range(len(LATS))
-        else:
-            if isinstance(region,str)==True:
-                if "boundinglat" in region_dict['rect'][region]:
-                    boundinglat = region_dict['rect'][region]["boundinglat"]
-                else:
-                    llcrnrlat = region_dict['rect'][region]["llcrnrlat"]
-                    urcrnrlat = region_dict['rect'][region]["urcrnrlat"]
-                    llcrnrlon = region_dict['rect'][region]["llcrnrlon"]
-                    urcrnrlon = region_dict['rect'][region]["urcrnrlon"]
-            else:
-                llcrnrlat = region[0]
-                urcrnrlat = region[1]
-                llcrnrlon = region[2]
-                urcrnrlon = region[3]
-            # check if coords in region
-            ridx=[]
-            for i in range(len(LATS)):
-                if (
-                "boundinglat" in region_dict['rect'][region]
-                and LATS[i] >= boundinglat
-                    ):
-                    ridx.append(i)
-                elif(
-                not "boundinglat" in region_dict['rect'][region]
-                and LATS[i] >= llcrnrlat
-                and LATS[i] <= urcrnrlat
-                and LONS[i] >= llcrnrlon
-                and LONS[i] <= urcrnrlon
-                    ):
-                    ridx.append(i)
-        if not ridx:
+        ridx = get_region_mask(LATS,LONS,region)
+        if not np.any(ridx):
             print ("No values for chosen region and time frame!!!")
         else:
             print ("Values found for chosen region and time frame.")
@@ -496,68 +629,12 @@ class satellite_class():
             poly = Polygon(list(zip(region['lons'],
                 region['lats'])), closed=True)
         elif (isinstance(region,str)==True and region in model_dict):
-            try:
-                print('Use date for retrieving grid: ', grid_date)
-                filestr = make_model_filename_wrapper(\
-                                        region,grid_date,'best')
-                model_meta = ncdumpMeta(filestr)
-                flon = get_filevarname(region,\
-                                    'lons',variable_info,\
-                                    model_dict,model_meta)
-                flat = get_filevarname(region,\
-                                    'lats',variable_info,\
-                                    model_dict,model_meta)
-                M = xa.open_dataset(filestr, decode_cf=True)
-                model_lons = M[flon].data
-                model_lats = M[flat].data
-            except (KeyError,IOError,ValueError) as e:
-                print(e)
-                if 'grid_date' in model_dict[region]:
-                    grid_date = model_dict[region]['grid_date']
-                    print('Trying default date ', grid_date)
-                else:
-                    grid_date = datetime(
-                                        datetime.now().year,
-                                        datetime.now().month,
-                                        datetime.now().day
-                                        )
-                filestr = make_model_filename_wrapper(\
-                                        region,grid_date,'best')
-                model_meta = ncdumpMeta(filestr)
-                flon = get_filevarname(region,\
-                                    'lons',variable_info,\
-                                    model_dict,model_meta)
-                flat = get_filevarname(region,\
-                                    'lats',variable_info,\
-                                    model_dict,model_meta)
-                M = xa.open_dataset(filestr, decode_cf=True)
-                model_lons = M[flon].data
-                model_lats = M[flat].data
-            if (len(model_lons.shape)==1):
-                model_lons, model_lats = np.meshgrid(
-                                        model_lons,
-                                        model_lats
-                                        )
             print('Check if footprints fall within the chosen domain')
             if (region=='global'):
-                rlatlst, rlonlst = LATS, LONS
+                ridx = np.ones(len(LATS),dtype=bool)
             else:
-                ncdict = ncdumpMeta(filestr)
-                try:
-                    proj4 = find_attr_in_nc('proj',ncdict=ncdict,
-                                            subattrstr='proj4')
-                except IndexError:
-                    print('proj4 not defined in netcdf-file')
-                    print('Using proj4 from model config file')
-                    proj4 = model_dict[region]['proj4']
-                proj_model = pyproj.Proj(proj4)
-                Mx, My = proj_model(model_lons,model_lats,inverse=False)
-                Vx, Vy = proj_model(LONS,LATS,inverse=False)
-                xmax, xmin = np.max(Mx), np.min(Mx)
-                ymax, ymin = np.max(My), np.min(My)
-                ridx = list(np.where((Vx>xmin) & (Vx<xmax) &
-                                (Vy>ymin) & (Vy<ymax))[0]
-                            )
+                ridx = get_model_domain_mask(LATS,LONS,region,
+                                             grid_date=grid_date)
         elif isinstance(region,str)==True:
             print ("Specified region: " + region + "\n"
               + " --> Bounded by polygon: \n"
@@ -566,19 +643,14 @@ class satellite_class():
             poly = Polygon(list(zip(region_dict['poly'][region]['lons'],
                 region_dict['poly'][region]['lats'])), closed=True)
             # check if coords in region
-            LATS = list(LATS)
-            LONS = list(LONS)
-            latlst = LATS
-            lonlst = LONS
             lats = np.array(LATS).ravel()
             lons = np.array(LONS).ravel()
             points = np.c_[lons,lats]
             # radius seems to be important to correctly define polygone
             # see discussion here:
             # https://github.com/matplotlib/matplotlib/issues/9704
-            hits = Path(poly.xy).contains_points(points,radius=1e-9)
-            ridx = list(np.array(range(len(LONS)))[hits])
-        if not ridx:
+            ridx = Path(poly.xy).contains_points(points,radius=1e-9)
+        if not np.any(ridx):
             print ("No values for chosen region and time frame!!!")
         else:
             print ("Values found for chosen region and time frame.")
@@ -0,0 +1,367 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# ---------------------------------------------------------------------#
+'''
+This module encompasses methods to schedule collocation jobs. A
+collocation request is expanded into independent tasks of one
+mission, one leadtime, and one month which are run on a pool of
+worker processes. Each task writes only to its monthly output file,
+writes are additionally serialized by a file lock, such that the
+resulting files are the same as from a serial run. Long periods can
+be collocated in chunks one after another, each chunk is written
+before the next one is read. Completed tasks are recorded in a
+manifest with fingerprints (size, mtime) of their model and satellite
+input files, a rerun skips them and reprocesses only failed tasks and
+tasks whose inputs changed, e.g. due to late arriving data. The
+manifest is kept next to the output files and shared by all requests
+writing there.
+'''
+# --- import libraries ------------------------------------------------#
+# standard library imports
+import os
+import time
+import calendar
+from datetime import datetime, timedelta
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+# own imports
+from utils import make_fc_dates, collocate_times, file_lock_class
+from utils import read_manifest, write_manifest
+
+# ---------------------------------------------------------------------#
+
+def get_month_periods(sdate,edate):
+    '''
+    returns list of (first,last) microsecond of all calendar months
+    overlapping the period sdate to edate
+    '''
+    periods = []
+    tmpdate = datetime(sdate.year,sdate.month,1)
+    while tmpdate <= edate:
+        eom = datetime(tmpdate.year,tmpdate.month,
+                       calendar.monthrange(tmpdate.year,tmpdate.month)[1],
+                       23,59,59,999999)
+        periods.append((tmpdate,eom))
+        tmpdate = eom + timedelta(microseconds=1)
+    return periods
+
+def get_chunk_periods(sdate,edate,chunk='month'):
+    '''
+    returns list of (first,last) microsecond of chunks overlapping the
+    period sdate to edate, chunk is 'month' or a number of days.
+    Chunks of days start at midnight of sdate and do not cross month
+    boundaries, the first and last chunk are extended to the start
+    and end of their month like the monthly output files
+    '''
+    months = get_month_periods(sdate,edate)
+    if chunk == 'month':
+        return months
+    periods = []
+    for month in months:
+        tmpdate = max(month[0],datetime(sdate.year,sdate.month,sdate.day))
+        while (tmpdate <= month[1] and tmpdate <= edate):
+            end = min(tmpdate + timedelta(days=chunk,microseconds=-1),
+                      month[1])
+            periods.append((tmpdate,end))
+            tmpdate = end + timedelta(microseconds=1)
+    periods[0] = (months[0][0],periods[0][1])
+    periods[-1] = (periods[-1][0],months[-1][1])
+    return periods
+
+def make_collocation_tasks(model,missions,leadtimes,sdate,edate,
+    date_incr=1,twin=30,chunk='month',**kwargs):
+    '''
+    expands a collocation request into (mission, leadtime, chunk)
+    tasks, chunks are months by default (see get_chunk_periods).
+    A task comprises the fc_dates of the serial run whose time
+    window overlaps the chunk, only observations within the chunk
+    are kept by the task. kwargs (region, distlim, varalias, path,
+    filename) are passed on to run_collocation_task
+    '''
+    fc_dates = make_fc_dates(sdate,edate,date_incr)
+    tasks = []
+    for mission in missions:
+        for leadtime in leadtimes:
+            for period in get_chunk_periods(sdate,edate,chunk=chunk):
+                dates = [d for d in fc_dates
+                         if (d >= period[0] - timedelta(minutes=twin)
+                         and d <= period[1] + timedelta(minutes=twin))]
+                if len(dates) == 0:
+                    continue
+                task = {'model':model,'mission':mission,
+                        'leadtime':leadtime,'period':period,
+                        'sdate':dates[0],'edate':dates[-1],
+                        'date_incr':date_incr,'twin':twin}
+                task.update(kwargs)
+                tasks.append(task)
+    return tasks
+
+def run_collocation_task(task):
+    '''
+    collocates model and satellite data of one task and writes
+    the collocated values within the period of the task to the
+    monthly output file
+    returns report dict with status ('done','empty','failed'),
+    number of written values and error message
+    '''
+    from satmod import satellite_class
+    from collocmod import collocation_class
+    report = {'task':task,'status':None,'nvalues':0,'error':None,
+              'outputs':[]}
+    try:
+        sa_obj = satellite_class(sdate=task['sdate'],edate=task['edate'],
+                                 sat=task['mission'],
+                                 twin=task['twin'],
+                                 region=task.get('region'),
+                                 varalias=task.get('varalias','Hs'))
+        if ('vars' not in vars(sa_obj) or len(sa_obj.vars['time']) == 0):
+            report['status'] = 'empty'
+            return report
+        col_obj = collocation_class(model=task['model'],
+                                    obs_obj=sa_obj,
+                                    distlim=task.get('distlim'),
+                                    leadtime=task['leadtime'],
+                                    date_incr=task['date_incr'])
+        # values of neighbouring periods are written by their tasks
+        idx = collocate_times(col_obj.vars['datetime'],
+                              sdate=task['period'][0],
+                              edate=task['period'][1])
+        col_obj = col_obj.subset(idx)
+        col_obj.sdate, col_obj.edate = task['period']
+        path, filename = task.get('path'), task.get('filename')
+        if (path is not None and filename is not None):
+            path = task['period'][0].strftime(path)
+            filename = task['period'][0].strftime(filename)
+        report['outputs'] = col_obj.write_to_monthly_nc(path=path,
+                                                        filename=filename)
+        report['nvalues'] = len(col_obj.vars['time'])
+        report['status'] = 'done'
+    except (Exception,SystemExit) as e:
+        # e.g. missing model files must not end the whole run
+        print(e)
+        report['status'] = 'failed'
+        report['error'] = str(e)
+    return report
+
+def get_task_key(task):
+    '''
+    returns key of task in the manifest, it does not depend on the
+    request such that a widened period finds completed tasks
+    '''
+    return '_'.join([str(task['model']),str(task['mission']),
+                     str(task.get('region')),str(task['leadtime']),
+                     task['period'][0].isoformat()])
+
+def get_static_dir(path_template):
+    '''
+    returns the leading directories of path_template which do not
+    contain date formats, e.g. /data/s3a/ for /data/s3a/%Y/%m/
+    '''
+    static = []
+    for part in os.path.normpath(path_template).split(os.sep):
+        if '%' in part:
+            break
+        static.append(part)
+    return os.sep.join(static) or os.sep
+
+def get_manifest_file(tasks):
+    '''
+    returns path of the manifest of tasks, it is located in the
+    common directory of their output paths, or of the path template
+    in collocation_specs.yaml for tasks without path
+    '''
+    pathlst = [task.get('path') for task in tasks]
+    if None in pathlst:
+        from collocmod import collocation_dict
+        pathlst = [p for p in pathlst if p is not None]
+        pathlst.append(collocation_dict['path']['satellite_altimeter']\
+                                       ['local']['nc']['path_template'][0])
+    dirlst = [os.path.abspath(get_static_dir(p)) for p in pathlst]
+    return os.path.join(os.path.commonpath(dirlst),
+                        'collocation_manifest.json')
+
+def update_manifest(statefile,entries=None,remove=None):
+    '''
+    adds entries to and removes keys from the manifest statefile,
+    the file is locked and reread such that several runs can share it
+    returns updated manifest
+    '''
+    with file_lock_class(statefile):
+        manifest = read_manifest(statefile)
+        for key in (remove or []):
+            manifest.pop(key,None)
+        manifest.update(entries or {})
+        write_manifest(statefile,manifest)
+    return manifest
+
+def get_file_fingerprint(pathtofile):
+    '''
+    returns [size, mtime in ns] of pathtofile, None if missing
+    '''
+    try:
+        stat = os.stat(pathtofile)
+    except OSError:
+        return None
+    return [stat.st_size, stat.st_mtime_ns]
+
+def get_task_fingerprint(task):
+    '''
+    returns dict of the model and satellite files read by a
+    collocation task with their fingerprints, None if the input
+    files cannot be determined
+    '''
+    from modelmod import group_fc_dates_by_file
+    from satmod import get_local_satfiles
+    try:
+        fc_dates = make_fc_dates(task['sdate'],task['edate'],
+                                 task['date_incr'])
+        pathlst = sorted(group_fc_dates_by_file(task['model'],fc_dates,
+                                                task['leadtime']))
+        pathlst += get_local_satfiles(task['mission'],task['sdate'],
+                                      task['edate'],task['twin'])
+    except Exception as e:
+        print(e)
+        return None
+    return {f:get_file_fingerprint(f) for f in pathlst}
+
+def get_pending_tasks(tasks,manifest,inputs):
+    '''
+    returns indices of tasks to be processed, these are tasks not
+    completed before and tasks whose inputs changed since. A changed
+    task is reprocessed together with all following tasks of its
+    monthly output file, returned as dict of output files and the
+    date from which on their records are to be removed
+    '''
+    pending = []
+    truncate = {}
+    redo = set()
+    for i, task in enumerate(tasks):
+        entry = manifest.get(get_task_key(task))
+        group = (str(task['model']),str(task['mission']),
+                 str(task.get('region')),str(task['leadtime']),
+                 task['period'][0].strftime('%Y%m'))
+        if entry is None:
+            pending.append(i)
+        elif (group in redo or (inputs[i] is not None
+        and entry['inputs'] is not None
+        and entry['inputs'] != inputs[i])):
+            if group not in redo:
+                print('Inputs of', get_task_key(task), 'changed')
+                for pathtofile in entry['outputs']:
+                    truncate.setdefault(pathtofile,task['period'][0])
+            redo.add(group)
+            pending.append(i)
+    return pending, truncate
+
+def prepare_manifest(tasks,statefile,restart,fingerprint):
+    '''
+    returns manifest, input fingerprints, and indices of pending
+    tasks, records of changed tasks are removed from their output
+    files and from the manifest
+    '''
+    from ncmod import remove_nc_ts_after
+    manifest = read_manifest(statefile) if restart else {}
+    print('Completed tasks are recorded in:', statefile)
+    inputs = [fingerprint(task) for task in tasks]
+    pending, truncate = get_pending_tasks(tasks,manifest,inputs)
+    manifest = update_manifest(statefile,
+                    remove=[get_task_key(tasks[i]) for i in pending])
+    for pathtofile in truncate:
+        print('Remove records from', truncate[pathtofile], 'on in',
+              pathtofile)
+        with file_lock_class(pathtofile):
+            remove_nc_ts_after(pathtofile,truncate[pathtofile])
+    return manifest, inputs, pending
+
+def record_task(manifest,statefile,report,inputs):
+    '''
+    adds a successful task with its input fingerprints and output
+    files to the manifest
+    '''
+    if report['status'] in ['done','empty']:
+        key = get_task_key(report['task'])
+        manifest[key] = {'status':report['status'],
+                         'nvalues':report['nvalues'],
+                         'inputs':inputs,
+                         'outputs':report.get('outputs',[])}
+        update_manifest(statefile,entries={key:manifest[key]})
+
+def skipped_report(task):
+    return {'task':task,'status':'skipped','nvalues':0,'error':None}
+
+def run_tasks(tasks,fct=run_collocation_task,nproc=1,statefile=None,
+    restart=True,fingerprint=get_task_fingerprint):
+    '''
+    runs fct(task) for all tasks on a pool of nproc worker
+    processes, in this process if nproc is 1, chunks shorter than a
+    month are to be run with run_chunked to keep the output in order.
+    Completed tasks are recorded with the fingerprints of their input
+    files in the manifest statefile (by default next to the output,
+    see get_manifest_file), with restart a rerun skips them unless
+    their inputs changed
+    returns list of reports in order of tasks
+    '''
+    t0 = time.time()
+    if statefile is None:
+        statefile = get_manifest_file(tasks)
+    manifest, inputs, pending = prepare_manifest(tasks,statefile,
+                                                 restart,fingerprint)
+    reports = [skipped_report(task) for task in tasks]
+    if nproc > 1:
+        with ProcessPoolExecutor(max_workers=nproc) as executor:
+            futures = {executor.submit(fct,tasks[i]):i for i in pending}
+            for future in as_completed(futures):
+                i = futures[future]
+                reports[i] = future.result()
+                record_task(manifest,statefile,reports[i],inputs[i])
+    else:
+        for i in pending:
+            reports[i] = fct(tasks[i])
+            record_task(manifest,statefile,reports[i],inputs[i])
+    print_task_summary(reports)
+    print('Time used for', len(tasks), 'tasks:',
+          round(time.time()-t0,2), 'seconds')
+    return reports
+
+def print_task_summary(reports):
+    for status in ['done','empty','skipped','failed']:
+        print(status + ':',
+              len([r for r in reports if r['status'] == status]))
+    for r in reports:
+        if r['status'] == 'failed':
+            print('failed:', r['task']['mission'], r['task']['leadtime'],
+                  r['task']['sdate'], '-', r['error'])
+
+def run_chunked(tasks,fct=run_collocation_task,statefile=None,
+    restart=True,fingerprint=get_task_fingerprint):
+    '''
+    runs tasks one after another in this process, each chunk is
+    written before the next one is processed such that memory is
+    bounded by the chunk size. Completed chunks are recorded in the
+    manifest statefile as in run_tasks. Processing stops at the
+    first failed chunk to keep the output files in order, a rerun
+    resumes from there.
+    returns list of reports in order of tasks
+    '''
+    t0 = time.time()
+    if statefile is None:
+        statefile = get_manifest_file(tasks)
+    manifest, inputs, pending = prepare_manifest(tasks,statefile,
+                                                 restart,fingerprint)
+    reports = []
+    for i, task in enumerate(tasks):
+        if i not in pending:
+            print('Chunk', get_task_key(task), 'already completed')
+            reports.append(skipped_report(task))
+            continue
+        report = fct(task)
+        reports.append(report)
+        if report['status'] == 'failed':
+            print('Stopped at chunk', get_task_key(task),
+                  '- rerun to resume from here')
+            break
+        record_task(manifest,statefile,report,inputs[i])
+    print_task_summary(reports)
+    print('Time used for', len(reports), 'chunks:',
+          round(time.time()-t0,2), 'seconds')
+    return reports
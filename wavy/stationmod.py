@@ -33,6 +33,7 @@ from datetime import datetime
 import scipy as sp
 # own imports
 from ncmod import ncdumpMeta, get_varname_for_cf_stdname_in_ncfile
+from ncmod import get_nc_dataset
 from ncmod import dumptonc_ts_station
 from utils import collocate_times
 from utils import make_pathtofile, get_pathtofile
@@ -214,12 +215,11 @@ class station_class():
                                           ['vardef'][stdvarname]
                 else:
                     varname = varname[0]
-                nc = netCDF4.Dataset(pathtofile,'r')
+                nc = get_nc_dataset(pathtofile)
                 var.append(nc.variables[varname][:])
                 timeobj = nc.variables['time']
                 time.append(nc.variables['time'][:])
                 timedt.append(netCDF4.num2date(timeobj[:],timeobj.units))
-                nc.close()
                 tmpdate = tmpdate + relativedelta(months = +1)
                 print(tmpdate)
             var = flatten(var)
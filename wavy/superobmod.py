@@ -8,6 +8,7 @@ import netCDF4
 
 # own imports
 from utils import find_included_times, collocate_times
+from utils import find_time_windows, make_datetime64_array
 
 moddir = os.path.abspath(os.path.join(os.path.dirname( __file__ ),
                         '..', 'config/variable_info.yaml'))
@@ -162,29 +163,26 @@ def lanczos(y,window,cutoff):
     return ts
 
 def block_means(dt,x,y,X,date_incr):
-    means = []
     if isinstance(x,list):
         x = np.array(x)
     if isinstance(y,list):
         y = np.array(y)
-    for i in range(len(X)):
-        # check if more than 50% of values are valid
-        # if so compute mean
-        idx = find_included_times(dt,\
-                                  sdate=X[i]-timedelta(hours=date_incr),\
-                                  edate=X[i],twin=0)
-        block = y[idx]
-        nominator = len(block[np.isnan(block)])
-        denominator = len(block)
-        if denominator == 0:
-            ratio = 1
-        else:
-            ratio = nominator/float(denominator)
-        if ratio < 0.5:
-            means.append(np.nanmean(block))
-        else:
-            means.append(np.nan)
-    means = np.array(means)
+    # find all blocks at once, each block is [X-date_incr,X]
+    X64 = make_datetime64_array(X)
+    idx, counts = find_time_windows(dt,
+                                    X64 - np.timedelta64(date_incr,'h'),
+                                    X64)
+    block = y[idx].astype(float)
+    winid = np.repeat(np.arange(len(counts)),counts)
+    valid = ~np.isnan(block)
+    nvalid = np.bincount(winid[valid],minlength=len(counts))
+    sums = np.bincount(winid[valid],weights=block[valid],
+                       minlength=len(counts))
+    # check if more than 50% of values are valid
+    # if so compute mean
+    means = np.full(len(counts),np.nan)
+    ok = (counts > 0) & ((counts - nvalid) < 0.5*counts)
+    means[ok] = sums[ok]/nvalid[ok]
     return means
 
 def so_linearGAM(x,y,X,varalias,**kwargs):
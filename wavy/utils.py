@@ -7,6 +7,11 @@ from math import radians, cos, sin, asin, sqrt, floor
 import sys
 import subprocess
 import os
+import re
+import json
+import hashlib
+import fcntl
+from collections.abc import Mapping, MutableMapping
 from sklearn import gaussian_process
 from sklearn.gaussian_process.kernels import RBF, ConstantKernel, WhiteKernel
 
@@ -65,6 +70,64 @@ def identify_outliers_GP(x,y,mag):
                 idx.append(i)
     return idx,x_pred,y_pred,sigma
 
+def window_nanstats(ts,lo,hi):
+    """
+    returns nanmean and nanstd of ts within the windows ts[lo:hi]
+    for all pairs of lo, hi (np.arrays), windows of equal length
+    are evaluated at once on a strided view of ts, i.e. without
+    loop over the values, empty windows give nan
+    """
+    from numpy.lib.stride_tricks import sliding_window_view
+    ts = np.asarray(ts,dtype=np.float64)
+    lo = np.clip(lo,0,len(ts))
+    hi = np.clip(hi,lo,len(ts))
+    mean = np.full(len(lo),np.nan)
+    std = np.full(len(lo),np.nan)
+    length = hi - lo
+    for L in np.unique(length[length > 0]):
+        sel = np.flatnonzero(length == L)
+        windows = sliding_window_view(ts,L)[lo[sel]]
+        with np.errstate(divide='ignore',invalid='ignore'):
+            mean[sel] = np.nanmean(windows,axis=1)
+            std[sel] = np.nanstd(windows,axis=1)
+    return mean, std
+
+def get_outlier_windows(n,block,backward=False):
+    """
+    returns windows lo, hi of the z-scores of identify_outliers for
+    all indices of a series of length n (forward or backward check),
+    and a mask of indices without own window, which reuse the
+    z-score of the previous index
+    """
+    idx = np.arange(n)
+    h = int(block/2)
+    lo, hi = np.zeros(n,dtype=int), np.full(n,n)
+    reuse = np.zeros(n,dtype=bool)
+    if n < block:
+        return lo, hi, reuse
+    start = idx < (h+1 if backward else block)
+    hi[start] = block
+    center = ~start & (idx >= h+1) & (idx < n-h)
+    lo[center], hi[center] = idx[center]-h, idx[center]+h
+    end = ~start & ~center & (idx > n-h)
+    lo[end], hi[end] = n-block, n-1
+    reuse = ~start & ~center & ~end
+    return lo, hi, reuse
+
+def calc_block_zscores(ts,block,backward=False):
+    """
+    returns z-scores of all values of ts with respect to mean and
+    std of the surrounding block as used in identify_outliers
+    """
+    ts = np.asarray(ts,dtype=np.float64)
+    lo, hi, reuse = get_outlier_windows(len(ts),block,backward=backward)
+    mean, std = window_nanstats(ts,lo,hi)
+    with np.errstate(divide='ignore',invalid='ignore'):
+        z = (ts - mean)/std
+    reuse = np.flatnonzero(reuse)
+    z[reuse] = z[np.maximum(reuse-1,0)]
+    return z
+
 def identify_outliers(time,ts,ts_ref=None,hs_ll=None,hs_ul=None,dt=None,block=None):
     """
     time -> time series to check neighbour values
@@ -80,63 +143,31 @@ def identify_outliers(time,ts,ts_ref=None,hs_ll=None,hs_ul=None,dt=None,block=No
         hs_ul = 30.
     if block is None:
         block = 25
-    std_ts = np.nanstd(ts)
-    mean_ts = np.nanmean(ts)
-    # forward check
-    idx_a = []
-    for i in range(1,len(ts)):
-        # transform to z
-        if len(ts)<block:
-            z = (ts[i] - np.nanmean(ts[:]))/np.nanstd(ts[:])
-        elif i<block:
-            z = (ts[i] - np.nanmean(ts[0:block]))/np.nanstd(ts[0:block])
-        elif (i>=int(block/2)+1 and i<(len(ts)-int(block/2))):
-            z = (ts[i] - np.nanmean(ts[i-int(block/2):i+int(block/2)]))/np.nanstd(ts[i-int(block/2):i+int(block/2)])
-        elif i>len(ts)-int(block/2):
-            z = ((ts[i] - np.nanmean(ts[(len(ts-1)-block):-1]))
-                /np.nanstd(ts[(len(ts-1)-block):-1]))
-        if dt == True:
-            delta_t = (time[i]-time[i-1]).total_seconds()
-        else:
-            delta_t = time[i]-time[i-1]
-        if delta_t<2:
-            #reject if value triples compared to neighbor
-            # reject if greater than twice std (>2z)
-            if ( ts[i] > hs_ll and ((ts[i-1] >= 3. * ts[i]) or (z>2)) ):
-                idx_a.append(i)
-        elif (ts[i] > hs_ll and z>2):
-            idx_a.append(i)
-    print (len(idx_a))
-    # backward check
-    idx_b = []
-    for i in range(0,len(ts)-1):
-        # transform to z
-        if len(ts)<block:
-            z = (ts[i] - np.nanmean(ts[:]))/np.nanstd(ts[:])
-        elif i<int(block/2)+1:
-            z = (ts[i] - np.nanmean(ts[0:block]))/np.nanstd(ts[0:block])
-        elif (i>=int(block/2)+1 and i<len(ts)-int(block/2)):
-            z = (ts[i] - np.nanmean(ts[i-int(block/2):i+int(block/2)]))/np.nanstd(ts[i-int(block/2):i+int(block/2)])
-        elif i>len(ts)-int(block/2):
-            z = ((ts[i] - np.nanmean(ts[(len(ts-1)-block):-1]))
-                /np.nanstd(ts[(len(ts-1)-block):-1]))
-        if dt == True:
-            delta_t = (time[i+1]-time[i]).total_seconds()
-        else:
-            delta_t = time[i+1]-time[i]
-        if delta_t<2:
-            #reject if value triples compared to neighbor
-            # reject if greater than twice std (>2z)
-            if ( ts[i] > hs_ll and ((ts[i+1] <= 1/3. * ts[i]) or (z>2)) ):
-                idx_b.append(i)
-        elif (ts[i] > hs_ll and z>2):
-            idx_b.append(i)
-    print (len(idx_b))
-    idx_c = []
-    for i in range(len(ts)):
+    ts = np.asarray(ts,dtype=np.float64)
+    if dt == True:
+        delta_t = (np.diff(np.asarray(time,dtype='datetime64[us]'))
+                   /np.timedelta64(1,'s'))
+    else:
+        delta_t = np.diff(np.asarray(time))
+    with np.errstate(invalid='ignore'):
+        # forward check
+        z = calc_block_zscores(ts,block)[1:]
+        #reject if value triples compared to neighbor
+        # reject if greater than twice std (>2z)
+        flag = (ts[1:] > hs_ll) & (z > 2)
+        flag |= ((delta_t < 2) & (ts[1:] > hs_ll)
+                 & (ts[:-1] >= 3. * ts[1:]))
+        idx_a = list(np.flatnonzero(flag) + 1)
+        print (len(idx_a))
+        # backward check
+        z = calc_block_zscores(ts,block,backward=True)[:-1]
+        flag = (ts[:-1] > hs_ll) & (z > 2)
+        flag |= ((delta_t < 2) & (ts[:-1] > hs_ll)
+                 & (ts[1:] <= 1/3. * ts[:-1]))
+        idx_b = list(np.flatnonzero(flag))
+        print (len(idx_b))
         # reject if hs>hs_ul
-        if ts[i]>hs_ul:
-            idx_c.append(i)
+        idx_c = list(np.flatnonzero(ts > hs_ul))
     idx = np.unique(np.array(idx_a + idx_b + idx_c))
     if len(idx)>0:
         print(str(len(idx)) 
@@ -285,14 +316,26 @@ def bootstr(a,reps):
                 m is the number of repetitions
               - indices of draws
     """
-    n = len(a)
-    b = np.random.choice(a, (n, reps))
-    bidx = np.zeros(b.shape) * np.nan
-    for i in range(len(a)):
-        tmp = np.where(b==a[i])
-        bidx[tmp[0],tmp[1]] = i
-        del tmp
-    return b, bidx.astype('int')
+    a = np.asarray(a)
+    bidx = get_boot_idx(len(a),reps).T
+    return a[bidx], bidx
+
+def get_boot_idx(n,reps,blocksize=None,rng=None):
+    """
+    draws indices of reps bootstrap samples of a series of length n,
+    with blocksize the moving block bootstrap is used, i.e. blocks of
+    blocksize consecutive indices are drawn to preserve the
+    autocorrelation of e.g. buoy time series
+    returns np.array of dim reps x n
+    """
+    if rng is None:
+        rng = np.random.default_rng()
+    if (blocksize is None or blocksize <= 1 or n <= blocksize):
+        return rng.integers(0,n,(reps,n))
+    nblocks = -(-n//blocksize)
+    starts = rng.integers(0,n-blocksize+1,(reps,nblocks))
+    bidx = (starts[:,:,None] + np.arange(blocksize)).reshape(reps,-1)
+    return bidx[:,:n]
 
 def marginalize(a,b=None):
     """
@@ -352,6 +395,118 @@ def get_size(obj, seen=None):
         size += sum([get_size(i, seen) for i in obj])
     return size
 
+def make_datetime64_array(t):
+    """
+    convert datetime, list/array of datetime (or cftime) objects,
+    or np.datetime64 to a np.array of dtype datetime64[us]
+    """
+    if isinstance(t,(datetime,np.datetime64)):
+        t = [t]
+    t = np.asarray(t)
+    if np.issubdtype(t.dtype,np.datetime64):
+        return t.astype('datetime64[us]')
+    try:
+        return t.astype('datetime64[us]')
+    except (TypeError,ValueError):
+        # e.g. cftime objects returned by netCDF4.num2date
+        return np.array([datetime(e.year,e.month,e.day,e.hour,
+                                  e.minute,e.second,e.microsecond)
+                         for e in t.ravel()],dtype='datetime64[us]')
+
+def make_epoch_array(t,time_unit):
+    """
+    convert numeric times given in cf time_unit
+    (e.g. 'seconds since 2000-01-01 00:00:00') to np.array
+    of dtype int64 holding microseconds since 1970-01-01
+    """
+    factors = {'microseconds':1,'milliseconds':10**3,'seconds':10**6,
+               'minutes':6*10**7,'hours':36*10**8,'days':864*10**8}
+    t = np.asarray(t,dtype='float64')
+    try:
+        step, ref = time_unit.split(' since ')
+        factor = factors[step.strip().lower()]
+        ref = ref.replace('UTC','').strip().replace(' ','T')
+        ref = np.datetime64(ref,'us')
+    except (ValueError,KeyError):
+        # e.g. time zones or uncommon unit strings
+        import netCDF4
+        return make_datetime64_array(
+                    netCDF4.num2date(t,time_unit)).astype('int64')
+    return ref.astype('int64') + np.rint(t*factor).astype('int64')
+
+def make_timedelta64(twin):
+    """
+    convert twin in minutes to np.timedelta64 in microseconds
+    """
+    if twin is None:
+        twin = 0
+    return np.timedelta64(int(round(twin*60*1e6)),'us')
+
+def sort_times(unfiltered_t):
+    """
+    returns the times as sorted datetime64[us] array and the
+    indices that sort the original times (None if already sorted)
+    """
+    t = make_datetime64_array(unfiltered_t)
+    if len(t) < 2 or np.all(t[1:] >= t[:-1]):
+        return t, None
+    order = np.argsort(t,kind='stable')
+    return t[order], order
+
+def find_time_windows(unfiltered_t,lower,upper):
+    """
+    find indices of unfiltered_t within each window [lower,upper]
+    using binary search on the sorted times
+    input:  unfiltered_t - times to be filtered
+            lower, upper - window bounds, datetime or arrays of those
+    output: idx - np.array of original indices, window by window,
+                  ascending within each window
+            counts - np.array with number of indices per window
+    """
+    t, order = sort_times(unfiltered_t)
+    lower = make_datetime64_array(lower)
+    upper = make_datetime64_array(upper)
+    lo = np.searchsorted(t,lower,side='left')
+    hi = np.searchsorted(t,upper,side='right')
+    counts = np.clip(hi-lo,0,None)
+    # expand [lo,hi) ranges into one index array without python loop
+    offsets = np.cumsum(counts) - counts
+    pos = np.arange(counts.sum()) + np.repeat(lo - offsets, counts)
+    if order is None:
+        idx = pos
+    else:
+        idx = order[pos]
+        # keep original ordering within each window
+        winid = np.repeat(np.arange(len(counts)), counts)
+        idx = idx[np.lexsort((idx,winid))]
+    return idx.astype('int64'), counts
+
+def find_nearest_times(unfiltered_t,target_t,twin=None):
+    """
+    find index of closest time in unfiltered_t for each target time
+    if twin (minutes) is given, targets without a match within twin
+    are assigned -1
+    returns np.array of indices
+    """
+    t, order = sort_times(unfiltered_t)
+    target = make_datetime64_array(target_t)
+    if len(t) == 0:
+        return np.full(len(target),-1,dtype='int64')
+    right = np.clip(np.searchsorted(t,target,side='left'),0,len(t)-1)
+    left = np.clip(right-1,0,len(t)-1)
+    dleft = np.abs(target - t[left])
+    dright = np.abs(t[right] - target)
+    pos = np.where(dleft <= dright, left, right)
+    # step back to first of equal times to mimic list.index
+    pos = np.searchsorted(t,t[pos],side='left')
+    if order is None:
+        idx = pos.astype('int64')
+    else:
+        idx = order[pos].astype('int64')
+    if twin is not None:
+        idx[np.minimum(dleft,dright) > make_timedelta64(twin)] = -1
+    return idx
+
 def find_included_times(unfiltered_t,target_t=None,
     sdate=None,edate=None,twin=0):
     """
@@ -359,14 +514,15 @@ def find_included_times(unfiltered_t,target_t=None,
     within a tolearance time window around the target time
     or within a time window specified by sdate and edate
     """
+    tw = make_timedelta64(twin)
     if (sdate is None and edate is None): # [interval]
-        idx = [ i for i in range(len(unfiltered_t))\
-             if (unfiltered_t[i] >= target_t-timedelta(minutes=twin)\
-             and unfiltered_t[i] <= target_t+timedelta(minutes=twin)) ]
+        target = make_datetime64_array(target_t)
+        idx, counts = find_time_windows(unfiltered_t,
+                                        target-tw,target+tw)
     else: # [interval]
-        idx = [ i for i in range(len(unfiltered_t))\
-             if (unfiltered_t[i] >= sdate-timedelta(minutes=twin)\
-             and unfiltered_t[i] <= edate+timedelta(minutes=twin)) ]
+        idx, counts = find_time_windows(unfiltered_t,
+                                    make_datetime64_array(sdate)-tw,
+                                    make_datetime64_array(edate)+tw)
     return idx
 
 def collocate_times(unfiltered_t,target_t=None,
@@ -380,18 +536,48 @@ def collocate_times(unfiltered_t,target_t=None,
     if twin is None:
         twin = 0
     if ((twin is None or twin == 0) and (sdate is None and edate is None)):
-        idx = [unfiltered_t.index(t) for t in target_t if (t in unfiltered_t)]
+        # first exact match for each target time
+        target = make_datetime64_array(target_t)
+        idx, counts = find_time_windows(unfiltered_t,target,target)
+        first = (np.cumsum(counts) - counts)[counts>0]
+        idx = idx[first]
     else:
         if (sdate is None and edate is None):
-            idx = [ find_included_times(unfiltered_t,target_t=t,
-                                    sdate=sdate,edate=edate,twin=twin) \
-                for t in target_t ]
-            idx = flatten(idx)
+            idx = find_included_times(unfiltered_t,target_t=target_t,
+                                      twin=twin)
         else:
             idx = find_included_times(unfiltered_t,sdate=sdate,
                                         edate=edate,twin=twin)
     return idx
 
+def parse_file_dates(filelst):
+    """
+    parses the time stamps (%Y%m%dT%H%M%S) in filenames, e.g.
+    global_vavh_l3_rt_s3a_20201101T010000_20201101T020000_\
+    20201101T030000.nc (start, end, creation)
+    returns np.arrays of dtype datetime64[s] for start, end and
+    creation time, NaT if not available, end defaults to start
+    """
+    stamps = np.full((len(filelst),3),'NaT',dtype='U19')
+    for i, filename in enumerate(filelst):
+        for j, stamp in enumerate(
+        re.findall(r'(\d{8}T\d{6})',os.path.basename(filename))[:3]):
+            stamps[i,j] = (stamp[0:4] + '-' + stamp[4:6] + '-'
+                + stamp[6:11] + ':' + stamp[11:13] + ':' + stamp[13:15])
+    dates = stamps.astype('datetime64[s]')
+    single = np.isnat(dates[:,1])
+    dates[single,1] = dates[single,0]
+    return dates[:,0], dates[:,1], dates[:,2]
+
+def find_files_in_period(filelst,sdate,edate):
+    """
+    returns indices of files whose time stamps in the filename
+    overlap the period sdate to edate
+    """
+    start, end, creation = parse_file_dates(filelst)
+    return np.flatnonzero((start <= make_datetime64_array(edate)[0])
+                        & (end >= make_datetime64_array(sdate)[0]))
+
 # flatten all lists before returning them
 # define flatten function for lists
 ''' fct does the following:
@@ -440,6 +626,184 @@ def convert_meteorologic_oceanographic(alpha):
     """
     return (alpha+180)%360
 
+class obs_vars_view(Mapping):
+    """
+    read-only mapping on the vars dict of an observation object
+    per footprint variables are returned restricted to idx, others
+    (e.g. time_unit, model_meta) are passed through
+    """
+    def __init__(self,parent_vars,idx,arrays):
+        self.parent_vars = parent_vars
+        self.idx = idx
+        # np.array versions of parent_vars, shared between views
+        self.arrays = arrays
+
+    def get_array(self,key):
+        if key not in self.arrays:
+            self.arrays[key] = np.asarray(self.parent_vars[key])
+        return self.arrays[key]
+
+    def is_footprint_var(self,key):
+        value = self.parent_vars[key]
+        return (isinstance(value,(list,tuple,np.ndarray))
+            and len(value) == len(self.parent_vars['time']))
+
+    def __getitem__(self,key):
+        if not self.is_footprint_var(key):
+            return self.parent_vars[key]
+        if self.idx is None:
+            return self.get_array(key)
+        return self.get_array(key)[self.idx]
+
+    def __iter__(self):
+        return iter(self.parent_vars)
+
+    def __len__(self):
+        return len(self.parent_vars)
+
+class obs_view_class():
+    """
+    lightweight view on an observation object (satellite_class,
+    station_class) restricted to the footprints in idx
+    attributes are taken from the parent object and variables are
+    subset on access, the parent object is never copied
+    usage:
+        view = obs_view_class(sa_obj)
+        view_step = view.subset(idx)
+        view_step.vars['time'] -> np.array(sa_obj.vars['time'])[idx]
+    """
+    def __init__(self,obs_obj,idx=None,arrays=None):
+        if arrays is None:
+            arrays = {}
+        if idx is not None:
+            idx = np.asarray(idx,dtype='int64')
+        self.parent = obs_obj
+        self.idx = idx
+        self.vars = obs_vars_view(obs_obj.vars,idx,arrays)
+
+    def subset(self,idx):
+        """
+        returns new view restricted to idx (relative to this view)
+        """
+        idx = np.asarray(idx,dtype='int64')
+        if self.idx is not None:
+            idx = self.idx[idx]
+        return obs_view_class(self.parent,idx=idx,
+                              arrays=self.vars.arrays)
+
+    def __getattr__(self,name):
+        # only called if attribute is not found in view
+        if name == 'parent':
+            raise AttributeError(name)
+        return getattr(self.parent,name)
+
+class obs_table_class(MutableMapping):
+    """
+    columnar container for the vars of an observation object
+    footprint variables are kept as contiguous typed np.arrays
+    (float32 values, float64 time and coordinates, int64 epoch in
+    microseconds since 1970-01-01), everything else (time_unit,
+    model_meta) as meta data. 'datetime' is derived from epoch on
+    access such that existing vars[...] consumers keep working.
+    usage:
+        table = obs_table_class(vardict)
+        table = table.filter(mask_or_idx)
+        table['datetime'] -> np.array of datetime objects
+    """
+    dtypes = {'time':'float64','epoch':'int64',
+              'longitude':'float64','latitude':'float64'}
+    default_dtype = 'float32'
+
+    def __init__(self,vardict=None):
+        self.columns = {}
+        self.meta = {}
+        if vardict is not None:
+            for key in vardict:
+                self[key] = vardict[key]
+
+    def make_column(self,key,value):
+        dtype = self.dtypes.get(key,self.default_dtype)
+        if isinstance(value,np.ma.MaskedArray):
+            if np.issubdtype(np.dtype(dtype),np.floating):
+                value = np.ma.filled(value.astype(dtype),np.nan)
+            else:
+                value = value.data
+        arr = np.asarray(value)
+        if (key in self.dtypes or arr.dtype.kind == 'f'):
+            arr = arr.astype(dtype,copy=False)
+        return np.ascontiguousarray(arr)
+
+    def get_epoch(self):
+        if 'epoch' not in self.columns:
+            self.columns['epoch'] = make_epoch_array(
+                                        self.columns['time'],
+                                        self.meta['time_unit'])
+        return self.columns['epoch']
+
+    def get_datetime64(self):
+        return self.get_epoch().astype('datetime64[us]')
+
+    def has_epoch(self):
+        return ('epoch' in self.columns or
+                ('time' in self.columns and 'time_unit' in self.meta))
+
+    def filter(self,idx):
+        """
+        returns new table restricted to idx
+        idx can be a boolean mask or an array of indices
+        """
+        idx = np.asarray(idx)
+        if idx.dtype != bool:
+            idx = idx.astype('int64')
+        table = obs_table_class()
+        table.columns = {key:self.columns[key][idx]
+                         for key in self.columns}
+        table.meta = dict(self.meta)
+        return table
+
+    def __getitem__(self,key):
+        if key in self.columns:
+            return self.columns[key]
+        if key in self.meta:
+            return self.meta[key]
+        if key == 'datetime' and self.has_epoch():
+            return self.get_datetime64().astype(object)
+        if key == 'epoch' and self.has_epoch():
+            return self.get_epoch()
+        raise KeyError(key)
+
+    def __setitem__(self,key,value):
+        if key == 'datetime':
+            key = 'epoch'
+            value = make_datetime64_array(value).astype('int64')
+        if key in ('time','time_unit'):
+            # epoch is derived from time and time_unit
+            self.columns.pop('epoch',None)
+        if (isinstance(value,(list,tuple,np.ndarray))
+        and key not in ('time_unit','model_meta')):
+            self.meta.pop(key,None)
+            self.columns[key] = self.make_column(key,value)
+        else:
+            self.columns.pop(key,None)
+            self.meta[key] = value
+
+    def __delitem__(self,key):
+        if key == 'datetime':
+            key = 'epoch'
+        if key in self.columns:
+            del self.columns[key]
+        else:
+            del self.meta[key]
+
+    def __iter__(self):
+        keys = [key for key in self.columns if key != 'epoch']
+        if self.has_epoch():
+            keys += ['epoch','datetime']
+        return iter(keys + list(self.meta))
+
+    def __len__(self):
+        return len(list(iter(self)))
+
 class NoStdStreams(object):
     # https://codereview.stackexchange.com/questions/25417/
     # is-there-a-better-way-to-make-a-function-silent-on-need
@@ -458,3 +822,67 @@ class NoStdStreams(object):
         sys.stdout = self.old_stdout
         sys.stderr = self.old_stderr
         self.devnull.close()
+
+class file_lock_class(object):
+    '''
+    exclusive lock on pathtofile + '.lock' such that several processes
+    can safely write to the same file one after another
+    usage:
+        with file_lock_class(pathtofile):
+            write to pathtofile
+    '''
+    def __init__(self,pathtofile):
+        self.lockfile = pathtofile + '.lock'
+
+    def __enter__(self):
+        os.makedirs(os.path.dirname(os.path.abspath(self.lockfile)),
+                    exist_ok=True)
+        self.f = open(self.lockfile,'a')
+        fcntl.flock(self.f,fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        fcntl.flock(self.f,fcntl.LOCK_UN)
+        self.f.close()
+
+def read_manifest(pathtofile):
+    '''
+    returns dict stored as json in pathtofile,
+    empty dict if pathtofile does not exist
+    '''
+    if not os.path.isfile(pathtofile):
+        return {}
+    with open(pathtofile,'r') as f:
+        return json.load(f)
+
+def write_manifest(pathtofile,manifest):
+    '''
+    writes dict manifest as json to pathtofile,
+    the file is replaced atomically
+    '''
+    os.makedirs(os.path.dirname(os.path.abspath(pathtofile)),
+                exist_ok=True)
+    with open(pathtofile + '.tmp','w') as f:
+        json.dump(manifest,f,indent=0,sort_keys=True)
+    os.replace(pathtofile + '.tmp',pathtofile)
+
+def get_cache_dir():
+    '''
+    returns per user cache directory of wavy,
+    $XDG_CACHE_HOME/wavy or ~/.cache/wavy
+    '''
+    cachehome = os.environ.get('XDG_CACHE_HOME')
+    if not cachehome:
+        cachehome = os.path.join(os.path.expanduser('~'),'.cache')
+    return os.path.join(cachehome,'wavy')
+
+def make_grid_fingerprint(model_lons,model_lats):
+    """
+    identifies a model grid by shape and hash of coordinates
+    """
+    md5 = hashlib.md5()
+    for coords in [model_lons,model_lats]:
+        coords = np.ma.filled(coords,np.nan)
+        md5.update(np.ascontiguousarray(coords).tobytes())
+    shapestr = 'x'.join([str(i) for i in np.shape(model_lats)])
+    return shapestr + '_' + md5.hexdigest()
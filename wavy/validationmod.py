@@ -102,6 +102,282 @@ def calc_mad(a,b):
     mad = np.sum(np.abs(a1-b1))/N
     return mad
 
+def get_group_index(groups,n):
+    '''
+    returns group index of each value and list of group keys,
+    groups is None (one group), an array of keys, or a list of
+    key arrays (e.g. [leadtimes,missions]) for combined keys
+    '''
+    if groups is None:
+        return np.zeros(n,dtype=int), [None]
+    if not isinstance(groups,(list,tuple)):
+        keys, gidx = np.unique(np.asarray(groups),return_inverse=True)
+        return gidx.ravel(), list(keys)
+    uniques, codes = [], []
+    for g in groups:
+        keys, code = np.unique(np.asarray(g),return_inverse=True)
+        uniques.append(keys)
+        codes.append(code.ravel())
+    dims = [len(keys) for keys in uniques]
+    combined, gidx = np.unique(np.ravel_multi_index(codes,dims),
+                               return_inverse=True)
+    codes = np.unravel_index(combined,dims)
+    keys = list(zip(*[u[c] for u, c in zip(uniques,codes)]))
+    return gidx.ravel(), keys
+
+# sufficient statistics of the validation metrics, see
+# calc_accumulator_states
+accumulator_fields = ['nov','na','sa','nb','sb','n','ma','mb',
+                      'm2a','m2b','cab','sd','sdd','sabs']
+
+def calc_accumulator_states(model,obs,groups=None):
+    '''
+    computes the sufficient statistics of all validation metrics
+    per group in one vectorized pass, the mask of valid pairs is
+    built once and all sums are accumulated with np.bincount:
+    nov (number of values), na/sa and nb/sb (count and sum of valid
+    model and obs values), n (valid pairs), ma/mb (means of pairs),
+    m2a/m2b/cab (second moments about these means), sd/sdd/sabs
+    (sum of differences, squared and absolute differences)
+    groups: None, array of keys, or list of key arrays
+    returns list of keys and dict of np.arrays in order of keys
+    '''
+    a = np.asarray(model,dtype=np.float64).ravel()
+    b = np.asarray(obs,dtype=np.float64).ravel()
+    gidx, keys = get_group_index(groups,len(a))
+    ng = len(keys)
+    def gsum(weights,mask):
+        return np.bincount(gidx[mask],weights=weights,minlength=ng)
+    valid_a = ~np.isnan(a)
+    valid_b = ~np.isnan(b)
+    valid = valid_a & valid_b
+    a1, b1 = a[valid], b[valid]
+    d1 = a1 - b1
+    states = {'nov':np.bincount(gidx,minlength=ng).astype(np.float64),
+              'na':gsum(None,valid_a),'sa':gsum(a[valid_a],valid_a),
+              'nb':gsum(None,valid_b),'sb':gsum(b[valid_b],valid_b),
+              'n':gsum(None,valid)}
+    with np.errstate(divide='ignore',invalid='ignore'):
+        states['ma'] = np.nan_to_num(gsum(a1,valid)/states['n'])
+        states['mb'] = np.nan_to_num(gsum(b1,valid)/states['n'])
+    # second moments about the group means of valid pairs
+    ca = a1 - states['ma'][gidx[valid]]
+    cb = b1 - states['mb'][gidx[valid]]
+    states['m2a'] = gsum(ca**2,valid)
+    states['m2b'] = gsum(cb**2,valid)
+    states['cab'] = gsum(ca*cb,valid)
+    states['sd'] = gsum(d1,valid)
+    states['sdd'] = gsum(d1**2,valid)
+    states['sabs'] = gsum(np.abs(d1),valid)
+    return keys, states
+
+def combine_accumulator_states(states,gidx=None,ng=None):
+    '''
+    merges accumulator states (dict of np.arrays), all into one
+    state or by group index gidx into ng states, means and second
+    moments are combined as in the parallel algorithm of Chan et al.
+    returns dict of np.arrays
+    '''
+    nstates = len(states['n'])
+    if gidx is None:
+        gidx, ng = np.zeros(nstates,dtype=int), 1
+    def gsum(weights):
+        return np.bincount(gidx,weights=weights,minlength=ng)
+    new = {field:gsum(states[field]) for field in accumulator_fields
+           if field not in ['ma','mb','m2a','m2b','cab']}
+    with np.errstate(divide='ignore',invalid='ignore'):
+        new['ma'] = np.nan_to_num(gsum(states['n']*states['ma'])/new['n'])
+        new['mb'] = np.nan_to_num(gsum(states['n']*states['mb'])/new['n'])
+    da = states['ma'] - new['ma'][gidx]
+    db = states['mb'] - new['mb'][gidx]
+    new['m2a'] = gsum(states['m2a'] + states['n']*da**2)
+    new['m2b'] = gsum(states['m2b'] + states['n']*db**2)
+    new['cab'] = gsum(states['cab'] + states['n']*da*db)
+    return new
+
+def get_stats_from_states(states):
+    '''
+    returns dict of np.arrays of the validation metrics of
+    accumulator states, SI as tuple of arrays (SIrmse, SIstd)
+    '''
+    n = states['n']
+    with np.errstate(divide='ignore',invalid='ignore'):
+        mop = states['sa']/states['na']
+        mor = states['sb']/states['nb']
+        bias = states['sd']/n
+        msd = states['sdd']/n
+        mad = states['sabs']/n
+        corr = states['cab']/np.sqrt(states['m2a']*states['m2b'])
+        corr[n < 2] = np.nan
+        dmsd = msd - bias**2
+        rmsd = np.sqrt(msd)
+        drmsd = np.sqrt(np.maximum(dmsd,0))
+        SI = (rmsd/mop*100.,drmsd/mop*100.)
+    return {'mop':mop,'mor':mor,'msd':msd,
+            'nov':states['nov'].astype(int),
+            'rmsd':rmsd,'drmsd':drmsd,'corr':corr,'mad':mad,
+            'bias':bias,'SI':SI}
+
+def calc_validation_stats(model,obs,groups=None):
+    '''
+    computes all validation metrics of validate in one vectorized
+    pass per group (see calc_accumulator_states). Metrics are
+    defined as in validate: mop and mor use all valid values of
+    model and obs, the others valid pairs only (marginalization),
+    nov counts all values of a group.
+    groups: None, array of keys, or list of key arrays
+    returns dict of np.arrays of the metrics in order of 'keys',
+    SI as tuple of arrays (SIrmse, SIstd)
+    '''
+    keys, states = calc_accumulator_states(model,obs,groups=groups)
+    stats = get_stats_from_states(states)
+    stats['keys'] = keys
+    return stats
+
+class validation_accumulator_class():
+    '''
+    Mergeable accumulator of the validation metrics, updated per
+    collocation batch and merged across time, leadtimes, or missions
+    without the underlying data
+    usage:
+        acc = validation_accumulator_class()
+        acc.update(model_values,obs_values)
+        acc.merge(other_acc)
+        valid_dict = acc.get_stats()
+    '''
+
+    def __init__(self,state=None):
+        if state is None:
+            state = {field:0. for field in accumulator_fields}
+        self.state = {field:float(state[field])
+                      for field in accumulator_fields}
+
+    def merge_states(self,states):
+        states = {field:np.append(self.state[field],states[field])
+                  for field in accumulator_fields}
+        new = combine_accumulator_states(states)
+        self.state = {field:float(new[field][0])
+                      for field in accumulator_fields}
+
+    def update(self,model,obs):
+        keys, states = calc_accumulator_states(model,obs)
+        self.merge_states(states)
+        return self
+
+    def merge(self,other):
+        self.merge_states({field:[other.state[field]]
+                           for field in accumulator_fields})
+        return self
+
+    def get_stats(self):
+        '''
+        returns validation dict as validate
+        '''
+        stats = get_stats_from_states({field:np.array([self.state[field]])
+                                       for field in accumulator_fields})
+        valid_dict = {key:stats[key][0] for key in stats if key != 'SI'}
+        valid_dict['nov'] = int(valid_dict['nov'])
+        valid_dict['SI'] = (stats['SI'][0][0],stats['SI'][1][0])
+        return valid_dict
+
+    @classmethod
+    def from_records(cls,vardict):
+        '''
+        returns accumulator merged from records of accumulator
+        states, e.g. read with ncmod.nc_ts_reader_class
+        '''
+        acc = cls()
+        if len(vardict['n']) > 0:
+            acc.merge_states(vardict)
+        return acc
+
+def read_accumulator(filelst,sdate=None,edate=None):
+    '''
+    returns accumulator merged from all records between sdate and
+    edate of accumulator files written by ncmod.dumptonc_accumulator,
+    e.g. for rolling or seasonal statistics
+    '''
+    from ncmod import nc_ts_reader_class
+    with nc_ts_reader_class(filelst) as reader:
+        vardict = reader.read(accumulator_fields,sdate=sdate,edate=edate)
+    return validation_accumulator_class.from_records(vardict)
+
+def calc_validation_stats_rows(A,B):
+    '''
+    computes validation metrics of each row of the
+    model and obs samples A and B (dim reps x n) without nans
+    returns dict of np.arrays of length reps
+    '''
+    n = A.shape[1]
+    mop = A.mean(axis=1)
+    mor = B.mean(axis=1)
+    D = A - B
+    bias = D.mean(axis=1)
+    msd = np.einsum('ij,ij->i',D,D)/n
+    mad = np.abs(D).mean(axis=1)
+    del D
+    A = A - mop[:,None]
+    B = B - mor[:,None]
+    with np.errstate(divide='ignore',invalid='ignore'):
+        corr = (np.einsum('ij,ij->i',A,B)
+                /np.sqrt(np.einsum('ij,ij->i',A,A)
+                        *np.einsum('ij,ij->i',B,B)))
+        rmsd = np.sqrt(msd)
+        dmsd = msd - bias**2
+        drmsd = np.sqrt(np.maximum(dmsd,0))
+        SI = (rmsd/mop*100.,drmsd/mop*100.)
+    return {'mop':mop,'mor':mor,'msd':msd,'nov':np.full(len(mop),n),
+            'rmsd':rmsd,'drmsd':drmsd,'corr':corr,'mad':mad,
+            'bias':bias,'SI':SI}
+
+def calc_bootstrap_chunk(a,b,reps,blocksize,seed):
+    '''
+    computes validation metrics of reps bootstrap samples
+    '''
+    from utils import get_boot_idx
+    bidx = get_boot_idx(len(a),reps,blocksize=blocksize,
+                        rng=np.random.default_rng(seed))
+    return calc_validation_stats_rows(a[bidx],b[bidx])
+
+def calc_bootstrap_stats(model,obs,reps=1000,blocksize=None,
+    maxvalues=10**7,nproc=1,seed=None):
+    '''
+    bootstrap of all validation metrics of the valid pairs of model
+    and obs. Index matrices are drawn directly and the metrics of all
+    replicates are computed with vectorized reductions, in chunks of
+    at most maxvalues drawn values to bound memory and optionally on
+    nproc processes. With blocksize the moving block bootstrap is
+    used for autocorrelated series. Results only depend on seed, not
+    on nproc.
+    returns dict of np.arrays of length reps, SI as tuple of arrays
+    '''
+    from utils import marginalize
+    a = np.asarray(model,dtype=np.float64)
+    b = np.asarray(obs,dtype=np.float64)
+    a, b, idx = marginalize(a,b)
+    if len(a) == 0:
+        print('No valid pairs for bootstrap')
+        boot_dict = calc_validation_stats_rows(np.full((reps,1),np.nan),
+                                               np.full((reps,1),np.nan))
+        boot_dict['nov'][:] = 0
+        return boot_dict
+    chunksize = int(max(1,min(reps,maxvalues//max(len(a),1))))
+    chunks = [min(chunksize,reps-i) for i in range(0,reps,chunksize)]
+    seeds = np.random.SeedSequence(seed).spawn(len(chunks))
+    args = [[a]*len(chunks),[b]*len(chunks),chunks,
+            [blocksize]*len(chunks),seeds]
+    if nproc > 1:
+        from concurrent.futures import ProcessPoolExecutor
+        with ProcessPoolExecutor(max_workers=nproc) as executor:
+            results = list(executor.map(calc_bootstrap_chunk,*args))
+    else:
+        results = list(map(calc_bootstrap_chunk,*args))
+    boot_dict = {key:np.concatenate([r[key] for r in results])
+                 for key in results[0] if key != 'SI'}
+    boot_dict['SI'] = tuple(np.concatenate([r['SI'][i] for r in results])
+                            for i in range(2))
+    return boot_dict
+
 def disp_validation(valid_dict):
     print('\n')
     print('# ---')
@@ -131,10 +407,12 @@ class validation_class():
         print (" ### Initializing validation_class instance ###")
         print ('# ----- ')
 
-def validate(results_dict,boot=None):
+def validate(results_dict,boot=None,reps=1000,blocksize=None,nproc=1):
     import numpy as np
     """
     vars in dict: np.arrays with np.nan for invalids
+    with boot the metrics of reps bootstrap samples are returned,
+    see calc_bootstrap_stats
     produced metrics:
     mean of product --> mop
     mean of reference --> mor
@@ -150,49 +428,17 @@ def validate(results_dict,boot=None):
         obs_matches = np.array(results_dict['obs_values'])
     else: obs_matches = results_dict['obs_values']
     if (boot is None or boot ==  False):
-        mop = np.nanmean(model_matches)
-        mor = np.nanmean(obs_matches)
-        msd, rmsd = calc_rmsd(model_matches,obs_matches)
-        dmsd, drmsd = calc_drmsd(model_matches,obs_matches)
-        nov = len(obs_matches)
-        mad = calc_mad(model_matches,obs_matches)
-        corr = calc_corrcoef(model_matches,obs_matches)
-        bias = calc_bias(model_matches,obs_matches)
-        SI = calc_scatter_index(model_matches,obs_matches)
-        validation_dict = {
-            'mop':mop,
-            'mor':mor,
-            'msd':msd,
-            'nov':nov,
-            'rmsd':rmsd,
-            'drmsd':drmsd,
-            'corr':corr,
-            'mad':mad,
-            'bias':bias,
-            'SI':SI}
+        stats = calc_validation_stats(model_matches,obs_matches)
+        validation_dict = {key:stats[key][0] for key in
+                        ['mop','mor','msd','rmsd','drmsd',
+                         'corr','mad','bias']}
+        validation_dict['nov'] = int(stats['nov'][0])
+        validation_dict['SI'] = (stats['SI'][0][0],stats['SI'][1][0])
     elif boot is True:
-        from utils import bootstr, marginalize
-        reps=1000
-        newmodel,newobs,newidx = marginalize(model_matches,obs_matches)
-        obs_boot,boot_idx=bootstr(newobs,reps)
-        print (len(obs_boot[np.isnan(obs_boot)]))
-        RMSD=np.zeros(reps)*np.nan
-        MSD=np.zeros(reps)*np.nan
-        BIAS=np.zeros(reps)*np.nan
-        CORR=np.zeros(reps)*np.nan
-        for i in range(reps):
-            results_dict = {
-                        #'date_matches':date_matches[newidx[boot_idx[:,i]]],
-                        'model_matches':newmodel[boot_idx[:,i]],
-                        'sat_matches':newobs[boot_idx[:,i]]}
-            try:
-                RMSD[i]=validate(results_dict)['rmsd']
-                MSD[i]=validate(results_dict)['mad']
-                BIAS[i]=validate(results_dict)['bias']
-                CORR[i]=validate(results_dict)['corr']
-            except IndexError as e:
-                print (e)
-        validation_dict = {'rmsd':RMSD,'mad':MSD,'bias':BIAS,'corr':CORR}
+        validation_dict = calc_bootstrap_stats(model_matches,obs_matches,
+                                               reps=reps,
+                                               blocksize=blocksize,
+                                               nproc=nproc)
     return validation_dict
 
 def comp_fig(sa_obj=None,mc_obj=None,coll_obj=None,**kwargs):